@@ -0,0 +1,295 @@
+"""
+asyncio based variant of PostProcessFunctions.
+
+The ES queries and the waits for GRQ to index the staged products are coroutines, so the
+waits for all of a job's products run concurrently instead of one after another. The class
+is still driven through the synchronous PostProcessFunctions.run, so it can be used as the
+post processor class in the Chimera config without any changes to post_processor.post_process.
+"""
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import traceback
+
+from concurrent.futures import ThreadPoolExecutor
+
+from chimera.commons.instrumentation import record_es_call
+from chimera.logger import logger
+from chimera.postprocess_functions import PostProcessFunctions
+
+
+class AsyncPostProcessFunctions(PostProcessFunctions):
+    # max number of product queries that are in flight at the same time
+    MAX_CONCURRENT_REQUESTS = 20
+
+    def run(self, function_list):
+        """
+        Runs the set of post processing functions passed into the given list. Post process
+        functions can either be plain methods or coroutines.
+
+        :param function_list: A list of post process methods that will be defined in the subclasses.
+
+        :return: a dictionary containing information about the results of the post PGE processes.
+        """
+        logger.info(
+            "function_list: {}".format(function_list)
+        )
+        for func in function_list:
+            method = getattr(self, func)
+            with self._instrumentation.measure(func):
+                if inspect.iscoroutinefunction(method):
+                    self._job_result.update(self._run_coroutine(method()))
+                else:
+                    self._job_result.update(method())
+
+        return self._instrumentation.publish(self._job_result)
+
+    @staticmethod
+    def _run_coroutine(coro):
+        """
+        Runs the coroutine to completion from synchronous code. If an event loop is already
+        running in this thread, the coroutine gets its own loop in a separate thread.
+        :param coro: coroutine to run
+        :return: result of the coroutine
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coro)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # carry the context over, so ES calls still count towards the function being measured
+            return executor.submit(contextvars.copy_context().run, asyncio.run, coro).result()
+
+    async def _search(self, es, **kwargs):
+        """
+        Runs the search on the given client. Async clients are awaited directly while
+        blocking clients are run in the loop's default executor.
+        """
+        if inspect.iscoroutinefunction(es.search):
+            return await es.search(**kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(es.search, **kwargs))
+
+    async def _get_by_id_async(self, es, **kwargs):
+        """
+        Coroutine version of _get_by_id. Blocking clients are run in the loop's default executor.
+        """
+        get = self._get_by_id_method(es)
+        if inspect.iscoroutinefunction(get):
+            return await get(**kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(get, **kwargs))
+
+    async def query_es_async(
+        self,
+        endpoint,
+        doc_id=None,
+        query=None,
+        request_timeout=30,
+        retried=False,
+        size=1,
+        source_includes=None,
+        source_excludes=None,
+    ):
+        """
+        Coroutine version of query_es.
+        :param endpoint: the value specifies which ES endpoint to send query
+         can be MOZART or GRQ
+        :param doc_id: id of product or job
+        :param query: query to run
+        :param request_timeout: how long to wait for ES request
+        :param retried: flag to specify if the query has already been retried,
+         in which case it is not retried again
+        :param size: number of results to be returned
+        :param source_includes: list of the _source fields to return
+        :param source_excludes: list of the _source fields to leave out
+        :return: result of query
+        """
+        es, es_index = self._get_es(endpoint)
+        query = self._build_query(doc_id, query, source_includes, source_excludes)
+
+        def _search(attempt):
+            return self._search(
+                es,
+                index=es_index,
+                body=query,
+                size=size,
+                request_timeout=self._retry_policy.get_request_timeout(request_timeout, attempt),
+            )
+
+        try:
+            # a retried query only gets a single attempt
+            result = await self._retry_policy.call_async(_search, max_attempts=1 if retried else None)
+        except Exception as e:
+            logger.error(
+                "Failed to query {} ES: {}".format(endpoint, str(e))
+            )
+            raise
+
+        record_es_call(result)
+        return result
+
+    async def get_doc_async(self, endpoint, doc_id, request_timeout=30, source_includes=None, source_excludes=None):
+        """
+        Coroutine version of get_doc.
+        :param endpoint: MOZART or GRQ
+        :param doc_id: id of product or job
+        :param request_timeout: how long to wait for ES request
+        :param source_includes: list of the _source fields to return
+        :param source_excludes: list of the _source fields to leave out
+        :return: the document as a hit (dict with _id, _index and _source), or None if not found
+        """
+        es, es_index = self._get_es(endpoint)
+        if (endpoint, es_index) not in self._search_only_indices:
+            async def _get(attempt):
+                try:
+                    return await self._get_by_id_async(es, **self._get_doc_params(
+                        es_index, doc_id, request_timeout, attempt, source_includes, source_excludes))
+                except Exception as e:
+                    return self._get_error_result(e)
+
+            found, doc = self._check_get_result(endpoint, es_index, await self._retry_policy.call_async(_get))
+            if found:
+                return doc
+
+        result = await self.query_es_async(
+            endpoint=endpoint,
+            doc_id=doc_id,
+            request_timeout=request_timeout,
+            source_includes=source_includes,
+            source_excludes=source_excludes,
+        )
+        return self._get_first_hit(result)
+
+    async def wait_for_doc_async(
+        self, endpoint, query, timeout, return_result=False, wait_strategy=None, keys=None
+    ):
+        """
+        Coroutine version of wait_for_doc. Sleeping does not block the event loop, so other
+        waits can make progress in the meantime.
+        :param endpoint: GRQ or MOZART
+        :param query: search query
+        :param timeout: time to wait in seconds
+        :param return_result: return the result of the last query instead of True
+        :param wait_strategy: WaitStrategy, or the name of one, deciding how long to sleep
+         between queries. Defaults to the strategy configured for the endpoint.
+        :param keys: IDs of the documents being waited on, used by notification based strategies
+        :return: True (or the query result) if document found else raise suitable Exception
+        """
+        try:
+            wait = self._start_wait(endpoint, timeout, wait_strategy)
+            result = await self.query_es_async(
+                endpoint=endpoint, query=query, request_timeout=30, size=1
+            )
+
+            while self.wait_condition(endpoint=endpoint, result=result):
+                if wait.timed_out():
+                    self._check_wait_timeout(endpoint, result)
+                await wait.sleep_async("{} document".format(endpoint), keys=keys)
+                result = await self.query_es_async(
+                    endpoint=endpoint, query=query, request_timeout=30, size=1
+                )
+            if return_result:
+                return result
+            return True
+        except Exception as e:
+            raise Exception("ElasticSearch Operation failed due to : {}".format(str(e)))
+
+    async def wait_for_product_async(self, doc_id, timeout=120):
+        """
+        Coroutine version of wait_for_product.
+        :param doc_id: id of product
+        :param timeout: time to wait in seconds
+        :return: result of the query that found the product
+        """
+        try:
+            return await self.wait_for_doc_async(
+                endpoint=self.GRQ_ES_ENDPOINT, query=self._get_product_query(doc_id), timeout=timeout,
+                return_result=True, keys=[doc_id]
+            )
+        except Exception as ex:
+            logger.error(
+                "Error querying GRQ for product {}. {}. {}".format(
+                    doc_id, str(ex), traceback.format_exc()
+                )
+            )
+            raise Exception(
+                "Error querying GRQ for product {}. {}".format(doc_id, str(ex))
+            )
+
+    async def get_product_info_async(self, product_id, timeout=120):
+        """
+        Coroutine version of get_product_info.
+        :param product_id: id of product
+        :param timeout: time to wait in seconds for the product to be indexed
+        :return: tuple(product_url, metadata)
+        """
+        try:
+            # the realtime GET finds products that are not searchable yet, otherwise wait for them
+            result = await self.get_doc_async(
+                endpoint=self.GRQ_ES_ENDPOINT, doc_id=product_id, source_includes=self.PRODUCT_SOURCE_INCLUDES
+            )
+            if result is None:
+                response = await self.wait_for_product_async(doc_id=product_id, timeout=timeout)
+                result = response.get("hits").get("hits")[0]
+        except Exception as ex:
+            raise Exception(
+                "Failed to find product in GRQ. {}. {}".format(
+                    str(ex), traceback.format_exc()
+                )
+            )
+
+        return self._parse_product_hit(result)
+
+    async def _query_products_async(self, product_ids):
+        """
+        Coroutine version of _query_products. The batches are looked up concurrently, with at
+        most MAX_CONCURRENT_REQUESTS queries in flight.
+        :param product_ids: list of product ids
+        :return: list of the hits that were found
+        """
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_REQUESTS)
+
+        async def _query(batch, query):
+            async with semaphore:
+                return await self.query_es_async(
+                    endpoint=self.GRQ_ES_ENDPOINT, query=query, size=len(batch)
+                )
+
+        results = await asyncio.gather(
+            *[_query(batch, query) for batch, query in self._get_product_queries(product_ids)]
+        )
+        hits = []
+        for result in results:
+            if result is not None:
+                hits.extend(result.get("hits").get("hits"))
+        return hits
+
+    async def get_products_info_async(self, product_ids, timeout=120):
+        """
+        Coroutine version of get_products_info. All products are resolved with terms queries
+        and only the ones that have not been indexed yet are polled for again.
+        :param product_ids: list of product ids
+        :param timeout: time to wait in seconds for all products to be indexed
+        :return: dict of product id to tuple(product_url, metadata)
+        """
+        products_info = dict()
+        missing_ids = list(dict.fromkeys(product_ids))
+        wait = self._start_wait(self.GRQ_ES_ENDPOINT, timeout)
+
+        while True:
+            missing_ids = self._add_products_info(
+                products_info, missing_ids, await self._query_products_async(missing_ids)
+            )
+            if not missing_ids:
+                return products_info
+            self._check_products_timeout(wait, missing_ids)
+            await wait.sleep_async("{} product(s) to be indexed in GRQ".format(len(missing_ids)), keys=missing_ids)
+
+    def get_products_info(self, product_ids, timeout=120):
+        return self._run_coroutine(
+            self.get_products_info_async(product_ids=product_ids, timeout=timeout)
+        )
@@ -4,13 +4,103 @@ import re
 import yaml
 import os
 import json
+import threading
 
 from collections import OrderedDict
 
+from chimera.commons.constants import ChimeraConstants
+
+# use the libyaml based loader when PyYAML was built with it, it's a lot faster than the pure-Python one
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 # have yaml parse regular expressions
-yaml.SafeLoader.add_constructor(
-    u"tag:yaml.org,2002:python/regexp", lambda l, n: re.compile(l.construct_scalar(n))
-)
+for loader in set([yaml.SafeLoader, YamlLoader]):
+    loader.add_constructor(
+        u"tag:yaml.org,2002:python/regexp", lambda l, n: re.compile(l.construct_scalar(n))
+    )
+
+
+# max number of parsed config files kept in memory
+CONFIG_CACHE_SIZE = 32
+
+
+def copy_config(cfg):
+    """
+    Copies the containers of a parsed config. The leaf values coming out of the YAML and JSON
+    parsers are immutable, so they are shared instead of copied.
+    :param cfg: parsed config
+    :return: copy of the config that can be modified without affecting the original
+    """
+    if isinstance(cfg, dict):
+        return cfg.__class__((k, copy_config(v)) for k, v in cfg.items())
+    if isinstance(cfg, list):
+        return [copy_config(v) for v in cfg]
+    if isinstance(cfg, set):
+        return set(cfg)
+    return cfg
+
+
+def get_file_signature(file):
+    """
+    :param file: path of the file
+    :return: tuple(absolute path, modification time in ns, size) identifying the file's current content
+    """
+    path = os.path.abspath(file)
+    stat = os.stat(path)
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+class ConfigCache(object):
+    """
+    Process wide LRU cache of parsed config files. An entry is reparsed when the file's
+    modification time or size changes. Every caller gets its own copy of the config.
+    """
+
+    def __init__(self, max_size=CONFIG_CACHE_SIZE):
+        self._max_size = max_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file, loader):
+        """
+        :param file: path of the config file
+        :param loader: function parsing the file at the given path
+        :return: copy of the parsed config
+        """
+        path, mtime, size = get_file_signature(file)
+        key = (path, loader)
+        signature = (mtime, size)
+
+        with self._lock:
+            entry = self._cache.get(key, None)
+            if entry is not None and entry[0] == signature:
+                self._cache.move_to_end(key)
+                return copy_config(entry[1])
+
+        cfg = loader(path)
+        with self._lock:
+            self._cache[key] = (signature, cfg)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._max_size:
+                self._cache.popitem(last=False)
+        return copy_config(cfg)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+config_cache = ConfigCache()
+
+
+def _load_yaml(path):
+    with open(path) as f:
+        return yaml.load(f, Loader=YamlLoader)
+
+
+def _load_json(path):
+    with open(path, "r") as f:
+        return json.load(f, object_pairs_hook=OrderedDict)
 
 
 class YamlConfEncoder(json.JSONEncoder):
@@ -35,8 +125,7 @@ class YamlConf(object):
         """Construct YamlConf instance."""
 
         self._file = file
-        with open(self._file) as f:
-            self._cfg = yaml.safe_load(f)
+        self._cfg = config_cache.get(self._file, _load_yaml)
 
     @property
     def file(self):
@@ -125,7 +214,7 @@ def load_config(config_filepath):
     config_ext = os.path.splitext(config_filepath)[1]
     if config_ext == ".json":
         try:
-            config = json.load(open(config_filepath, 'r'), object_pairs_hook=OrderedDict)
+            config = config_cache.get(config_filepath, _load_json)
         except Exception as e:
             raise RuntimeError("Could not load Config : {}".format(e))
     elif config_ext == ".yaml":
@@ -136,4 +225,16 @@ def load_config(config_filepath):
     else:
         raise RuntimeError("Config file must end in .yaml or .json: {}".format(config_filepath))
 
-    return config
\ No newline at end of file
+    return config
+
+
+def get_chimera_setting(settings, key, default=None):
+    """
+    Gets a value out of the CHIMERA area of the settings file.
+    :param settings: loaded settings, can be None
+    :param key: key within the CHIMERA area
+    :param default: value to return if either the area or the key is missing
+    :return: the setting's value
+    """
+    chimera_settings = (settings or {}).get(ChimeraConstants.CHIMERA, None) or {}
+    return chimera_settings.get(key, default)
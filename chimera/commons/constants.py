@@ -30,6 +30,9 @@ class ChimeraConstants(object):
     # To Specify which group elements to localize
     LOCALIZE_GROUPS = "localize_groups"
 
+    # To enrich the localize list with size, checksum and concurrency group of each input
+    LOCALIZE_PLAN = "localize_plan"
+
     # To specify which filepaths to localize in the worker. Used by Mozart
     LOCALIZE = "localize"
     CONFIGURATION = "configuration"
@@ -79,6 +82,12 @@ class ChimeraConstants(object):
 
     PAYLOAD_TASK_ID = "payload_task_id"
 
+    # To specify the fields of the job payload the dedup hash is calculated over
+    PAYLOAD_HASH = "payload_hash"
+
+    # To replace the PGE config in the job payload with a reference and optionally compress the run config
+    SLIM_PAYLOAD = "slim_payload"
+
     JOB_ID_FIELD = "job_id"
 
     JOB_TYPES = "JOB_TYPES"
@@ -86,3 +95,24 @@ class ChimeraConstants(object):
     JOB_QUEUES = "JOB_QUEUES"
 
     WORK_DIR = "work_dir"
+
+    # Area of the settings file holding the Chimera specific settings
+    CHIMERA = "CHIMERA"
+
+    # Retry policy of the ES queries, found in the CHIMERA area of the settings file
+    ES_RETRY_POLICY = "ES_RETRY_POLICY"
+
+    # Strategy used to wait for documents to appear in ES, found in the CHIMERA area of the settings file
+    WAIT_STRATEGY = "WAIT_STRATEGY"
+
+    # Settings of the shared ES clients, found in the CHIMERA area of the settings file
+    ES_CLIENT = "ES_CLIENT"
+
+    # Max number of precondition functions run at the same time, found in the CHIMERA area of the settings file
+    PRECONDITION_MAX_WORKERS = "PRECONDITION_MAX_WORKERS"
+
+    # Per function timing and profiling settings, found in the CHIMERA area of the settings file
+    INSTRUMENTATION = "INSTRUMENTATION"
+
+    # Settings of the local cache of precondition results, found in the CHIMERA area of the settings file
+    PRECONDITION_CACHE = "PRECONDITION_CACHE"
@@ -0,0 +1,85 @@
+"""
+Runs a list of steps on a thread pool, honoring the dependencies between them.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from chimera.logger import logger
+
+
+def get_dependencies(declarations):
+    """
+    Works out which steps have to wait on which earlier ones, based on the keys they read and
+    write. A step depends on an earlier one if either of them writes a key the other one reads
+    or writes, so every key ends up with the same value as when the steps run in order.
+
+    :param declarations: list of tuple(reads, writes) in step order, where reads and writes are
+     sets of keys. None means the step did not declare them and has to run on its own.
+    :return: list of sets holding the indices of the steps each step depends on
+    """
+    dependencies = []
+    barrier = None
+    for i, declaration in enumerate(declarations):
+        if declaration is None:
+            # undeclared steps wait on everything before them and everything after waits on them
+            dependencies.append(set(range(i)))
+            barrier = i
+            continue
+        reads, writes = declaration
+        depends_on = set() if barrier is None else {barrier}
+        for j in range(barrier + 1 if barrier is not None else 0, i):
+            other_reads, other_writes = declarations[j]
+            if other_writes & (reads | writes) or other_reads & writes:
+                depends_on.add(j)
+        dependencies.append(depends_on)
+    return dependencies
+
+
+def run_dag(steps, dependencies, max_workers, on_done=None, on_start=None):
+    """
+    Runs the steps, starting each one as soon as the steps it depends on are done.
+
+    :param steps: list of callables taking no arguments
+    :param dependencies: list of sets holding the indices of the steps each step depends on
+    :param max_workers: max number of steps running at the same time
+    :param on_done: called from the calling thread with (index, result) as each step finishes,
+     before any step depending on it is started
+    :param on_start: called from the calling thread with the index of each step right before it is
+     started
+    :return: list of the steps' results, in step order
+    """
+    results = [None] * len(steps)
+    pending = list(range(len(steps)))
+    done = set()
+    running = dict()
+    error = None
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while running or (pending and error is None):
+            if error is None:
+                for i in [i for i in pending if dependencies[i] <= done]:
+                    pending.remove(i)
+                    if on_start is not None:
+                        on_start(i)
+                    running[executor.submit(steps[i])] = i
+            if not running:
+                raise RuntimeError("Steps {} have unsatisfiable dependencies".format(pending))
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            # handle the finished steps in step order to keep on_done calls deterministic
+            for future in sorted(finished, key=running.get):
+                i = running.pop(future)
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    # let the running steps finish, but don't start any new ones
+                    if error is None:
+                        error = e
+                    else:
+                        logger.error("Step {} also failed: {}".format(i, e))
+                    continue
+                done.add(i)
+                if on_done is not None:
+                    on_done(i, results[i])
+    if error is not None:
+        raise error
+    return results
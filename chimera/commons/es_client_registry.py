@@ -0,0 +1,170 @@
+"""
+Process level registry of ES clients, so that every post processor invocation in a worker reuses
+the same pooled connections instead of setting up new ones.
+
+The clients are configured through the CHIMERA area of the settings file. Endpoint specific
+values override the top level ones, e.g.
+
+CHIMERA:
+  ES_CLIENT:
+    pool_size: 10         # max connections kept per ES node
+    idle_timeout: 300     # seconds a client nobody holds is kept before it is closed and rebuilt
+    timeout: 30
+    GRQ:
+      url: https://grq-es:9200
+      pool_size: 25
+
+Without pool settings the clients come straight from HySDS' get_mozart_es/get_grq_es, which
+already reuse their clients, so they are not tracked here.
+
+Every client handed out by get_es_client is held until it's given back with release_es_client.
+A client is only closed once nobody holds it anymore.
+"""
+
+import threading
+import time
+
+from chimera.logger import logger
+
+MOZART = "MOZART"
+GRQ = "GRQ"
+
+# settings that are not handed over to the ES client itself
+REGISTRY_SETTINGS = ["idle_timeout", "url"]
+
+_lock = threading.Lock()
+# entries of the shared clients, keyed by endpoint and client settings
+_clients = dict()
+# entries of all clients that are still open, keyed by id of the client
+_entries = dict()
+
+
+class _Entry(object):
+    def __init__(self, client):
+        self.client = client
+        # number of holders of the client
+        self.refs = 0
+        # set once the client was dropped from the registry, it is closed on its last release
+        self.retired = False
+        self.last_used = time.monotonic()
+
+
+def _get_endpoint_config(endpoint, config):
+    """
+    Merges the endpoint specific settings over the top level ones.
+    """
+    config = dict(config or {})
+    endpoint_config = config.pop(endpoint, None) or {}
+    for name in [MOZART, GRQ]:
+        config.pop(name, None)
+    config.update(endpoint_config)
+    return config
+
+
+def _get_client_kwargs(config):
+    """
+    Translates the Chimera settings to Elasticsearch client arguments.
+    """
+    kwargs = dict()
+    for key, value in config.items():
+        if key in REGISTRY_SETTINGS:
+            continue
+        if key == "pool_size":
+            kwargs["maxsize"] = value
+        else:
+            kwargs[key] = value
+    return kwargs
+
+
+def _create_client(endpoint, url, client_kwargs):
+    if not client_kwargs and url is None:
+        from hysds.es_util import get_grq_es, get_mozart_es
+
+        if endpoint == MOZART:
+            return get_mozart_es()
+        if endpoint == GRQ:
+            return get_grq_es()
+        raise ValueError("Unknown ES endpoint: {}".format(endpoint))
+
+    from hysds_commons.elasticsearch_utils import ElasticsearchUtility
+
+    if url is None:
+        from hysds.celery import app
+
+        url = app.conf.JOBS_ES_URL if endpoint == MOZART else app.conf.GRQ_ES_URL
+    logger.info("Creating pooled {} ES client for {}".format(endpoint, url))
+    return ElasticsearchUtility(url, logger=logger, **client_kwargs)
+
+
+def _close_client(client):
+    es = getattr(client, "es", client)
+    try:
+        es.transport.close()
+    except Exception as e:
+        logger.warning("Could not close ES client: {}".format(e))
+
+
+def _close_entry(entry):
+    _entries.pop(id(entry.client), None)
+    _close_client(entry.client)
+
+
+def get_es_client(endpoint, config=None):
+    """
+    Gets the shared ES client of the endpoint, creating it on first use. The client should be
+    given back with release_es_client once it's no longer used.
+    :param endpoint: MOZART or GRQ
+    :param config: ES_CLIENT settings from the CHIMERA area of the settings file
+    :return: ES client
+    """
+    config = _get_endpoint_config(endpoint, config)
+    url = config.get("url", None)
+    idle_timeout = config.get("idle_timeout", None)
+    client_kwargs = _get_client_kwargs(config)
+    if not client_kwargs and url is None:
+        return _create_client(endpoint, url, client_kwargs)
+    key = (endpoint, url, tuple(sorted((k, repr(v)) for k, v in client_kwargs.items())))
+
+    with _lock:
+        entry = _clients.get(key, None)
+        now = time.monotonic()
+        if entry is not None and entry.refs == 0 and idle_timeout is not None \
+                and now - entry.last_used > idle_timeout:
+            logger.info("Recycling {} ES client unused for {:.0f} seconds".format(endpoint, now - entry.last_used))
+            _close_entry(entry)
+            entry = None
+        if entry is None:
+            entry = _Entry(_create_client(endpoint, url, client_kwargs))
+            _clients[key] = entry
+            _entries[id(entry.client)] = entry
+        entry.refs += 1
+        entry.last_used = now
+        return entry.client
+
+
+def release_es_client(client):
+    """
+    Gives back a client got from get_es_client. Does nothing for clients that are not tracked.
+    :param client: ES client
+    """
+    with _lock:
+        entry = _entries.get(id(client), None)
+        if entry is None or entry.client is not client:
+            return
+        entry.refs = max(0, entry.refs - 1)
+        entry.last_used = time.monotonic()
+        if entry.refs == 0 and entry.retired:
+            _close_entry(entry)
+
+
+def clear_es_clients():
+    """
+    Forgets all of the shared clients. They are closed right away, or on their last release if
+    they are still held.
+    """
+    with _lock:
+        for entry in _clients.values():
+            entry.retired = True
+            if entry.refs == 0:
+                _close_entry(entry)
+        _clients.clear()
@@ -0,0 +1,197 @@
+"""
+Per function timing of the precondition, job submission and post process pipelines.
+
+Instrumentation is switched on through the CHIMERA area of the settings file, e.g.
+
+CHIMERA:
+  INSTRUMENTATION:
+    enabled: true
+    profile: false        # also capture a cProfile of every function
+    output: sidecar       # sidecar, context or log
+    sidecar_dir: null     # directory of the sidecar JSON, defaults to the working directory
+
+Every function gets a record with its wall time, the CPU time of the thread running it and the
+number and size of the ES responses it received, as reported through record_es_call. With the sidecar output the records are written
+to _chimera_<step>_metrics.json, with the context output they are added to the results under the
+chimera_metrics key. Other information about the step, like the Mozart times of the PGE job the
+post processor looked up, goes under the info key. run_sciflo puts the sidecars of all steps
+together into the workflow timing report, see workflow_metrics.
+"""
+
+import contextvars
+import cProfile
+import json
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+
+from chimera.logger import logger
+
+SIDECAR = "sidecar"
+CONTEXT = "context"
+LOG = "log"
+
+METRICS_KEY = "chimera_metrics"
+SIDECAR_FILE = "_chimera_{}_metrics.json"
+PROFILE_FILE = "_chimera_{}_{}.prof"
+
+_current_record = contextvars.ContextVar("chimera_instrumentation_record", default=None)
+# only one profiler can be active in a process at a time
+_profile_lock = threading.Lock()
+
+
+def record_es_call(response):
+    """
+    Counts an ES response towards the function currently being measured. Does nothing when
+    instrumentation is off.
+
+    The ES lookups of the post processor go through here. Precondition functions and other
+    subclass code querying ES on their own have to call it with each response for their ES
+    traffic to count towards their function's es_calls and es_bytes.
+
+    :param response: response of the ES request
+    """
+    record = _current_record.get()
+    # only measure() of an enabled Instrumentation sets a record
+    if record is None:
+        return
+    record["es_calls"] += 1
+    try:
+        # the ES client only hands out the decoded body, so its size is that of its JSON
+        record["es_bytes"] += len(json.dumps(response, default=str))
+    except Exception as e:
+        logger.debug("Could not measure ES response size: {}".format(e))
+
+
+class Instrumentation(object):
+    def __init__(self, step, enabled=False, profile=False, output=SIDECAR, sidecar_dir=None):
+        """
+        :param step: name of the pipeline being measured, e.g. preprocessor or postprocessor
+        :param enabled: whether to measure anything
+        :param profile: whether to capture a cProfile of every function
+        :param output: where the records go: sidecar, context or log
+        :param sidecar_dir: directory to write the sidecar JSON and profiles to
+        """
+        if output not in [SIDECAR, CONTEXT, LOG]:
+            raise ValueError(
+                "Unknown instrumentation output '{}'. Should be one of the following: {}".format(
+                    output, [SIDECAR, CONTEXT, LOG]
+                )
+            )
+        self.step = step
+        self.enabled = enabled
+        self.profile = profile
+        self.output = output
+        self.sidecar_dir = sidecar_dir
+        self.records = []
+        self.info = dict()
+        self._lock = threading.Lock()
+        self._start = None
+
+    @classmethod
+    def from_config(cls, step, config):
+        """
+        :param step: name of the pipeline being measured
+        :param config: INSTRUMENTATION settings from the CHIMERA area of the settings file
+        :return: Instrumentation
+        """
+        return cls(step, **(config or {}))
+
+    def _get_path(self, file_name):
+        return os.path.join(self.sidecar_dir or os.getcwd(), file_name)
+
+    @contextmanager
+    def measure(self, name):
+        """
+        Measures the code run within the context as the function of the given name.
+        :param name: name of the function
+        """
+        if not self.enabled:
+            yield
+            return
+
+        if self._start is None:
+            self._start = time.time()
+        record = {"function": name, "es_calls": 0, "es_bytes": 0, "error": None}
+        token = _current_record.set(record)
+        profiler = None
+        if self.profile and _profile_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            if profiler is not None:
+                profiler.enable()
+            yield
+        except Exception as e:
+            record["error"] = str(e)
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            record["wall_time"] = time.perf_counter() - wall_start
+            record["cpu_time"] = time.thread_time() - cpu_start
+            _current_record.reset(token)
+            if profiler is not None:
+                try:
+                    record["profile"] = self._get_path(PROFILE_FILE.format(self.step, name))
+                    profiler.dump_stats(record["profile"])
+                except Exception as e:
+                    logger.warning("Could not write profile of {}: {}".format(name, e))
+                finally:
+                    _profile_lock.release()
+            elif self.profile:
+                logger.info("Not profiling {} as another function is being profiled".format(name))
+            with self._lock:
+                self.records.append(record)
+
+    def add_info(self, key, value):
+        """
+        Adds information about the step, other than the function records, to the metrics.
+        :param key: name of the information
+        :param value: JSON serializable value
+        """
+        if self.enabled:
+            self.info[key] = value
+
+    def get_metrics(self):
+        """
+        :return: dict holding the records of all measured functions
+        """
+        return {
+            "step": self.step,
+            "start_time": self._start,
+            "end_time": time.time(),
+            "functions": list(self.records),
+            "info": dict(self.info),
+        }
+
+    def publish(self, results):
+        """
+        Writes out the records of the measured functions.
+        :param results: results of the pipeline, which the records are added to with the context output
+        :return: the results
+        """
+        if not self.enabled:
+            return results
+
+        metrics = self.get_metrics()
+        for record in metrics["functions"]:
+            logger.info(
+                "{} took {:.3f}s wall, {:.3f}s CPU, {} ES calls ({} bytes)".format(
+                    record["function"], record["wall_time"], record["cpu_time"],
+                    record["es_calls"], record["es_bytes"]
+                )
+            )
+        if self.output == CONTEXT:
+            results[METRICS_KEY] = metrics
+        elif self.output == SIDECAR:
+            sidecar_file = self._get_path(SIDECAR_FILE.format(self.step))
+            try:
+                with open(sidecar_file, "w") as f:
+                    json.dump(metrics, f, indent=2)
+            except Exception as e:
+                logger.warning("Could not write {}: {}".format(sidecar_file, e))
+        return results
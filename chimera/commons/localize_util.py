@@ -0,0 +1,144 @@
+"""
+Helpers to enrich the localize list of a PGE job with the size and checksum of its inputs, as
+found in the product metadata of the sciflo context, so workers can plan the transfers.
+"""
+
+import math
+import re
+
+from urllib.parse import urlparse
+
+from chimera.commons.constants import ChimeraConstants
+
+# metadata keys holding the size of a file in bytes
+FILE_SIZE_KEYS = ["FileSize", "file_size", "size"]
+# metadata keys holding the checksum of a file
+CHECKSUM_KEYS = ["checksum", "Checksum", "md5"]
+
+DISK_USAGE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?B?)\s*$", re.IGNORECASE)
+DISK_USAGE_UNITS = {"": 1, "B": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+HOST = "host"
+
+
+def _get_first(metadata, keys):
+    for key in keys:
+        value = metadata.get(key, None)
+        if value is not None:
+            return value
+    return None
+
+
+def _add_file_info(file_info, url, size, checksum):
+    info = dict()
+    if size is not None:
+        info["size"] = int(size)
+    if checksum is not None:
+        info["checksum"] = checksum
+    if url and info:
+        file_info.setdefault(url, dict()).update(info)
+
+
+def _iter_product_metadata(product_metadata):
+    """
+    Yields tuple(url, metadata) out of the shapes the product metadata can have in the context: a
+    list of flat metadata dicts, a {"metadata": {...}} dict, or the {"id", "url", "metadata"}
+    entries written by the post processor.
+    """
+    if isinstance(product_metadata, dict):
+        product_metadata = [product_metadata]
+    for entry in product_metadata or []:
+        if not isinstance(entry, dict):
+            continue
+        metadata = entry.get("metadata", None)
+        if isinstance(metadata, dict):
+            yield entry.get("url", None), metadata
+        else:
+            yield None, entry
+
+
+def get_file_info(sf_context):
+    """
+    Collects the size and checksum of the files described in the context. Files are only known by
+    their full URL, as files of the same name from different locations are different files.
+    :param sf_context: sciflo context
+    :return: dict of url to a dict with the size and/or checksum of the file
+    """
+    file_info = dict()
+    product_paths = sf_context.get(ChimeraConstants.PRODUCT_PATHS, None)
+    if not isinstance(product_paths, list):
+        product_paths = []
+
+    # flat metadata dicts don't have a url, they are listed alongside the product paths of the previous PGE
+    entries = list(_iter_product_metadata(sf_context.get(ChimeraConstants.PRODUCTS_METADATA, None)))
+    paths = product_paths if len(product_paths) == len(entries) else [None] * len(entries)
+    for (url, metadata), path in zip(entries, paths):
+        _add_file_info(
+            file_info,
+            url or path,
+            _get_first(metadata, FILE_SIZE_KEYS),
+            _get_first(metadata, CHECKSUM_KEYS),
+        )
+
+    # checksums listed alongside the product paths of the previous PGE
+    checksums = sf_context.get("checksum", None) or []
+    if isinstance(checksums, list) and len(product_paths) == len(checksums):
+        for path, checksum in zip(product_paths, checksums):
+            _add_file_info(file_info, path, None, checksum)
+    return file_info
+
+
+def enrich_localize_urls(localize_urls, file_info, group_by=None):
+    """
+    Adds the size, checksum and concurrency group of each URL to the localize list.
+    :param localize_urls: localize list that osaka understands
+    :param file_info: result of get_file_info
+    :param group_by: "host" to group the transfers by the host they come from
+    :return: the localize list, with size, checksum and group added where known
+    """
+    enriched = []
+    for element in localize_urls:
+        element = dict(element)
+        url = element["url"]
+        info = file_info.get(url, None)
+        if info:
+            element.update(info)
+        if group_by == HOST:
+            element["group"] = urlparse(url).netloc
+        enriched.append(element)
+    return enriched
+
+
+def parse_disk_usage(disk_usage):
+    """
+    :param disk_usage: disk usage as found in HySDS job specs, e.g. 40GB
+    :return: bytes, or None if the value can't be parsed
+    """
+    if isinstance(disk_usage, (int, float)):
+        return int(disk_usage)
+    match = DISK_USAGE_RE.match(disk_usage or "")
+    if match is None:
+        return None
+    unit = match.group(2).upper().rstrip("B")
+    return int(float(match.group(1)) * DISK_USAGE_UNITS[unit])
+
+
+def format_disk_usage(num_bytes):
+    """
+    :param num_bytes: bytes
+    :return: disk usage in whole GB the way HySDS job specs express it, e.g. 40GB
+    """
+    return "{}GB".format(max(1, int(math.ceil(num_bytes / float(DISK_USAGE_UNITS["G"])))))
+
+
+def estimate_disk_usage(localize_urls, factor=2.0):
+    """
+    :param localize_urls: localize list enriched with the file sizes
+    :param factor: multiplier applied to the input size to leave room for the outputs
+    :return: estimated disk usage in bytes, which only counts the inputs of known size, or None
+     if the size of none of them is known
+    """
+    sizes = [element["size"] for element in localize_urls if element.get("size", None) is not None]
+    if not sizes:
+        return None
+    return int(sum(sizes) * factor)
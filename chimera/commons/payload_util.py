@@ -0,0 +1,123 @@
+"""
+Helpers to slim down PGE job payloads and to get the full params back on the worker.
+
+With the slim_payload section in a PGE config, the job params carry a reference to the PGE config
+instead of the config itself, and optionally a compressed run config:
+
+"pge_config": {"pge_config_ref": {"path": "/home/ops/.../PGE_L0B.yaml", "hash": "...", "version": "..."}}
+"run_config": {"encoding": "zlib+base64", "data": "..."}
+
+resolve_pge_config and decode_run_config turn those back into the dicts, and return params that
+were not slimmed down as-is.
+
+On the worker, the PGE's wrapper script resolves the job's context file before it reads the params:
+
+python -m chimera.commons.payload_util _context.json
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import zlib
+
+from chimera.commons.conf_util import load_config
+
+PGE_CONFIG_REF = "pge_config_ref"
+ENCODING = "encoding"
+DATA = "data"
+ZLIB_BASE64 = "zlib+base64"
+
+
+def get_config_hash(config):
+    """
+    :param config: loaded config
+    :return: hex digest of the config's canonical JSON
+    """
+    data = json.dumps(config, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def get_pge_config_ref(pge_config, path, version=None):
+    """
+    :param pge_config: loaded PGE config
+    :param path: path to the PGE config file within the container running the PGE
+    :param version: release version the PGE config comes from
+    :return: reference to put in place of the PGE config
+    """
+    return {PGE_CONFIG_REF: {"path": path, "hash": get_config_hash(pge_config), "version": version}}
+
+
+def resolve_pge_config(pge_config):
+    """
+    :param pge_config: PGE config, or a reference to it, as found in the job params
+    :return: the PGE config
+    """
+    if not isinstance(pge_config, dict) or PGE_CONFIG_REF not in pge_config:
+        return pge_config
+    ref = pge_config[PGE_CONFIG_REF]
+    resolved = load_config(ref["path"])
+    if ref.get("hash") and get_config_hash(resolved) != ref["hash"]:
+        raise Exception(
+            "PGE config {} of version {} does not match the one the job was submitted with".format(
+                ref["path"], ref.get("version")
+            )
+        )
+    return resolved
+
+
+def encode_run_config(run_config, level=6):
+    """
+    :param run_config: run config created by the input preprocessor
+    :param level: zlib compression level
+    :return: compressed run config
+    """
+    data = json.dumps(run_config, separators=(",", ":")).encode("utf-8")
+    return {ENCODING: ZLIB_BASE64, DATA: base64.b64encode(zlib.compress(data, level)).decode("ascii")}
+
+
+def decode_run_config(run_config):
+    """
+    :param run_config: run config, compressed or not, as found in the job params
+    :return: the run config
+    """
+    if not isinstance(run_config, dict) or run_config.get(ENCODING) != ZLIB_BASE64:
+        return run_config
+    return json.loads(zlib.decompress(base64.b64decode(run_config[DATA])).decode("utf-8"))
+
+
+def resolve_params(params):
+    """
+    :param params: job params constructed by PgeJobSubmitter
+    :return: copy of the params with the full PGE config and run config
+    """
+    params = dict(params)
+    if "pge_config" in params:
+        params["pge_config"] = resolve_pge_config(params["pge_config"])
+    if "run_config" in params:
+        params["run_config"] = decode_run_config(params["run_config"])
+    return params
+
+
+def resolve_context_file(context_file, output_file=None):
+    """
+    Resolves the job params in the context file of a PGE job, see resolve_params.
+    :param context_file: _context.json of the PGE job
+    :param output_file: file to write the resolved context to, defaults to the context file itself
+    :return: the resolved context
+    """
+    with open(context_file, "r") as f:
+        context = json.load(f)
+    resolved = resolve_params(context)
+    if resolved != context or output_file is not None:
+        with open(output_file or context_file, "w") as f:
+            json.dump(resolved, f, indent=2)
+    return resolved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resolves the slimmed down job params of a PGE job")
+    parser.add_argument("context_file", help="_context.json of the PGE job")
+    parser.add_argument("--output_file", help="file to write the resolved context to, defaults to context_file")
+    args = parser.parse_args()
+    resolve_context_file(args.context_file, args.output_file)
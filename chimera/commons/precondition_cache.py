@@ -0,0 +1,202 @@
+"""
+Local disk cache of precondition function results, so retried or reprocessed workflows don't
+repeat the same catalog queries.
+
+Only functions marked with @cacheable are cached, and only when the cache is switched on through
+the CHIMERA area of the settings file, e.g.
+
+CHIMERA:
+  PRECONDITION_CACHE:
+    enabled: true
+    cache_dir: /data/work/cache/chimera_preconditions
+    ttl: 86400            # seconds a result stays valid
+    max_size: 536870912   # max total size of the cached results in bytes
+
+A result is keyed by the function's name, the context fields it depends on, the PGE config and
+the values of the job_params it declared reading, so a change to any of them is a cache miss.
+
+Every entry is a file of two JSON lines: a header holding the time the entry expires, so eviction
+only has to read the header, followed by the entry itself.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from chimera.logger import logger
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "chimera_precondition_cache")
+CACHE_FILE_SUFFIX = ".json"
+
+
+def get_content_hash(value):
+    """
+    :param value: JSON serializable value
+    :return: hex digest of the value's canonical JSON
+    """
+    data = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def get_field(context, field):
+    """
+    Gets a field out of the context using dot notation, e.g. product_metadata.metadata.FileName.
+    :return: the field's value, or None if it is missing
+    """
+    value = context
+    for key in field.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+class PreconditionCache(object):
+    def __init__(self, enabled=False, cache_dir=DEFAULT_CACHE_DIR, ttl=86400, max_size=512 * 1024 * 1024):
+        """
+        :param enabled: whether to cache anything
+        :param cache_dir: directory holding the cached results
+        :param ttl: seconds a result stays valid
+        :param max_size: max total size of the cached results in bytes
+        """
+        self.enabled = enabled
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_size = max_size
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        :param config: PRECONDITION_CACHE settings from the CHIMERA area of the settings file
+        :return: PreconditionCache
+        """
+        return cls(**(config or {}))
+
+    def get_key(self, function_name, context, context_fields, pge_config_hash, job_params, reads):
+        """
+        :param function_name: name of the precondition function
+        :param context: sciflo context
+        :param context_fields: dot notation keys of the context fields the function depends on,
+         or None if it depends on the whole context
+        :param pge_config_hash: content hash of the PGE config
+        :param job_params: current job_params
+        :param reads: job_params keys the function reads
+        :return: cache key
+        """
+        if context_fields is None:
+            context_values = context
+        else:
+            context_values = {field: get_field(context, field) for field in context_fields}
+        return get_content_hash({
+            "function": function_name,
+            "context": context_values,
+            "pge_config": pge_config_hash,
+            "job_params": {key: job_params.get(key, None) for key in sorted(reads or [])},
+        })
+
+    def _get_path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_FILE_SUFFIX)
+
+    @staticmethod
+    def _is_expired(header, now):
+        expires = header.get("expires", None)
+        return expires is not None and now > expires
+
+    def get(self, key):
+        """
+        :param key: cache key
+        :return: the cached result, or None if there is no valid one
+        """
+        path = self._get_path(key)
+        try:
+            with open(path) as f:
+                header = json.loads(f.readline())
+                entry = json.loads(f.readline())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Ignoring unreadable cache entry {}: {}".format(path, e))
+            return None
+
+        if self._is_expired(header, time.time()):
+            logger.debug("Cache entry {} of {} expired".format(key, entry["function"]))
+            self._remove(path)
+            return None
+        # mark the entry as recently used for eviction
+        try:
+            os.utime(path)
+        except OSError:
+            # evicted by another job since it was read
+            pass
+        return entry["result"]
+
+    def put(self, key, function_name, result, ttl=None):
+        """
+        Caches the result. Results that can't be serialized to JSON are not cached.
+        :param key: cache key
+        :param function_name: name of the precondition function
+        :param result: result of the function
+        :param ttl: seconds the result stays valid, overriding the cache's ttl
+        """
+        created = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        header = {"expires": None if ttl is None else created + ttl}
+        try:
+            data = "{}\n{}\n".format(
+                json.dumps(header),
+                json.dumps({"created": created, "function": function_name, "result": result}),
+            )
+        except (TypeError, ValueError) as e:
+            logger.warning("Not caching the result of {}: {}".format(function_name, e))
+            return
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, self._get_path(key))
+        except Exception as e:
+            logger.warning("Could not cache the result of {}: {}".format(function_name, e))
+            return
+        self.evict()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self):
+        """
+        Removes expired entries, then the least recently used ones until the cache fits in max_size.
+        The modification time of an entry is the last time it was used.
+        """
+        entries = []
+        now = time.time()
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(CACHE_FILE_SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                    with open(entry.path) as f:
+                        header = json.loads(f.readline())
+                except FileNotFoundError:
+                    continue
+                except Exception:
+                    # unreadable entries are only evicted by size
+                    header = dict()
+                if self._is_expired(header, now):
+                    self._remove(entry.path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if self.max_size is None or total_size <= self.max_size:
+                break
+            self._remove(path)
+            total_size -= size
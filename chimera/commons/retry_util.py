@@ -0,0 +1,210 @@
+"""
+Retry policy used for the ES queries made by Chimera.
+
+The policy is configured through the CHIMERA area of the settings file, e.g.
+
+CHIMERA:
+  ES_RETRY_POLICY:
+    max_attempts: 4
+    initial_backoff: 1
+    backoff_multiplier: 2
+    max_backoff: 30
+    jitter: true
+    deadline: 180
+    timeout_increment: 30
+    retry_on: [ConnectionError, ConnectionTimeout, TransportError]
+    retry_on_status: [429, 502, 503, 504]
+"""
+
+import asyncio
+import random
+import time
+
+from chimera.logger import logger
+
+# exceptions retried by default, the transient errors of the ES client. Other transport errors,
+# like a 400 for a bad query or a 404, are raised right away.
+RETRY_ON = ["ConnectionError", "ConnectionTimeout", "TransportError"]
+RETRY_ON_STATUS = [429, 502, 503, 504]
+
+
+class RetryError(Exception):
+    """Raised when a RetryPolicy gives up on a call."""
+
+    def __init__(self, message, attempts, last_error=None):
+        super(RetryError, self).__init__(message)
+        self.attempts = attempts
+        self.last_error = last_error
+
+
+class RetryableResult(Exception):
+    """Wraps a result that the retry_on_result predicate rejected."""
+
+    def __init__(self, result):
+        super(RetryableResult, self).__init__("Result was rejected by the retry policy")
+        self.result = result
+
+
+class RetryPolicy(object):
+    """
+    Retries a call with a jittered exponential backoff until it succeeds, the max number of
+    attempts is reached or the total deadline would be exceeded.
+    """
+
+    def __init__(
+        self,
+        max_attempts=3,
+        initial_backoff=1.0,
+        backoff_multiplier=2.0,
+        max_backoff=30.0,
+        jitter=True,
+        deadline=None,
+        timeout_increment=0,
+        retry_on=None,
+        retry_on_status=None,
+        retry_on_result=None,
+    ):
+        """
+        :param max_attempts: max number of times the call is made
+        :param initial_backoff: seconds to wait before the first retry
+        :param backoff_multiplier: factor the backoff grows by after every retry
+        :param max_backoff: upper limit of a single backoff in seconds
+        :param jitter: randomize each backoff between half and all of its value
+        :param deadline: total seconds after which no more attempts are started
+        :param timeout_increment: seconds added to the request timeout on every retry
+        :param retry_on: names of the exception classes (or any of their base classes) that are
+         retried, defaults to RETRY_ON. Use [Exception] to retry all exceptions.
+        :param retry_on_status: HTTP status codes that are retried, defaults to RETRY_ON_STATUS.
+         Exceptions carrying a different integer status_code are raised right away.
+        :param retry_on_result: predicate that returns True for results that should be retried
+        """
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1: {}".format(max_attempts))
+        self.max_attempts = int(max_attempts)
+        self.initial_backoff = float(initial_backoff)
+        self.backoff_multiplier = float(backoff_multiplier)
+        self.max_backoff = float(max_backoff)
+        self.jitter = jitter
+        self.deadline = deadline
+        self.timeout_increment = timeout_increment
+        self.retry_on = set(RETRY_ON if retry_on is None else retry_on)
+        self.retry_on_status = set(RETRY_ON_STATUS if retry_on_status is None else retry_on_status)
+        self.retry_on_result = retry_on_result
+
+    @classmethod
+    def from_config(cls, config=None, **kwargs):
+        """
+        Creates a policy from a settings dictionary. Keyword arguments act as defaults for the
+        keys that are missing from the config.
+        :param config: dict of RetryPolicy constructor arguments
+        :return: RetryPolicy
+        """
+        params = dict(kwargs)
+        params.update(config or {})
+        return cls(**params)
+
+    def get_backoff(self, attempt):
+        """
+        :param attempt: number of the attempt that just failed, starting at 1
+        :return: seconds to wait before the next attempt
+        """
+        backoff = min(
+            self.max_backoff,
+            self.initial_backoff * (self.backoff_multiplier ** (attempt - 1)),
+        )
+        if self.jitter:
+            backoff = random.uniform(backoff / 2, backoff)
+        return backoff
+
+    def get_request_timeout(self, request_timeout, attempt):
+        """
+        :param request_timeout: request timeout of the first attempt
+        :param attempt: number of the attempt, starting at 1
+        :return: request timeout to use for the given attempt
+        """
+        return int(request_timeout + (attempt - 1) * self.timeout_increment)
+
+    def is_retryable(self, error):
+        """
+        :param error: exception raised by the call
+        :return: True if the call should be retried
+        """
+        if isinstance(error, RetryableResult):
+            return True
+        names = set(c.__name__ for c in type(error).__mro__)
+        if not names & self.retry_on:
+            return False
+        status_code = getattr(error, "status_code", None)
+        if isinstance(status_code, int):
+            return status_code in self.retry_on_status
+        return True
+
+    def _next_backoff(self, attempt, max_attempts, start, error):
+        """
+        Determines how long to wait before the next attempt, or raises RetryError if there
+        shouldn't be another one.
+        """
+        if attempt >= max_attempts:
+            raise RetryError(
+                "Giving up after {} attempt(s): {}".format(attempt, error), attempt, error
+            ) from error
+        backoff = self.get_backoff(attempt)
+        if self.deadline is not None and time.monotonic() - start + backoff >= self.deadline:
+            raise RetryError(
+                "Giving up after {} attempt(s), deadline of {} seconds reached: {}".format(
+                    attempt, self.deadline, error
+                ),
+                attempt,
+                error,
+            ) from error
+        logger.warning(
+            "Attempt {} of {} failed, retrying in {:.2f} seconds: {}".format(
+                attempt, max_attempts, backoff, error
+            )
+        )
+        return backoff
+
+    def _check_result(self, result):
+        if self.retry_on_result is not None and self.retry_on_result(result):
+            raise RetryableResult(result)
+        return result
+
+    def call(self, func, max_attempts=None):
+        """
+        Calls func until it succeeds according to the policy.
+        :param func: callable taking the attempt number (starting at 1)
+        :param max_attempts: overrides the policy's max number of attempts for this call
+        :return: result of func
+        """
+        max_attempts = max_attempts or self.max_attempts
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return self._check_result(func(attempt))
+            except Exception as e:
+                if not self.is_retryable(e):
+                    raise
+                backoff = self._next_backoff(attempt, max_attempts, start, e)
+            time.sleep(backoff)
+
+    async def call_async(self, func, max_attempts=None):
+        """
+        Coroutine version of call.
+        :param func: callable taking the attempt number (starting at 1) and returning an awaitable
+        :param max_attempts: overrides the policy's max number of attempts for this call
+        :return: result of func
+        """
+        max_attempts = max_attempts or self.max_attempts
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return self._check_result(await func(attempt))
+            except Exception as e:
+                if not self.is_retryable(e):
+                    raise
+                backoff = self._next_backoff(attempt, max_attempts, start, e)
+            await asyncio.sleep(backoff)
@@ -0,0 +1,200 @@
+"""
+Compiled form of the runconfig found in a PGE config.
+
+The locations of the values that the input preprocessor has to fill in are found once per PGE
+config, so rendering the runconfig of a job only has to visit those locations instead of walking
+the whole runconfig.
+
+Only the branches of a rendered runconfig leading to a filled in field are new. The static branches
+are shared by all renders of the template, read-only, so they cost nothing to render. They
+serialize, copy and pickle as plain dicts and lists, deep copy one to change it.
+"""
+
+import copy
+import json
+import threading
+
+from collections import OrderedDict
+
+from chimera.logger import logger
+
+# max number of compiled templates kept in memory
+TEMPLATE_CACHE_SIZE = 32
+
+_template_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError("Static branches of a rendered runconfig are shared with its template and can't be "
+                    "changed, deep copy them first")
+
+
+class FrozenDict(dict):
+    """
+    Static dict of a template, shared by all of its renders.
+    """
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return {k: copy.deepcopy(v, memo) for k, v in self.items()}
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+class FrozenList(list):
+    """
+    Static list of a template, shared by all of its renders.
+    """
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = clear = extend = insert = pop = remove = reverse = sort = _read_only
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return [copy.deepcopy(v, memo) for v in self]
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+def freeze(value):
+    """
+    :return: the value with all of its dicts and lists made read-only
+    """
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return FrozenList(freeze(v) for v in value)
+    return value
+
+
+class RunConfigTemplate(object):
+    def __init__(self, runconfig, empty_field_identifier, optional_fields=None):
+        """
+        :param runconfig: runconfig of the PGE config
+        :param empty_field_identifier: value marking the fields to be filled in
+        :param optional_fields: fields that are set to an empty string if they were not evaluated
+        """
+        self._runconfig = copy.deepcopy(runconfig)
+        self._empty_field_identifier = empty_field_identifier
+        self._optional_fields = set(optional_fields or [])
+        self._slots = []
+        self._compile(self._runconfig, ())
+        # paths of the dicts holding a field to be filled in, and of their ancestors
+        self._branches = {path[:i] for path, _, _ in self._slots for i in range(len(path))}
+        self._freeze_static(self._runconfig, ())
+
+    def _compile(self, d, root):
+        """
+        Records the path, the dot notation key and the bare key of every field holding the
+        empty field identifier, in the same order repl_val_in_dict visits them.
+        """
+        for k, v in d.items():
+            path = root + (k,)
+            if isinstance(v, dict):
+                self._compile(v, path)
+            elif v == self._empty_field_identifier:
+                self._slots.append((path, ".".join(str(p) for p in path), k))
+
+    @property
+    def slots(self):
+        """
+        :return: list of tuple(path, dot notation key, key) of the fields to be filled in
+        """
+        return self._slots
+
+    def _evaluate(self, jp_key, k, job_params):
+        """
+        Finds the value of a field, following the same rules as repl_val_in_dict.
+        :return: tuple(value, matched key or None)
+        """
+        # use job_params with explicit dot notation
+        if jp_key in job_params:
+            return job_params[jp_key], jp_key
+        # maintain backwards-compatibility of using job_param values without dot notation
+        if k in job_params:
+            return job_params[k], k
+        # check if optionalField; if so, set value to empty string
+        if jp_key in self._optional_fields:
+            logger.info("Explicit dot notation key {} is an optional field.".format(jp_key))
+            logger.info("Setting {} value to empty string.".format(k))
+            return "", None
+        if k in self._optional_fields:
+            logger.info("Key {} is an optional field.".format(k))
+            logger.info("Setting {} value to empty string.".format(k))
+            return "", None
+        logger.error("job_params: {}".format(json.dumps(job_params, indent=2, sort_keys=True)))
+        raise ValueError("{} or {} has not been evaluated by the preprocessor.".format(jp_key, k))
+
+    def render(self, job_params):
+        """
+        Fills in the runconfig with the values from the job_params.
+        :param job_params: results of the precondition functions
+        :return: tuple(filled in runconfig, list of the job_params keys that were used)
+        """
+        # branches of the output holding fields to be filled in, keyed by their path
+        branches = dict()
+        output = self._copy(self._runconfig, (), branches)
+        matched_keys = []
+        for path, jp_key, k in self._slots:
+            value, matched_key = self._evaluate(jp_key, k, job_params)
+            branches[path[:-1]][k] = value
+            if matched_key is not None:
+                matched_keys.append(matched_key)
+        return output, matched_keys
+
+    def _freeze_static(self, d, path):
+        """
+        Makes the branches without fields to be filled in read-only, so renders can share them.
+        """
+        for k, v in d.items():
+            if path + (k,) in self._branches:
+                self._freeze_static(v, path + (k,))
+            else:
+                d[k] = freeze(v)
+
+    def _copy(self, d, path, branches):
+        """
+        Copies the dicts on the way from the given path to the fields to be filled in. The static
+        branches are shared with the template.
+        """
+        output = dict(d)
+        branches[path] = output
+        for k, v in d.items():
+            if path + (k,) in self._branches:
+                output[k] = self._copy(v, path + (k,), branches)
+        return output
+
+
+def get_runconfig_template(key, runconfig, empty_field_identifier, optional_fields=None):
+    """
+    Gets the compiled template of the runconfig, compiling it on first use.
+    :param key: hashable key identifying the runconfig, e.g. the signature of its PGE config
+     file. The template is not cached if None.
+    :param runconfig: runconfig of the PGE config
+    :param empty_field_identifier: value marking the fields to be filled in
+    :param optional_fields: fields that are set to an empty string if they were not evaluated
+    :return: RunConfigTemplate
+    """
+    if key is None:
+        return RunConfigTemplate(runconfig, empty_field_identifier, optional_fields)
+
+    with _lock:
+        template = _template_cache.get(key, None)
+        if template is not None:
+            _template_cache.move_to_end(key)
+            return template
+
+    template = RunConfigTemplate(runconfig, empty_field_identifier, optional_fields)
+    with _lock:
+        _template_cache[key] = template
+        while len(_template_cache) > TEMPLATE_CACHE_SIZE:
+            _template_cache.popitem(last=False)
+    return template
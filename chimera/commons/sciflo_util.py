@@ -1,14 +1,61 @@
 #!/usr/bin/env python
 import os
+import ast
+import errno
 import json
+import mmap
 import re
+import shutil
+import signal
 import subprocess
+import sys
+import threading
+import time
+import traceback
+
+from concurrent.futures import ThreadPoolExecutor
 
 WORK_RE = re.compile(r"\d{5}-.+")
 
+# sflExec.py output and resource usage
+SCIFLO_STDOUT_LOG = "sciflo_stdout.log"
+SCIFLO_STDERR_LOG = "sciflo_stderr.log"
+SCIFLO_STATS_FILE = "_sciflo_exec_stats.json"
+MAX_LOG_BYTES = 100 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+# seconds between SIGTERM and SIGKILL when sflExec.py has to be stopped
+KILL_GRACE_PERIOD = 30
+# seconds between checks on sflExec.py
+POLL_INTERVAL = 0.5
+
+# ways copy_sciflo_work can materialize the work unit dirs
+HARDLINK = "hardlink"
+REFLINK = "reflink-if-supported"
+COPY = "copy"
+KEEP_SYMLINK = "keep-symlink"
+COPY_MODES = [HARDLINK, REFLINK, COPY, KEEP_SYMLINK]
+# max number of work units copied at the same time
+COPY_MAX_WORKERS = 8
+# ioctl to share the data blocks of a file with another one, see ioctl_ficlone(2)
+FICLONE = 0x40049409
+
+# max size of the exceptionMessage in sciflo.json that gets parsed
+MAX_EXCEPTION_MESSAGE_BYTES = 16 * 1024 * 1024
+# max number of characters kept of a traceback, split between its head and its tail
+MAX_TRACEBACK_CHARS = 64 * 1024
+# tokens that matter when skipping over a JSON value: strings and brackets
+JSON_STRING_RE = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"')
+JSON_TOKEN_RE = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{}]')
+JSON_SCALAR_RE = re.compile(rb'[^,}\]\s]*')
+JSON_WHITESPACE_RE = re.compile(rb"\s*")
+
 # sciflo PGE process names and mapping to their config files
 # This is the list of PGEs that need to report status to an explict index
 MAX_PLACEHOLDER_FILE_SIZE = 1000
+# max size of each of the error files, split between the head and the tail of the error
+MAX_ERROR_FILE_BYTES = 1024 * 1024
+# free disk space to leave after writing the error files, below which the placeholders are used
+MIN_FREE_BYTES = 10 * 1024 * 1024
 PLACEHOLDER_ERROR_FILE = "_alt_error_hold.txt"
 PLACEHOLDER_TB_FILE = "_alt_traceback_hold.txt"
 PLACEHOLDER_DOCKER_STATS_FILE = "_docker_stats_hold.json"
@@ -29,13 +76,12 @@ def __create_placeholder_alt_files():
     :param work_dir:
     :return:
     """
+    # write the bytes out instead of seeking, so the space is actually allocated
     with open(PLACEHOLDER_ERROR_FILE, "wb") as f:
-        f.seek(MAX_PLACEHOLDER_FILE_SIZE)
-        f.write(b"\0")
+        f.write(b"\0" * (MAX_PLACEHOLDER_FILE_SIZE + 1))
 
     with open(PLACEHOLDER_TB_FILE, "wb") as f:
-        f.seek(MAX_PLACEHOLDER_FILE_SIZE)
-        f.write(b"\0")
+        f.write(b"\0" * (MAX_PLACEHOLDER_FILE_SIZE + 1))
 
     with open(PLACEHOLDER_DOCKER_STATS_FILE, "w") as f:
         json.dump(dict(), f)
@@ -45,132 +91,587 @@ def __cleanup_placeholder_alt_files():
     for temp_file in PLACEHOLDER_FILES:
         if os.path.exists(temp_file):
             print(f"Remove existing placeholder file: {temp_file}")
+            try:
+                os.remove(temp_file)
+            except OSError as oe:
+                print(f"Could not remove {temp_file}: {str(oe)}")
 
 
-def __write_error_files(error, traceback):
+def __write_bounded(f, text, max_bytes):
+    """
+    Writes the text followed by a newline, keeping only its head and tail if it takes more than
+    max_bytes.
+    """
+    data = ("%s" % text).encode("utf-8", errors="replace")
+    if len(data) <= max_bytes:
+        f.write(data)
+    else:
+        half = max_bytes // 2
+        f.write(data[:half].decode("utf-8", errors="ignore").encode("utf-8"))
+        f.write(("\n... [%d bytes truncated] ...\n" % (len(data) - 2 * half)).encode("utf-8"))
+        f.write(data[-half:].decode("utf-8", errors="ignore").encode("utf-8"))
+    f.write(b"\n")
+
+
+def __write_placeholder_error_files(error, traceback, alt_error_file, alt_tb_file):
+    """Writes the errors to the placeholder files created up front, so no new space is needed."""
+    print(f"Renaming {PLACEHOLDER_ERROR_FILE} to {alt_error_file}.")
+    os.replace(PLACEHOLDER_ERROR_FILE, alt_error_file)
+    print(f"Renaming {PLACEHOLDER_TB_FILE} to {alt_tb_file}.")
+    os.replace(PLACEHOLDER_TB_FILE, alt_tb_file)
+
+    # r+ overwrites the allocated bytes in place, the rest is cut off afterwards
+    with open(alt_error_file, "r+b") as f:
+        __write_bounded(f, error, MAX_PLACEHOLDER_FILE_SIZE)
+        f.truncate()
+    with open(alt_tb_file, "r+b") as f:
+        __write_bounded(f, traceback, MAX_PLACEHOLDER_FILE_SIZE)
+        f.truncate()
+    print(f"Successfully wrote the errors to {alt_error_file} and {alt_tb_file}")
+
+
+def __write_error_files(error, traceback, max_bytes=None):
     alt_error_file = "_alt_error.txt"
     alt_tb_file = "_alt_traceback.txt"
     docker_stats_file = "_docker_stats.json"
+    if max_bytes is None:
+        max_bytes = MAX_ERROR_FILE_BYTES
 
+    # check up front whether the errors fit on the disk, with some room to spare
+    needed = 2 * (max_bytes + 1) + MIN_FREE_BYTES
     try:
-        with open(alt_error_file, "w") as f:
-            f.write("%s\n" % error)
-        with open(alt_tb_file, "w") as f:
-            f.write("%s\n" % traceback)
-    except OSError as oe:
-        print(
-            f"OSError encountered: {str(oe)}. Will write errors to placeholder files."
-        )
-        print(f"Renaming {PLACEHOLDER_ERROR_FILE} to {alt_error_file}.")
-        os.rename(PLACEHOLDER_ERROR_FILE, alt_error_file)
-        print(f"Renaming {PLACEHOLDER_TB_FILE} to {alt_tb_file}.")
-        os.rename(PLACEHOLDER_TB_FILE, alt_tb_file)
-
-        with open(alt_error_file, "w") as f:
-            f.write("%s\n" % error[:MAX_PLACEHOLDER_FILE_SIZE])
-
-        with open(alt_tb_file, "w") as f:
-            f.write("%s\n" % traceback[:MAX_PLACEHOLDER_FILE_SIZE])
-        print(f"Successfully wrote the errors to {alt_error_file} and {alt_tb_file}")
-
-        if (
-            os.path.exists(docker_stats_file)
-            and os.path.getsize(docker_stats_file) == 0
-        ):
+        free = shutil.disk_usage(".").free
+    except OSError:
+        free = None
+    if free is not None and free < needed and os.path.exists(PLACEHOLDER_ERROR_FILE):
+        print(f"Only {free} bytes free on disk. Will write errors to placeholder files.")
+        __write_placeholder_error_files(error, traceback, alt_error_file, alt_tb_file)
+    else:
+        try:
+            with open(alt_error_file, "wb") as f:
+                __write_bounded(f, error, max_bytes)
+            with open(alt_tb_file, "wb") as f:
+                __write_bounded(f, traceback, max_bytes)
+        except OSError as oe:
+            print(
+                f"OSError encountered: {str(oe)}. Will write errors to placeholder files."
+            )
+            __write_placeholder_error_files(error, traceback, alt_error_file, alt_tb_file)
+
+    # always leave a valid _docker_stats.json behind
+    if not os.path.exists(docker_stats_file) or os.path.getsize(docker_stats_file) == 0:
+        if os.path.exists(PLACEHOLDER_DOCKER_STATS_FILE):
             print(f"Renaming {PLACEHOLDER_DOCKER_STATS_FILE} to {docker_stats_file}")
-            os.rename(PLACEHOLDER_DOCKER_STATS_FILE, docker_stats_file)
+            os.replace(PLACEHOLDER_DOCKER_STATS_FILE, docker_stats_file)
             print(
                 f"Successfully renamed {PLACEHOLDER_DOCKER_STATS_FILE} to {docker_stats_file}"
             )
+        else:
+            with open(docker_stats_file, "w") as f:
+                json.dump(dict(), f)
 
 
-def copy_sciflo_work(output_dir):
-    """Move over smap_sciflo work dirs."""
+class _UnitCopier(object):
+    """Copies a work unit dir, counting the bytes copied."""
 
-    # Instead of creating symlinks like it was initially doing, this has been updated
-    # to copy the sciflo workunit directories to its human readable sciflo step.
-    for root, dirs, files in os.walk(output_dir):
+    def __init__(self, mode):
+        self.mode = mode
+        self.bytes = 0
+
+    def _reflink(self, src, dst):
+        import fcntl
+
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        shutil.copystat(src, dst)
+
+    def copy_file(self, src, dst):
+        if self.mode == HARDLINK:
+            try:
+                os.link(src, dst)
+                self.bytes += os.path.getsize(dst)
+                return dst
+            except OSError:
+                # e.g. the work dir is on another file system
+                pass
+        elif self.mode == REFLINK:
+            try:
+                self._reflink(src, dst)
+                self.bytes += os.path.getsize(dst)
+                return dst
+            except (OSError, ImportError) as e:
+                if getattr(e, "errno", None) not in (None, errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL):
+                    raise
+        shutil.copy2(src, dst)
+        self.bytes += os.path.getsize(dst)
+        return dst
+
+
+def __copy_work_unit(path, mode):
+    """Replaces the symlink to a work unit with a copy of the work unit."""
+    start = time.monotonic()
+    real_path = os.path.realpath(path)
+    tmp_path = "%s.copying" % path
+    copier = _UnitCopier(mode)
+    if os.path.lexists(tmp_path):
+        shutil.rmtree(tmp_path)
+    shutil.copytree(real_path, tmp_path, symlinks=True, copy_function=copier.copy_file)
+    os.unlink(path)
+    os.rename(tmp_path, path)
+    return {"path": path, "mode": mode, "bytes": copier.bytes, "seconds": time.monotonic() - start}
+
+
+def __find_work_unit_links(root_dir):
+    """Finds the symlinks to work unit dirs below the given dir, without following any symlinks."""
+    links = []
+    for root, dirs, files in os.walk(root_dir):
         for d in dirs:
             if not WORK_RE.search(d):
                 continue
             path = os.path.join(root, d)
             if os.path.islink(path) and os.path.exists(path):
-                real_path = os.path.realpath(path)
-                os.unlink(path)
-                base_name = os.path.basename(path)
-                new_path = os.path.join(root, base_name)
+                links.append(path)
+    return links
+
+
+def copy_sciflo_work(output_dir, mode=HARDLINK, max_workers=COPY_MAX_WORKERS):
+    """Move over smap_sciflo work dirs."""
+
+    # Instead of creating symlinks like it was initially doing, this has been updated
+    # to copy the sciflo workunit directories to its human readable sciflo step.
+    # Files are hard linked where possible, so the copy takes no extra space, and copied otherwise.
+    if mode not in COPY_MODES:
+        raise ValueError("Unknown copy mode '%s'. Should be one of the following: %s" % (mode, COPY_MODES))
+    if mode == KEEP_SYMLINK:
+        return []
+
+    reports = []
+    links = __find_work_unit_links(output_dir)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while links:
+            futures = {executor.submit(__copy_work_unit, path, mode): path for path in links}
+            links = []
+            for future, path in futures.items():
                 try:
-                    subprocess.run(["cp", "-R", real_path, new_path], check=True, text=True, capture_output=True)
-                except subprocess.CalledProcessError as e:
-                    print(f"Error occurred during copy: return code = {e.returncode}\n{e.stderr}")  # captures stderr output
-    return
+                    report = future.result()
+                except Exception as e:
+                    print(f"Error occurred during copy of {path}: {e}")
+                    continue
+                print(f"Copied {report['path']} ({mode}): {report['bytes']} bytes in {report['seconds']:.2f}s")
+                reports.append(report)
+                # the copied work unit can link to further work units
+                links.extend(__find_work_unit_links(path))
+    return reports
+
+
+def __skip_whitespace(buf, pos):
+    return JSON_WHITESPACE_RE.match(buf, pos).end()
+
+
+def __skip_json_value(buf, pos):
+    """Returns the position right after the JSON value starting at pos, without decoding it."""
+    start = buf[pos:pos + 1]
+    if start == b'"':
+        return JSON_STRING_RE.match(buf, pos).end()
+    if start in (b"{", b"["):
+        depth = 0
+        for m in JSON_TOKEN_RE.finditer(buf, pos):
+            token = m.group()
+            if token in (b"{", b"["):
+                depth += 1
+            elif token in (b"}", b"]"):
+                depth -= 1
+                if depth == 0:
+                    return m.end()
+        raise ValueError("Unterminated JSON value at %d" % pos)
+    return JSON_SCALAR_RE.match(buf, pos).end()
+
+
+def find_top_level_values(buf, keys):
+    """
+    Finds the values of the given keys of the top level JSON object, skipping over all other
+    values without decoding them.
+
+    :param buf: bytes-like object holding a JSON object, e.g. an mmap of a JSON file
+    :param keys: keys to look for
+    :return: dict of key to tuple(start, end) of its still encoded value in buf
+    """
+    spans = dict()
+    pos = __skip_whitespace(buf, 0)
+    if buf[pos:pos + 1] != b"{":
+        raise ValueError("Not a JSON object")
+    pos += 1
+    while True:
+        pos = __skip_whitespace(buf, pos)
+        if buf[pos:pos + 1] == b"}":
+            break
+        m = JSON_STRING_RE.match(buf, pos)
+        if m is None:
+            raise ValueError("Expected a key at %d" % pos)
+        key = json.loads(m.group())
+        pos = __skip_whitespace(buf, m.end())
+        if buf[pos:pos + 1] != b":":
+            raise ValueError("Expected ':' at %d" % pos)
+        value_start = __skip_whitespace(buf, pos + 1)
+        pos = __skip_json_value(buf, value_start)
+        if key in keys:
+            spans[key] = (value_start, pos)
+            if len(spans) == len(keys):
+                break
+        pos = __skip_whitespace(buf, pos)
+        if buf[pos:pos + 1] != b",":
+            break
+        pos += 1
+    return spans
+
+
+def truncate_text(text, max_chars):
+    """Keeps the head and the tail of the text if it is longer than max_chars."""
+    if text is None or len(text) <= max_chars:
+        return text
+    half = max_chars // 2
+    return "%s\n... [%d characters truncated] ...\n%s" % (text[:half], len(text) - 2 * half, text[-half:])
+
+
+class ExceptionRepr(object):
+    """Stands in for an exception found in a repr, which literal_eval can't recreate."""
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = tuple(args)
+
+    def __str__(self):
+        # same as BaseException.__str__
+        if not self.args:
+            return ""
+        if len(self.args) == 1:
+            return str(self.args[0])
+        return str(self.args)
 
+    def __repr__(self):
+        return "%s%r" % (self.name, self.args)
 
-def extract_error(sfl_json):
+
+def __from_ast(node):
+    """Same as ast.literal_eval, except that calls such as exception reprs become ExceptionRepr."""
+    if isinstance(node, ast.Call):
+        # only plain or dotted class names, e.g. RuntimeError(...) or sciflo.SciFloError(...)
+        func = node.func
+        while isinstance(func, ast.Attribute):
+            func = func.value
+        if not isinstance(func, ast.Name):
+            raise ValueError("Unsupported call in exception message")
+        return ExceptionRepr(ast.unparse(node.func), [__from_ast(arg) for arg in node.args])
+    if isinstance(node, ast.Tuple):
+        return tuple(__from_ast(e) for e in node.elts)
+    if isinstance(node, ast.List):
+        return [__from_ast(e) for e in node.elts]
+    if isinstance(node, ast.Dict):
+        return {__from_ast(k): __from_ast(v) for k, v in zip(node.keys, node.values)}
+    return ast.literal_eval(node)
+
+
+def parse_literal(text):
+    """
+    Safely parses the repr of a Python value, as found in sciflo's exceptionMessage.
+
+    :param text: repr to parse
+    :return: the value, with any exception reprs turned into ExceptionRepr
+    """
+    return __from_ast(ast.parse(text.strip(), mode="eval").body)
+
+
+def read_exception_message(sfl_json, max_bytes=None):
+    """
+    Reads the exceptionMessage out of sciflo.json without loading the rest of the file.
+
+    :return: tuple(message, truncated), where truncated is True if the message was larger than
+     max_bytes and only its head and tail were read. The message is None if there is none.
+    """
+    if max_bytes is None:
+        max_bytes = MAX_EXCEPTION_MESSAGE_BYTES
+    with open(sfl_json, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None, False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            span = find_top_level_values(buf, ["exceptionMessage"]).get("exceptionMessage", None)
+            if span is None:
+                return None, False
+            start, end = span
+            if end - start <= max_bytes:
+                return json.loads(buf[start:end]), False
+            half = max_bytes // 2
+            head = buf[start + 1:start + 1 + half].decode("utf-8", errors="replace")
+            tail = buf[end - 1 - half:end - 1].decode("utf-8", errors="replace")
+            return "%s\n... [%d bytes truncated] ...\n%s" % (head, end - start - 2 * half, tail), True
+
+
+def extract_error(sfl_json, max_error_bytes=None):
     """Extract SciFlo error and traceback for mozart."""
 
-    with open(sfl_json) as f:
-        j = json.load(f)
-    exc_message = j.get("exceptionMessage", None)
-    if exc_message is not None:
-        try:
-            exc_list = eval(exc_message)
-        except Exception:
-            exc_list = []
-        if len(exc_list) == 3:
-            proc = exc_list[0]
-            exc = exc_list[1]
-            tb = exc_list[2]
-            accountability = None
+    exc_message, truncated = read_exception_message(sfl_json)
+    if exc_message is None:
+        return
+    if truncated:
+        print(f"exceptionMessage of {sfl_json} is too large to parse, keeping its head and tail")
+        # the step is still named at the start of the message
+        m = re.match(r"""\(\s*['"]([^'"]*)['"]""", exc_message)
+        err_str = "SciFlo step %s failed" % (m.group(1) if m else "unknown")
+        __write_error_files(err_str, truncate_text(exc_message, MAX_TRACEBACK_CHARS), max_error_bytes)
+        return
+
+    try:
+        exc_list = parse_literal(exc_message)
+    except Exception:
+        exc_list = []
+    if isinstance(exc_list, (tuple, list)) and len(exc_list) == 3:
+        proc = exc_list[0]
+        exc = exc_list[1]
+        tb = exc_list[2]
+        if isinstance(exc, str):
             try:
-                exc = eval(exc)
+                exc = parse_literal(exc)
             except Exception:
                 pass
-            if isinstance(exc, tuple) and len(exc) == 2:
-                err = exc[0]
-                job_json = exc[1]
-                if isinstance(job_json, dict):
-                    if "job_id" in job_json:
-                        err_str = (
-                            "SciFlo step %s with job_id %s (task %s) failed: %s"
-                            % (proc, job_json["job_id"], job_json["uuid"], err)
-                        )
-                        __write_error_files(err_str, job_json["traceback"])
-            else:
-                err_str = "SciFlo step %s failed: %s" % (proc, exc)
-                __write_error_files(err_str, tb)
-
-
-def run_sciflo(sfl_file, sfl_args, output_dir):
+        if isinstance(exc, tuple) and len(exc) == 2:
+            err = exc[0]
+            job_json = exc[1]
+            if isinstance(job_json, dict):
+                if "job_id" in job_json:
+                    err_str = (
+                        "SciFlo step %s with job_id %s (task %s) failed: %s"
+                        % (proc, job_json["job_id"], job_json["uuid"], err)
+                    )
+                    __write_error_files(
+                        err_str, truncate_text(job_json["traceback"], MAX_TRACEBACK_CHARS), max_error_bytes
+                    )
+        else:
+            err_str = "SciFlo step %s failed: %s" % (proc, exc)
+            __write_error_files(err_str, truncate_text(tb, MAX_TRACEBACK_CHARS), max_error_bytes)
+
+
+class RotatingLog(object):
+    """Log file that is rotated to <path>.1, <path>.2... once it grows past max_bytes."""
+
+    def __init__(self, path, max_bytes=MAX_LOG_BYTES, backup_count=LOG_BACKUP_COUNT):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._file = open(path, "wb")
+        self._size = 0
+
+    def _rotate(self):
+        self._file.close()
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                src = "%s.%d" % (self.path, i)
+                if os.path.exists(src):
+                    os.replace(src, "%s.%d" % (self.path, i + 1))
+            os.replace(self.path, "%s.1" % self.path)
+        self._file = open(self.path, "wb")
+        self._size = 0
+
+    def write(self, data):
+        if self._size > 0 and self._size + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+
+    def close(self):
+        self._file.close()
+
+
+def __stream_output(pipe, log, echo, output_times, name):
+    """Copies the output of the process to its log file, and optionally to our own output."""
+    # the log is closed here rather than by run_command, which may stop waiting on a reader
+    # that is still writing
+    fd = pipe.fileno()
+    try:
+        while True:
+            data = os.read(fd, 65536)
+            if not data:
+                break
+            output_times[name] = time.monotonic()
+            log.write(data)
+            if echo is not None:
+                echo.write(data)
+                echo.flush()
+    finally:
+        pipe.close()
+        log.close()
+
+
+def __kill_process_group(proc, sig):
+    try:
+        os.killpg(proc.pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+def run_command(
+    cmd,
+    stdout_log=SCIFLO_STDOUT_LOG,
+    stderr_log=SCIFLO_STDERR_LOG,
+    timeout=None,
+    idle_timeout=None,
+    kill_grace_period=None,
+    max_log_bytes=MAX_LOG_BYTES,
+    log_backup_count=LOG_BACKUP_COUNT,
+    echo=True,
+):
+    """
+    Runs the command in its own process group, streaming its stdout and stderr to rotating log
+    files. The command and everything it started are stopped with SIGTERM, then SIGKILL after the
+    grace period, when it runs longer than timeout or produces no output for idle_timeout seconds.
+
+    :param cmd: command as a list of arguments
+    :param stdout_log: path of the stdout log
+    :param stderr_log: path of the stderr log
+    :param timeout: max seconds the command can run
+    :param idle_timeout: max seconds the command can go without producing any output
+    :param kill_grace_period: seconds between SIGTERM and SIGKILL
+    :param max_log_bytes: size at which the logs are rotated
+    :param log_backup_count: number of rotated logs to keep
+    :param echo: whether to also write the command's output to our own stdout and stderr
+    :return: dict of exit code, timing and resource usage of the command
+    """
+    if kill_grace_period is None:
+        kill_grace_period = KILL_GRACE_PERIOD
+    logs = {
+        "stdout": RotatingLog(stdout_log, max_log_bytes, log_backup_count),
+        "stderr": RotatingLog(stderr_log, max_log_bytes, log_backup_count),
+    }
+    start_time = time.time()
+    start = time.monotonic()
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
+    except Exception:
+        for log in logs.values():
+            log.close()
+        raise
+    output_times = {"stdout": start, "stderr": start}
+    readers = []
+    for name, pipe in [("stdout", proc.stdout), ("stderr", proc.stderr)]:
+        echo_stream = getattr(getattr(sys, name), "buffer", None) if echo else None
+        reader = threading.Thread(
+            target=__stream_output, args=(pipe, logs[name], echo_stream, output_times, name), daemon=True
+        )
+        reader.start()
+        readers.append(reader)
+
+    timed_out = None
+    term_sent = None
+    while True:
+        pid, wait_status, rusage = os.wait4(proc.pid, os.WNOHANG)
+        if pid != 0:
+            break
+        now = time.monotonic()
+        if timed_out is None:
+            if timeout is not None and now - start > timeout:
+                timed_out = "timeout"
+            elif idle_timeout is not None and now - max(output_times.values()) > idle_timeout:
+                timed_out = "idle_timeout"
+            if timed_out is not None:
+                print("%s exceeded its %s, sending SIGTERM" % (cmd[0], timed_out))
+                __kill_process_group(proc, signal.SIGTERM)
+                term_sent = now
+        elif term_sent is not None and now - term_sent > kill_grace_period:
+            print("%s still running %d seconds after SIGTERM, sending SIGKILL" % (cmd[0], kill_grace_period))
+            __kill_process_group(proc, signal.SIGKILL)
+            term_sent = None
+        time.sleep(POLL_INTERVAL)
+
+    # wait4 reaped the process, so let Popen know it's done
+    exit_code = os.waitstatus_to_exitcode(wait_status)
+    proc.returncode = exit_code
+    if timed_out is not None:
+        # don't leave behind anything the command started
+        __kill_process_group(proc, signal.SIGKILL)
+    for name, reader in zip(["stdout", "stderr"], readers):
+        # processes started by the command can keep the pipes open after it exited
+        reader.join(kill_grace_period)
+        if reader.is_alive():
+            print("%s of %s is still open, not waiting for it any longer" % (name, cmd[0]))
+
+    return {
+        "command": cmd,
+        "start_time": start_time,
+        "end_time": time.time(),
+        "wall_time": time.monotonic() - start,
+        "exit_code": exit_code,
+        "signal": -exit_code if exit_code < 0 else None,
+        "timed_out": timed_out,
+        "max_rss_kb": rusage.ru_maxrss,
+        "user_cpu_time": rusage.ru_utime,
+        "system_cpu_time": rusage.ru_stime,
+        "stdout_log": stdout_log,
+        "stderr_log": stderr_log,
+    }
+
+
+def __extract_run_error(stats, sfl_json, max_error_bytes):
+    """Writes the error of a failed sflExec.py run, which may not have gotten to write sciflo.json."""
+    if not os.path.exists(sfl_json):
+        if stats["timed_out"] is not None:
+            err_str = "sflExec.py exceeded its %s and was stopped before writing %s" % (stats["timed_out"], sfl_json)
+        else:
+            err_str = "sflExec.py exited with status %d without writing %s" % (stats["exit_code"], sfl_json)
+        print(err_str)
+        __write_error_files(err_str, "See %s and %s" % (stats["stdout_log"], stats["stderr_log"]), max_error_bytes)
+        return
+    try:
+        extract_error(sfl_json, max_error_bytes=max_error_bytes)
+    except Exception as e:
+        err_str = "Could not extract the SciFlo error from %s: %s" % (sfl_json, e)
+        print(err_str)
+        __write_error_files(err_str, traceback.format_exc(), max_error_bytes)
+
+
+def run_sciflo(sfl_file, sfl_args, output_dir, sflexec_path=None, timeout=None, idle_timeout=None,
+               stats_file=SCIFLO_STATS_FILE, copy_mode=HARDLINK, max_error_bytes=None):
     """Run sciflo."""
 
     # build paths to executables
-    sflexec_path = os.path.join(os.environ["HOME"], "verdi", "bin", "sflExec.py")
-    __create_placeholder_alt_files()
-    # execute sciflo
-    cmd = [
-        sflexec_path,
-        "-s",
-        "-f",
-        "-o",
-        output_dir,
-        "--args",
-        '"%s"' % ",".join(sfl_args),
-        sfl_file,
-    ]
-    print("Running sflExec.py command:\n%s" % " ".join(cmd))
-    status = os.system(" ".join(cmd))
-    sf_key, context_file = sfl_args[0].split("=")
-    print("Exit status is: %d" % status)
-    if status != 0:
-        extract_error("%s/sciflo.json" % output_dir)
-        status = 1
-
-    # copy smap_sciflo work and exec dir
+    if sflexec_path is None:
+        sflexec_path = os.path.join(os.environ["HOME"], "verdi", "bin", "sflExec.py")
+    # the placeholders are reclaimed whatever happens to the run
     try:
-        copy_sciflo_work(output_dir)
-    except Exception:
-        pass
+        __create_placeholder_alt_files()
+        # execute sciflo
+        cmd = [
+            sflexec_path,
+            "-s",
+            "-f",
+            "-o",
+            output_dir,
+            "--args",
+            ",".join(sfl_args),
+            sfl_file,
+        ]
+        print("Running sflExec.py command:\n%s" % " ".join(cmd))
+        try:
+            stats = run_command(cmd, timeout=timeout, idle_timeout=idle_timeout)
+        except Exception as e:
+            err_str = "Failed to run %s: %s" % (sflexec_path, e)
+            print(err_str)
+            __write_error_files(err_str, traceback.format_exc(), max_error_bytes)
+            stats = None
+            status = 1
+        else:
+            with open(stats_file, "w") as f:
+                json.dump(stats, f, indent=2)
+            status = stats["exit_code"]
+            print("Exit status is: %d" % status)
+        if stats is not None and (status != 0 or stats["timed_out"] is not None):
+            __extract_run_error(stats, "%s/sciflo.json" % output_dir, max_error_bytes)
+            status = 1
 
-    __cleanup_placeholder_alt_files()
+        # copy smap_sciflo work and exec dir
+        try:
+            copy_sciflo_work(output_dir, mode=copy_mode)
+        except Exception:
+            pass
+    finally:
+        __cleanup_placeholder_alt_files()
     return status
@@ -0,0 +1,235 @@
+"""
+Strategies deciding how Chimera waits between polls for a document to show up in ES.
+
+The strategy is configured through the CHIMERA area of the settings file, either for all
+endpoints or per endpoint, e.g.
+
+CHIMERA:
+  WAIT_STRATEGY:
+    GRQ:
+      type: notification
+      signal_dir: /data/work/ingest_signals
+    MOZART:
+      type: capped_backoff
+      max_interval: 1
+
+Without a configured strategy the interval doubles after every poll, starting at 2 seconds.
+"""
+
+import asyncio
+import os
+import queue
+import time
+
+from collections import OrderedDict
+
+from chimera.logger import logger
+
+EXPONENTIAL = "exponential"
+CAPPED_BACKOFF = "capped_backoff"
+NOTIFICATION = "notification"
+
+
+class WaitStrategy(object):
+    """Base strategy. Subclasses define the intervals between polls."""
+
+    def delays(self):
+        """
+        :return: iterator over the seconds to sleep before each successive poll
+        """
+        raise NotImplementedError()
+
+    def sleep(self, seconds, keys=None):
+        """
+        Sleeps until the next poll.
+        :param seconds: max seconds to sleep
+        :param keys: IDs of the documents being waited on
+        :return: True if the wait was cut short because the documents were signaled
+        """
+        time.sleep(seconds)
+        return False
+
+    async def sleep_async(self, seconds, keys=None):
+        """
+        Coroutine version of sleep.
+        """
+        await asyncio.sleep(seconds)
+        return False
+
+
+class ExponentialBackoffWait(WaitStrategy):
+    """Doubles the interval after every poll: 2, 4, 8... seconds by default."""
+
+    def __init__(self, initial_interval=2, multiplier=2):
+        self.initial_interval = initial_interval
+        self.multiplier = multiplier
+
+    def delays(self):
+        interval = self.initial_interval
+        while True:
+            yield interval
+            interval *= self.multiplier
+
+
+class CappedBackoffWait(ExponentialBackoffWait):
+    """
+    Starts with a fine grained interval and backs off up to max_interval, so a document is
+    picked up within about max_interval seconds of being indexed.
+    """
+
+    def __init__(self, initial_interval=0.25, multiplier=2, max_interval=1.0):
+        super(CappedBackoffWait, self).__init__(initial_interval=initial_interval, multiplier=multiplier)
+        self.max_interval = max_interval
+
+    def delays(self):
+        for interval in super(CappedBackoffWait, self).delays():
+            yield min(interval, self.max_interval)
+
+
+class NotificationWait(CappedBackoffWait):
+    """
+    Wakes up as soon as the ingest side signals that a document was indexed. ES is still
+    polled every max_interval seconds in case a signal never arrives.
+
+    Signals are either files named after the document ID written to signal_dir or document
+    IDs put on an in-process queue. The signal_dir is only listed when its modification time
+    changed, and only the max_signals most recent signals are remembered.
+    """
+
+    def __init__(
+        self,
+        signal_dir=None,
+        signal_queue=None,
+        check_interval=0.1,
+        signaled_interval=0.25,
+        initial_interval=1.0,
+        multiplier=2,
+        max_interval=10.0,
+        max_signals=10000,
+    ):
+        """
+        :param signal_dir: directory the ingest side writes a file named <doc_id> to
+        :param signal_queue: queue.Queue the ingest side puts document IDs on
+        :param check_interval: seconds between checks for a signal
+        :param signaled_interval: seconds between polls once a document was signaled but is
+         not yet visible in ES, e.g. because the index has not been refreshed yet
+        :param initial_interval: seconds before the first fallback poll
+        :param multiplier: backoff multiplier of the fallback polls
+        :param max_interval: max seconds between fallback polls
+        :param max_signals: max number of signaled document IDs remembered
+        """
+        super(NotificationWait, self).__init__(
+            initial_interval=initial_interval, multiplier=multiplier, max_interval=max_interval
+        )
+        if signal_dir is None and signal_queue is None:
+            raise ValueError("Either signal_dir or signal_queue must be given")
+        self.signal_dir = signal_dir
+        self.signal_queue = signal_queue
+        self.check_interval = check_interval
+        self.signaled_interval = signaled_interval
+        self.max_signals = max_signals
+        # signaled document IDs, oldest first
+        self._signaled = OrderedDict()
+        self._signal_dir_mtime = None
+
+    def _add_signals(self, keys):
+        for key in keys:
+            self._signaled[key] = None
+            self._signaled.move_to_end(key)
+        while len(self._signaled) > self.max_signals:
+            self._signaled.popitem(last=False)
+
+    def _read_signal_dir(self):
+        try:
+            mtime = os.stat(self.signal_dir).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._signal_dir_mtime:
+            return
+        self._signal_dir_mtime = mtime
+        with os.scandir(self.signal_dir) as entries:
+            self._add_signals([entry.name for entry in entries if entry.name not in self._signaled])
+
+    def is_signaled(self, keys):
+        """
+        :param keys: IDs of the documents being waited on
+        :return: True if any of them has been signaled
+        """
+        if not keys:
+            return False
+        if self.signal_queue is not None:
+            while True:
+                try:
+                    self._add_signals([self.signal_queue.get_nowait()])
+                except queue.Empty:
+                    break
+        if self.signal_dir is not None:
+            self._read_signal_dir()
+        return any(os.path.basename(key) in self._signaled for key in keys)
+
+    def _next_check(self, seconds, keys, start):
+        """
+        :return: seconds to sleep before checking for a signal again, or None to stop sleeping
+        """
+        elapsed = time.monotonic() - start
+        if elapsed >= seconds:
+            return None
+        if self.is_signaled(keys):
+            logger.debug("Received signal for {}".format(keys))
+            return None
+        return min(self.check_interval, seconds - elapsed)
+
+    def sleep(self, seconds, keys=None):
+        if self.is_signaled(keys):
+            time.sleep(min(seconds, self.signaled_interval))
+            return True
+        start = time.monotonic()
+        while True:
+            interval = self._next_check(seconds, keys, start)
+            if interval is None:
+                return time.monotonic() - start < seconds
+            time.sleep(interval)
+
+    async def sleep_async(self, seconds, keys=None):
+        if self.is_signaled(keys):
+            await asyncio.sleep(min(seconds, self.signaled_interval))
+            return True
+        start = time.monotonic()
+        while True:
+            interval = self._next_check(seconds, keys, start)
+            if interval is None:
+                return time.monotonic() - start < seconds
+            await asyncio.sleep(interval)
+
+
+WAIT_STRATEGIES = {
+    EXPONENTIAL: ExponentialBackoffWait,
+    CAPPED_BACKOFF: CappedBackoffWait,
+    NOTIFICATION: NotificationWait,
+}
+
+
+def get_wait_strategy(config=None, endpoint=None, default=EXPONENTIAL):
+    """
+    Creates the wait strategy described by the config.
+    :param config: name of the strategy, a dict with a 'type' key plus the strategy's arguments,
+     or a dict of such dicts keyed by endpoint
+    :param endpoint: endpoint to pick the strategy for when the config is keyed by endpoint
+    :param default: type of strategy to use if none is configured
+    :return: WaitStrategy
+    """
+    if isinstance(config, dict) and "type" not in config:
+        config = config.get(endpoint, None)
+    if isinstance(config, WaitStrategy):
+        return config
+    if isinstance(config, str):
+        config = {"type": config}
+    config = dict(config or {})
+    strategy_type = config.pop("type", default)
+    if strategy_type not in WAIT_STRATEGIES:
+        raise ValueError(
+            "Unknown wait strategy '{}'. Should be one of the following: {}".format(
+                strategy_type, list(WAIT_STRATEGIES.keys())
+            )
+        )
+    return WAIT_STRATEGIES[strategy_type](**config)
@@ -0,0 +1,280 @@
+"""
+Workflow level timing report, written by run_sciflo once sflExec.py is done.
+
+Every sciflo work unit below the output dir becomes a step of the report. The timing of a step
+comes from the _chimera_<step>_metrics.json sidecars the input preprocessor, job submitter and
+post processor write when instrumentation is switched on, and from the modification times of the
+files in the work unit otherwise. The PGE jobs the post processor looked up in Mozart are added as
+steps of their own, with the time they spent queued split out from the time they ran.
+
+The report is written to workflow_metrics.json:
+
+{
+  "workflow": {"start_time": ..., "end_time": ..., "wall_time": ...},
+  "sciflo": {...},                   # contents of _sciflo_exec_stats.json
+  "steps": [{"name": "00001-PGE_L0B_IPP", "source": "chimera", "start_time": ..., ...}, ...],
+  "critical_path": ["00001-PGE_L0B_IPP", "00002-PGE_L0B_submit", "pge_job:<job_id>", ...],
+  "critical_path_time": ...,        # includes the time the PGE jobs on it spent queued
+  "totals": {"preprocessor": ..., "job_submitter": ..., "postprocessor": ...,
+             "pge_queue_wait": ..., "pge_run_time": ...}
+}
+
+Times are seconds since the epoch.
+"""
+
+import json
+import os
+import re
+
+from datetime import datetime, timezone
+
+from chimera.commons.sciflo_util import SCIFLO_STATS_FILE, WORK_RE
+from chimera.logger import logger
+
+WORKFLOW_METRICS_FILE = "workflow_metrics.json"
+# instrumentation.SIDECAR_FILE
+SIDECAR_RE = re.compile(r"^_chimera_(.+)_metrics\.json$")
+
+CHIMERA = "chimera"
+FILESYSTEM = "filesystem"
+MOZART = "mozart"
+
+
+def parse_time(value):
+    """
+    :param value: seconds since the epoch, or an ISO 8601 time like the ones Mozart records,
+     e.g. 2018-08-28T19:06:51.755179Z
+    :return: seconds since the epoch, or None if the value can't be parsed
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        if value.endswith("Z"):
+            value = value[:-1] + "+00:00"
+        parsed = datetime.fromisoformat(value)
+    except (AttributeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        # Mozart records its times in UTC
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def find_work_units(output_dir):
+    """
+    :param output_dir: sciflo output dir
+    :return: paths of the work unit dirs below the output dir, including the nested ones
+    """
+    units = []
+    seen = set()
+    for root, dirs, files in os.walk(output_dir):
+        for d in sorted(dirs):
+            path = os.path.join(root, d)
+            if not WORK_RE.search(d) or not os.path.isdir(path):
+                continue
+            real_path = os.path.realpath(path)
+            if real_path not in seen:
+                seen.add(real_path)
+                units.append(path)
+    return units
+
+
+def _load_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning("Could not read {}: {}".format(path, e))
+        return None
+
+
+def _duration(start_time, end_time):
+    if start_time is None or end_time is None:
+        return None
+    return end_time - start_time
+
+
+def _get_pge_job_step(pge_job):
+    """
+    :param pge_job: pge_job info the post processor recorded
+    :return: step for the PGE job, or None if Mozart had no times for it
+    """
+    queued = parse_time(pge_job.get("time_queued"))
+    start_time = parse_time(pge_job.get("time_start"))
+    end_time = parse_time(pge_job.get("time_end"))
+    if start_time is None or end_time is None:
+        return None
+    return {
+        "name": "pge_job:{}".format(pge_job.get("job_id")),
+        "source": MOZART,
+        "steps": ["pge_job"],
+        "time_queued": queued,
+        "start_time": start_time,
+        "end_time": end_time,
+        "duration": _duration(start_time, end_time),
+        "queue_wait": _duration(queued, start_time),
+        "run_time": _duration(start_time, end_time),
+    }
+
+
+def get_unit_steps(unit_dir, output_dir):
+    """
+    :param unit_dir: work unit dir
+    :param output_dir: sciflo output dir, which the step names are relative to
+    :return: list of the steps of the work unit: the unit itself, followed by any PGE job it looked up
+    """
+    name = os.path.relpath(unit_dir, output_dir)
+    entries = []
+    with os.scandir(unit_dir) as it:
+        for entry in it:
+            if entry.is_file(follow_symlinks=False):
+                entries.append(entry)
+
+    sidecars = []
+    for entry in entries:
+        if SIDECAR_RE.match(entry.name):
+            metrics = _load_json(entry.path)
+            if metrics and metrics.get("start_time") is not None:
+                sidecars.append(metrics)
+
+    if sidecars:
+        start_time = min(metrics["start_time"] for metrics in sidecars)
+        end_time = max(metrics["end_time"] for metrics in sidecars)
+        step = {
+            "name": name,
+            "source": CHIMERA,
+            "steps": [metrics["step"] for metrics in sidecars],
+            "start_time": start_time,
+            "end_time": end_time,
+            "duration": _duration(start_time, end_time),
+            "functions": [record for metrics in sidecars for record in metrics.get("functions", [])],
+        }
+    else:
+        # no instrumentation, fall back to the span over which the unit's files were written
+        mtimes = []
+        for entry in entries:
+            try:
+                mtimes.append(entry.stat(follow_symlinks=False).st_mtime)
+            except OSError:
+                continue
+        if not mtimes:
+            return []
+        step = {
+            "name": name,
+            "source": FILESYSTEM,
+            "steps": [],
+            "start_time": min(mtimes),
+            "end_time": max(mtimes),
+            "duration": max(mtimes) - min(mtimes),
+        }
+
+    steps = [step]
+    for metrics in sidecars:
+        pge_job = (metrics.get("info") or {}).get("pge_job")
+        if pge_job:
+            pge_job_step = _get_pge_job_step(pge_job)
+            if pge_job_step is not None:
+                steps.append(pge_job_step)
+    return steps
+
+
+def _get_critical_start(step):
+    # a PGE job is on its way from the moment it is queued
+    if step.get("time_queued") is not None:
+        return step["time_queued"]
+    return step["start_time"]
+
+
+def get_critical_path(steps):
+    """
+    Walks back from the step that ended last, each time to the step that ended last before the
+    current one started, or was queued in the case of a PGE job.
+    :param steps: steps of the workflow
+    :return: list of the steps on the critical path, in the order they ran
+    """
+    remaining = [step for step in steps if step["start_time"] is not None and step["end_time"] is not None]
+    if not remaining:
+        return []
+    current = max(remaining, key=lambda step: step["end_time"])
+    path = [current]
+    while True:
+        remaining = [step for step in remaining if step is not current]
+        preceding = [step for step in remaining if step["end_time"] <= _get_critical_start(current)]
+        if not preceding:
+            break
+        current = max(preceding, key=lambda step: step["end_time"])
+        path.append(current)
+    return list(reversed(path))
+
+
+def get_workflow_metrics(output_dir, stats_file=SCIFLO_STATS_FILE):
+    """
+    :param output_dir: sciflo output dir
+    :param stats_file: stats of the sflExec.py run written by run_sciflo
+    :return: the workflow timing report
+    """
+    steps = []
+    # PGE jobs can be looked up by more than one post processor, e.g. for deduped jobs
+    seen_jobs = set()
+    for unit_dir in find_work_units(output_dir):
+        for step in get_unit_steps(unit_dir, output_dir):
+            if step["source"] == MOZART:
+                if step["name"] in seen_jobs:
+                    continue
+                seen_jobs.add(step["name"])
+            steps.append(step)
+    steps.sort(key=lambda step: step["start_time"])
+
+    sciflo_stats = _load_json(stats_file) if stats_file and os.path.exists(stats_file) else None
+    if sciflo_stats:
+        start_time = sciflo_stats.get("start_time")
+        end_time = sciflo_stats.get("end_time")
+    else:
+        start_time = min([step["start_time"] for step in steps], default=None)
+        end_time = max([step["end_time"] for step in steps], default=None)
+
+    totals = dict()
+    for step in steps:
+        if step["source"] == MOZART:
+            for key, total in (("queue_wait", "pge_queue_wait"), ("run_time", "pge_run_time")):
+                if step[key] is not None:
+                    totals[total] = totals.get(total, 0.0) + step[key]
+        elif step["source"] == CHIMERA:
+            # a unit running more than one Chimera step counts towards each of them
+            for name in step["steps"]:
+                totals[name] = totals.get(name, 0.0) + step["duration"]
+
+    critical_path = get_critical_path(steps)
+    return {
+        "workflow": {
+            "start_time": start_time,
+            "end_time": end_time,
+            "wall_time": _duration(start_time, end_time),
+        },
+        "sciflo": sciflo_stats,
+        "steps": steps,
+        "critical_path": [step["name"] for step in critical_path],
+        "critical_path_time": sum(step["end_time"] - _get_critical_start(step) for step in critical_path),
+        "totals": totals,
+    }
+
+
+def write_workflow_metrics(output_dir, stats_file=SCIFLO_STATS_FILE, metrics_file=WORKFLOW_METRICS_FILE):
+    """
+    Writes the workflow timing report.
+    :param output_dir: sciflo output dir
+    :param stats_file: stats of the sflExec.py run written by run_sciflo
+    :param metrics_file: path to write the report to
+    :return: the workflow timing report
+    """
+    metrics = get_workflow_metrics(output_dir, stats_file=stats_file)
+    with open(metrics_file, "w") as f:
+        json.dump(metrics, f, indent=2)
+    logger.info(
+        "Workflow took {} with {} steps, critical path: {}".format(
+            metrics["workflow"]["wall_time"], len(metrics["steps"]), metrics["critical_path"]
+        )
+    )
+    return metrics
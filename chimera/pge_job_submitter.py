@@ -4,14 +4,15 @@ of performing the hash calculation to determine dedup.
 
 """
 
+import hashlib
 import json
 import os
 from chimera.commons.constants import ChimeraConstants as chimera_const
-from chimera.commons.conf_util import load_config, YamlConf
+from chimera.commons.conf_util import get_chimera_setting, load_config, YamlConf
+from chimera.commons import localize_util, payload_util
+from chimera.commons.instrumentation import Instrumentation
 from chimera.logger import logger
 
-from hysds_commons.job_utils import resolve_hysds_job
-
 
 class PgeJobSubmitter(object):
     def __init__(self, context, run_config, pge_config_file, settings_file, wuid=None, job_num=None):
@@ -27,6 +28,7 @@ class PgeJobSubmitter(object):
         self._base_work_dir = os.path.dirname(os.path.abspath(context))
 
         # load pge config file
+        self._pge_config_file = pge_config_file
         self._pge_config = load_config(pge_config_file)
         logger.debug("Loaded PGE config file: {}".format(json.dumps(self._pge_config)))
 
@@ -34,6 +36,7 @@ class PgeJobSubmitter(object):
         self._job_num = job_num
 
         # load Settings file
+        self._settings = None
         try:
             if settings_file:
                 settings_file = os.path.abspath(os.path.normpath(settings_file))
@@ -49,7 +52,25 @@ class PgeJobSubmitter(object):
                 file_name = '~/verdi/etc/settings.yaml'
             raise RuntimeError("Could not read settings file '{}': {}".format(file_name, e))
 
+        # measures the job submissions, see run_pge_docker
+        self.instrumentation = Instrumentation.from_config(
+            "job_submitter", get_chimera_setting(self._settings, chimera_const.INSTRUMENTATION)
+        )
+
         self._run_config = run_config
+        # tuple(run config, job type, hash) of the last payload hash calculated
+        self._payload_hash = None
+
+    def set_run_config(self, run_config, job_num=None):
+        """
+        Switches the submitter over to another run config of the same PGE, so one submitter can
+        submit a batch of jobs.
+        :param run_config: Run config created by input preprocessor
+        :param job_num: job_num in sciflo of the job
+        """
+        self._run_config = run_config
+        self._job_num = job_num
+        self._payload_hash = None
 
     def get_input_file_name(self, input_file_key=None):
         """
@@ -80,12 +101,50 @@ class PgeJobSubmitter(object):
         """
         localize_list = []
 
-        for url in localize:
+        # a url listed more than once is only localized once
+        for url in dict.fromkeys(localize):
             element = {"url": url, "path": "input/"}
             localize_list.append(element)
 
         return localize_list
 
+    def get_localize_plan(self, localize_list):
+        """
+        Adds the size and checksum of the inputs found in the product metadata of the context, and
+        optionally their concurrency group, to the localize list. Done when the PGE config has a
+        localize_plan section, e.g.
+
+        localize_plan:
+          group_by: host            # group the transfers by the host they come from
+          disk_usage_factor: 2.0    # disk usage of the job as a multiple of its input size
+
+        :param localize_list: localize list that osaka understands
+        :return: enriched localize list
+        """
+        plan_config = self._pge_config.get(chimera_const.LOCALIZE_PLAN) or {}
+        file_info = localize_util.get_file_info(self._context)
+        return localize_util.enrich_localize_urls(localize_list, file_info, group_by=plan_config.get("group_by"))
+
+    def set_disk_usage(self, job_json, localize_list):
+        """
+        Raises the disk usage of the job payload to the estimate based on the size of its inputs, if
+        the estimate is higher.
+
+        :param job_json: job JSON from resolve_hysds_job
+        :param localize_list: localize list enriched by get_localize_plan
+        :return: job_json
+        """
+        plan_config = self._pge_config.get(chimera_const.LOCALIZE_PLAN) or {}
+        estimate = localize_util.estimate_disk_usage(localize_list, factor=plan_config.get("disk_usage_factor", 2.0))
+        payload = job_json.get("payload", None)
+        if estimate is None or payload is None:
+            return job_json
+        current = localize_util.parse_disk_usage(payload.get("_disk_usage", None))
+        if current is None or estimate > current:
+            payload["_disk_usage"] = localize_util.format_disk_usage(estimate)
+            logger.info("Set disk usage to {} based on the size of the inputs".format(payload["_disk_usage"]))
+        return job_json
+
     def construct_params(self):
         """
         Construct the params for the PGE job submission
@@ -99,6 +158,9 @@ class PgeJobSubmitter(object):
                 "Couldn't find {} in runconfig from input preprocessor".format(
                     chimera_const.LOCALIZE))
 
+        if self._pge_config.get(chimera_const.LOCALIZE_PLAN) is not None:
+            localize_urls = self.get_localize_plan(localize_urls)
+
         job_params = {
             "run_config": self._run_config,
             "pge_config": self._pge_config,
@@ -106,6 +168,35 @@ class PgeJobSubmitter(object):
             "simulate_outputs": self._run_config[chimera_const.SIMULATE_OUTPUTS]
         }
 
+        # only jobs submitted to HySDS are slimmed down, jobs run inline use the params as-is
+        if self._pge_config.get(chimera_const.SLIM_PAYLOAD) is not None and self._wuid and self._job_num is not None:
+            job_params = self.slim_params(job_params)
+
+        return job_params
+
+    def slim_params(self, job_params):
+        """
+        Replaces the PGE config in the params with a reference to it and optionally compresses the
+        run config. The worker gets them back by running chimera.commons.payload_util on the job's
+        _context.json before the PGE reads it.
+        Done when the PGE config has a slim_payload section, e.g.
+
+        slim_payload:
+          pge_config_path: /home/ops/verdi/ops/pcm/conf/pge_configs/PGE_L0B.yaml  # path in the PGE's container
+          compress_run_config: true
+
+        :param job_params: params constructed by construct_params
+        :return: slimmed down params
+        """
+        slim_config = self._pge_config.get(chimera_const.SLIM_PAYLOAD) or {}
+        job_params = dict(job_params)
+        job_params["pge_config"] = payload_util.get_pge_config_ref(
+            self._pge_config,
+            slim_config.get("pge_config_path", self._pge_config_file),
+            version=self._context.get(chimera_const.RELEASE_VERSION),
+        )
+        if slim_config.get("compress_run_config", False):
+            job_params["run_config"] = payload_util.encode_run_config(job_params["run_config"])
         return job_params
 
     def get_payload_hash(self, job_type):
@@ -113,11 +204,55 @@ class PgeJobSubmitter(object):
         Can be overwritten to calculate the payload hash to determine dedup. By returning None, we will use HySDS
         Core's hash calculation to determine dedup.
 
+        If the PGE config has a payload_hash section, the hash only covers the fields relevant to dedup:
+
+        payload_hash:
+          job_type: true            # include the job type, defaults to true
+          localize_urls: true       # include the urls to be localized, defaults to true
+          runconfig_keys:           # dot notation keys of the run config values to include
+            - InputFileGroup.InputFilePath
+
         :param job_type:
 
         :return:
         """
-        return None
+        hash_config = self._pge_config.get(chimera_const.PAYLOAD_HASH)
+        if hash_config is None:
+            return None
+
+        if self._payload_hash is not None:
+            run_config, cached_job_type, payload_hash = self._payload_hash
+            if run_config is self._run_config and cached_job_type == job_type:
+                return payload_hash
+
+        fields = dict()
+        if hash_config.get("job_type", True):
+            fields["job_type"] = job_type
+        if hash_config.get("localize_urls", True):
+            # the order the inputs are listed in does not make a job different
+            fields["localize_urls"] = sorted(set(self._run_config.get(chimera_const.LOCALIZE) or []))
+        fields["run_config"] = {
+            key: self._get_run_config_value(key) for key in hash_config.get("runconfig_keys") or []
+        }
+        data = json.dumps(fields, sort_keys=True, separators=(",", ":"), default=str)
+        payload_hash = hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+        logger.debug("Payload hash of {}: {}".format(json.dumps(fields), payload_hash))
+
+        self._payload_hash = (self._run_config, job_type, payload_hash)
+        return payload_hash
+
+    def _get_run_config_value(self, key):
+        """
+        Gets a value out of the run config using dot notation.
+        :param key: e.g. InputFileGroup.InputFilePath
+        :return: the value, or None if it is missing
+        """
+        value = self._run_config
+        for k in key.split("."):
+            if not isinstance(value, dict) or k not in value:
+                return None
+            value = value[k]
+        return value
 
     def perform_adaptation_tasks(self, job_json):
         """
@@ -140,6 +275,8 @@ class PgeJobSubmitter(object):
         :param payload_hash:
         :return:
         """
+        # only needed when submitting to HySDS, jobs run inline don't have hysds_commons
+        from hysds_commons.job_utils import resolve_hysds_job
 
         if dataset_id is not None:
             job_name = job_type + "_" + pge_config["pge_name"] + "_" + dataset_id
@@ -205,6 +342,9 @@ class PgeJobSubmitter(object):
             job_json['payload']['_sciflo_wuid'] = self._wuid
             job_json['payload']['_sciflo_job_num'] = self._job_num
 
+            if self._pge_config.get(chimera_const.LOCALIZE_PLAN) is not None:
+                job_json = self.set_disk_usage(job_json, params["localize_urls"])
+
             logger.debug("Resolved Job JSON: {}".format(json.dumps(job_json)))
         else:
             # If we're running inline, we will set the params as the job_json
@@ -111,11 +111,14 @@ class PostProcessor(object):
             cls_object = cls(
                 self._sf_context, self._pge_config, self._settings, self._job_result
             )
-            new_context.update(
-                cls_object.run(
-                    self._pge_config.get(ChimeraConstants.POSTPROCESS, list())
+            try:
+                new_context.update(
+                    cls_object.run(
+                        self._pge_config.get(ChimeraConstants.POSTPROCESS, list())
+                    )
                 )
-            )
+            finally:
+                cls_object.close()
             # write to output context file
             new_context_file = self.prepare_psuedo_context(new_context)
             return new_context_file
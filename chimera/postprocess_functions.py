@@ -1,18 +1,72 @@
 import traceback
 import time
-import json
 
-from hysds.es_util import get_grq_es, get_mozart_es
+from collections import OrderedDict
 
 from chimera.commons.accountability import Accountability
+from chimera.commons.conf_util import get_chimera_setting
 from chimera.commons.constants import ChimeraConstants as chimera_consts
+from chimera.commons.es_client_registry import get_es_client, release_es_client
+from chimera.commons.instrumentation import Instrumentation, record_es_call
+from chimera.commons.retry_util import RetryPolicy
+from chimera.commons.wait_strategy import get_wait_strategy
 
 from chimera.logger import logger
 
 
+class _Wait(object):
+    """
+    Keeps track of the time spent waiting for documents to show up in ES, and of how long to
+    sleep before polling again. Shared by the sync and async waits.
+    """
+
+    def __init__(self, wait_strategy, timeout):
+        self.wait_strategy = wait_strategy
+        self.timeout = timeout
+        self._start = time.monotonic()
+        self._delays = wait_strategy.delays()
+
+    def timed_out(self):
+        return time.monotonic() - self._start >= self.timeout
+
+    def _next_sleep(self, waiting_for):
+        waited_seconds = time.monotonic() - self._start
+        sleep_seconds = min(next(self._delays), self.timeout - waited_seconds)
+        logger.info("Waited {:.2f} seconds for {}, sleeping for {:.2f} seconds".format(
+            waited_seconds, waiting_for, sleep_seconds))
+        return sleep_seconds
+
+    def sleep(self, waiting_for, keys=None):
+        """
+        :param waiting_for: description of what is waited for, for the log
+        :param keys: IDs of the documents being waited on, used by notification based strategies
+        """
+        self.wait_strategy.sleep(self._next_sleep(waiting_for), keys=keys)
+
+    async def sleep_async(self, waiting_for, keys=None):
+        """
+        Coroutine version of sleep.
+        """
+        await self.wait_strategy.sleep_async(self._next_sleep(waiting_for), keys=keys)
+
+
 class PostProcessFunctions(object):
     MOZART_ES_ENDPOINT = "MOZART"
     GRQ_ES_ENDPOINT = "GRQ"
+    # max number of product IDs to resolve in a single GRQ terms query
+    PRODUCT_BATCH_SIZE = 1000
+    # _source fields of the job_status documents needed by _get_job
+    JOB_SOURCE_INCLUDES = [
+        "status",
+        "dedup_job",
+        "job.job_info.metrics.products_staged",
+        "job.job_info.time_queued",
+        "job.job_info.time_start",
+        "job.job_info.time_end",
+        "context",
+    ]
+    # _source fields of the GRQ product documents needed to create the products list
+    PRODUCT_SOURCE_INCLUDES = ["id", "urls", "metadata"]
 
     def __init__(self, context, pge_config, settings, job_result, mozart_es=None, grq_es=None):
         self._context = context
@@ -20,15 +74,33 @@ class PostProcessFunctions(object):
         self._settings = settings
         self._job_result = job_result
         self.accountability = Accountability(self._context, self._job_result.get(chimera_consts.WORK_DIR))
+        es_client_config = get_chimera_setting(self._settings, chimera_consts.ES_CLIENT)
+        # clients got from the registry, which are given back by close
+        self._shared_es = []
         if mozart_es:
             self._mozart_es = mozart_es
         else:
-            self._mozart_es = get_mozart_es()
+            self._mozart_es = get_es_client(self.MOZART_ES_ENDPOINT, es_client_config)
+            self._shared_es.append(self._mozart_es)
 
         if grq_es:
             self._grq_es = grq_es
         else:
-            self._grq_es = get_grq_es()
+            self._grq_es = get_es_client(self.GRQ_ES_ENDPOINT, es_client_config)
+            self._shared_es.append(self._grq_es)
+
+        # ES responses flagged as timed out are retried the same way as failed requests
+        self._retry_policy = RetryPolicy.from_config(
+            get_chimera_setting(self._settings, chimera_consts.ES_RETRY_POLICY),
+            timeout_increment=30,
+            retry_on_result=lambda result: isinstance(result, dict) and bool(result.get("timed_out")),
+        )
+        self._wait_strategies = dict()
+        # (endpoint, index) pairs found to be aliases over multiple indices, which get_doc searches
+        self._search_only_indices = set()
+        self._instrumentation = Instrumentation.from_config(
+            "postprocessor", get_chimera_setting(self._settings, chimera_consts.INSTRUMENTATION)
+        )
 
     def run(self, function_list):
         """
@@ -43,9 +115,18 @@ class PostProcessFunctions(object):
             "function_list: {}".format(function_list)
         )
         for func in function_list:
-            self._job_result.update(getattr(self, func)())
-        
-        return self._job_result
+            with self._instrumentation.measure(func):
+                self._job_result.update(getattr(self, func)())
+
+        return self._instrumentation.publish(self._job_result)
+
+    def close(self):
+        """
+        Gives back the shared ES clients, so they can be closed once nobody else holds them.
+        The instance can't query ES anymore afterwards.
+        """
+        while self._shared_es:
+            release_es_client(self._shared_es.pop())
 
     def _check_job_status(self):
         """
@@ -86,9 +167,11 @@ class PostProcessFunctions(object):
         try:
             if self._check_job_status():
                 try:
-                    response = self.query_es(endpoint=endpoint, doc_id=job_id)
+                    result = self.get_doc(
+                        endpoint=endpoint, doc_id=job_id, source_includes=self.JOB_SOURCE_INCLUDES
+                    )
                     # check if job not found
-                    if len(response["hits"]["hits"]) == 0:
+                    if result is None:
                         raise Exception(
                             "Couldn't find record with ID in MOZART: %s, at %s"
                             % (job_id, endpoint)
@@ -118,7 +201,6 @@ class PostProcessFunctions(object):
         Parse job's full information to get products staged, job context
         If job deduped then find original job's information
         """
-        result = response["hits"]["hits"][0]
         products_staged = None
         prev_context = None
         message = None  # using this to store information regarding deduped jobs,
@@ -131,11 +213,13 @@ class PostProcessFunctions(object):
             orig_job_id = result["_source"]["dedup_job"]
             return_job_id = orig_job_id
             try:
-                orig_job_info = self.query_es(endpoint=endpoint, doc_id=orig_job_id)
-                if len(response["hits"]["hits"]) == 0:
+                orig_job_info = self.get_doc(
+                    endpoint=endpoint, doc_id=orig_job_id, source_includes=self.JOB_SOURCE_INCLUDES
+                )
+                if orig_job_info is None:
                     raise Exception(
                         "Couldn't find record with ID: {}, at {}".format(
-                            job_id, endpoint
+                            orig_job_id, endpoint
                         )
                     )
             except Exception as ex:
@@ -155,7 +239,6 @@ class PostProcessFunctions(object):
             function, it may be shown as failed.
             """
 
-            orig_job_info = orig_job_info["hits"]["hits"][0]
             orig_job_status = str(orig_job_info["_source"]["status"])
             if orig_job_status == "job-failed":
                 message = (
@@ -202,8 +285,26 @@ class PostProcessFunctions(object):
                 result["_source"]["status"]
             )
 
+        job_doc = orig_job_info if status == "job-deduped" else result
+        self._instrumentation.add_info("pge_job", self._get_job_timing(return_job_id, job_doc))
+
         return products_staged, prev_context, message, return_job_id
 
+    @staticmethod
+    def _get_job_timing(job_id, job_doc):
+        """
+        :param job_id: ID of the job that ran the PGE
+        :param job_doc: job_status document of the job
+        :return: dict with the times the job was queued, started and ended
+        """
+        job_info = (((job_doc or {}).get("_source") or {}).get("job") or {}).get("job_info") or {}
+        return {
+            "job_id": job_id,
+            "time_queued": job_info.get("time_queued"),
+            "time_start": job_info.get("time_start"),
+            "time_end": job_info.get("time_end"),
+        }
+
     def _create_products_list(self, products):
         """
             This function creates a list of the product URLs and metadata required
@@ -216,30 +317,63 @@ class PostProcessFunctions(object):
         products_url_list = []
         products_metadata_list = []
 
-        for product in products:
-            input_product_id = product["id"]
+        product_ids = [product["id"] for product in products]
+        try:
+            products_info = self.get_products_info(product_ids=product_ids)
+        except Exception as ex:
+            raise Exception(
+                "Failed to get product information, {}. {}".format(
+                    str(ex), traceback.format_exc()
+                )
+            )
+
+        for input_product_id in product_ids:
             # get information required for next PGE's input preprocessor
             product_id = input_product_id
-
-            try:
-                product_url, metadata = self.get_product_info(
-                    product_id=input_product_id
-                )
-                product_info = dict()
-                product_info["id"] = input_product_id
-                product_info["url"] = product_url
-                product_info["metadata"] = metadata
-                products_metadata_list.append(product_info)
-                products_url_list.append(product_url)
-            except Exception as ex:
-                raise Exception(
-                    "Failed to get product information, {}. {}".format(
-                        str(ex), traceback.format_exc()
-                    )
-                )
+            product_url, metadata = products_info[input_product_id]
+            product_info = dict()
+            product_info["id"] = input_product_id
+            product_info["url"] = product_url
+            product_info["metadata"] = metadata
+            products_metadata_list.append(product_info)
+            products_url_list.append(product_url)
 
         return product_id, products_url_list, products_metadata_list
 
+    def _build_query(self, doc_id, query, source_includes=None, source_excludes=None):
+        """
+        Builds the body of a search by doc_id or of the given query, with the given source filtering.
+        """
+        if query is None and doc_id is None:
+            raise ValueError("Both doc_id and query cannot be None")
+
+        if doc_id is not None:
+            query = {"query": {"bool": {"must": [{"term": {"_id": doc_id}}]}}}
+
+        if source_includes is not None or source_excludes is not None:
+            query = dict(query)
+            query["_source"] = dict()
+            if source_includes is not None:
+                query["_source"]["includes"] = source_includes
+            if source_excludes is not None:
+                query["_source"]["excludes"] = source_excludes
+        return query
+
+    def _get_es(self, endpoint):
+        """
+        Maps the endpoint name to its ES client and index.
+        :param endpoint: MOZART or GRQ
+        :return: tuple(ES client, index)
+        """
+        es, es_index = None, None
+        if endpoint == self.GRQ_ES_ENDPOINT:
+            es_index = "grq"
+            es = self._grq_es
+        if endpoint == self.MOZART_ES_ENDPOINT:
+            es_index = "job_status-current"
+            es = self._mozart_es
+        return es, es_index
+
     def query_es(
         self,
         endpoint,
@@ -248,6 +382,8 @@ class PostProcessFunctions(object):
         request_timeout=30,
         retried=False,
         size=1,
+        source_includes=None,
+        source_excludes=None,
     ):
         """
         This function queries ES. Not using the query util because the ES
@@ -258,57 +394,125 @@ class PostProcessFunctions(object):
         :param doc_id: id of product or job
         :param query: query to run
         :param request_timeout: how long to wait for ES request
-        :param retried: flag to specify if the query has already been retried
+        :param retried: flag to specify if the query has already been retried,
+         in which case it is not retried again
         :param size: number of results to be returned
+        :param source_includes: list of the _source fields to return
+        :param source_excludes: list of the _source fields to leave out
         :return: result of query
         """
-        result = None
-        if query is None and doc_id is None:
-            raise ValueError("Both doc_id and query cannot be None")
-
-        es, es_url, es_index = None, None, None
-        if endpoint == self.GRQ_ES_ENDPOINT:
-            es_index = "grq"
-            es = self._grq_es
-        if endpoint == self.MOZART_ES_ENDPOINT:
-            es_index = "job_status-current"
-            es = self._mozart_es
-
-        if doc_id is not None:
-            query = {"query": {"bool": {"must": [{"term": {"_id": doc_id}}]}}}
+        es, es_index = self._get_es(endpoint)
+        query = self._build_query(doc_id, query, source_includes, source_excludes)
+
+        def _search(attempt):
+            return es.search(
+                index=es_index,
+                body=query,
+                size=size,
+                request_timeout=self._retry_policy.get_request_timeout(request_timeout, attempt),
+            )
 
         try:
-            result = es.search(
-                index=es_index, body=query, size=size, request_timeout=request_timeout
-            )
-            # retry in case of time out
-            if "timed_out" in result and result.get("timed_out"):
-                logger.warning(
-                    "ES responded with a timed out result, "
-                    "retrying....: {}".format(json.dumps(result))
-                )
-                raise RuntimeWarning(
-                    "ES responded with a timed out result, retrying...."
-                )
+            # a retried query only gets a single attempt
+            result = self._retry_policy.call(_search, max_attempts=1 if retried else None)
         except Exception as e:
-            logger.warning(
-                "Caught exception from elasticsearch "
-                "retrying: {}".format(traceback.format_exc())
+            logger.error(
+                "Failed to query {} ES: {}".format(endpoint, str(e))
             )
-            # Retry querying, this is incase ES takes too long to respond
-            if not retried:
-                self.query_es(
-                    endpoint=endpoint,
-                    doc_id=doc_id,
-                    size=size,
-                    request_timeout=int(request_timeout + 30),
-                    retried=True,
-                )
-            else:
-                raise Exception(str(e))
+            raise
 
+        record_es_call(result)
         return result
 
+    @staticmethod
+    def _get_by_id_method(es):
+        # HySDS' ElasticsearchUtility wraps the client's get as get_by_id
+        return es.get_by_id if hasattr(es, "get_by_id") else es.get
+
+    def _get_by_id(self, es, **kwargs):
+        return self._get_by_id_method(es)(**kwargs)
+
+    def _get_doc_params(self, es_index, doc_id, request_timeout, attempt, source_includes, source_excludes):
+        """
+        Builds the arguments of the realtime GET of a document.
+        """
+        params = {
+            "index": es_index,
+            "id": doc_id,
+            "request_timeout": self._retry_policy.get_request_timeout(request_timeout, attempt),
+        }
+        if source_includes is not None:
+            params["_source_includes"] = source_includes
+        if source_excludes is not None:
+            params["_source_excludes"] = source_excludes
+        return params
+
+    @staticmethod
+    def _get_error_result(error):
+        """
+        Translates the error of a GET to its result: a 404 is a document that was not found, a 400
+        an index that can't be the target of a GET, which is None. Other errors are raised.
+        """
+        status_code = getattr(error, "status_code", None)
+        if status_code == 404:
+            return {"found": False}
+        if status_code == 400:
+            return None
+        raise error
+
+    def _check_get_result(self, endpoint, es_index, doc):
+        """
+        :param doc: result of the GET
+        :return: tuple(whether the GET settled the lookup, the document or None if not found)
+        """
+        record_es_call(doc)
+        if doc is not None:
+            return True, doc if doc.get("found", False) else None
+        logger.info(
+            "Index {} of {} ES does not support GET, falling back to search".format(es_index, endpoint)
+        )
+        self._search_only_indices.add((endpoint, es_index))
+        return False, None
+
+    @staticmethod
+    def _get_first_hit(result):
+        hits = result.get("hits").get("hits")
+        return hits[0] if len(hits) > 0 else None
+
+    def get_doc(self, endpoint, doc_id, request_timeout=30, source_includes=None, source_excludes=None):
+        """
+        Gets a document by its ID with a realtime GET, which sees the document as soon as it has
+        been indexed instead of after the next index refresh. Falls back to a search when the
+        endpoint's index is an alias over multiple indices, which can't be the target of a GET.
+        :param endpoint: MOZART or GRQ
+        :param doc_id: id of product or job
+        :param request_timeout: how long to wait for ES request
+        :param source_includes: list of the _source fields to return
+        :param source_excludes: list of the _source fields to leave out
+        :return: the document as a hit (dict with _id, _index and _source), or None if not found
+        """
+        es, es_index = self._get_es(endpoint)
+        if (endpoint, es_index) not in self._search_only_indices:
+            def _get(attempt):
+                try:
+                    return self._get_by_id(es, **self._get_doc_params(
+                        es_index, doc_id, request_timeout, attempt, source_includes, source_excludes))
+                except Exception as e:
+                    return self._get_error_result(e)
+
+            found, doc = self._check_get_result(endpoint, es_index, self._retry_policy.call(_get))
+            if found:
+                return doc
+
+        result = self.query_es(
+            endpoint=endpoint,
+            doc_id=doc_id,
+            request_timeout=request_timeout,
+            source_includes=source_includes,
+            source_excludes=source_excludes,
+        )
+        return self._get_first_hit(result)
+
     def product_in_grq(self, doc_id):
         """
         Checks if the product has been indexed in ES
@@ -321,7 +525,7 @@ class PostProcessFunctions(object):
         }
 
         try:
-            if self.wait_for_doc(endpoint=self.GRQ_ES_ENDPOINT, query=query, timeout=120):
+            if self.wait_for_doc(endpoint=self.GRQ_ES_ENDPOINT, query=query, timeout=120, keys=[doc_id]):
                 return True
         except Exception as ex:
             logger.error(
@@ -333,6 +537,39 @@ class PostProcessFunctions(object):
                 "Error querying GRQ for product {}. {}".format(doc_id, str(ex))
             )
 
+    def wait_for_product(self, doc_id, timeout=120):
+        """
+        Waits for the product to be indexed in ES and returns the query result. The polling
+        query already fetches the fields needed by get_product_info, so no follow up query is made.
+        :param doc_id: id of product
+        :param timeout: time to wait in seconds
+        :return: result of the query that found the product
+        """
+        try:
+            return self.wait_for_doc(
+                endpoint=self.GRQ_ES_ENDPOINT, query=self._get_product_query(doc_id), timeout=timeout,
+                return_result=True, keys=[doc_id]
+            )
+        except Exception as ex:
+            logger.error(
+                "Error querying GRQ for product {}. {}. {}".format(
+                    doc_id, str(ex), traceback.format_exc()
+                )
+            )
+            raise Exception(
+                "Error querying GRQ for product {}. {}".format(doc_id, str(ex))
+            )
+
+    def _get_product_query(self, doc_id):
+        """
+        :param doc_id: id of product
+        :return: query of the product, fetching the fields needed by get_product_info
+        """
+        return {
+            "_source": self.PRODUCT_SOURCE_INCLUDES,
+            "query": {"bool": {"must": [{"term": {"_id": doc_id}}]}},
+        }
+
     def wait_condition(self, endpoint, result):
         results_exist = len(result.get("hits").get("hits")) == 0
         if endpoint == self.MOZART_ES_ENDPOINT:
@@ -341,100 +578,168 @@ class PostProcessFunctions(object):
         if endpoint == self.GRQ_ES_ENDPOINT:
             return results_exist
 
-    def wait_for_doc(self, endpoint, query, timeout):
+    def get_wait_strategy(self, endpoint):
+        """
+        Gets the strategy used to wait for documents of the given endpoint, as configured by
+        CHIMERA.WAIT_STRATEGY in the settings file.
+        :param endpoint: GRQ or MOZART
+        :return: WaitStrategy
+        """
+        if endpoint not in self._wait_strategies:
+            self._wait_strategies[endpoint] = get_wait_strategy(
+                get_chimera_setting(self._settings, chimera_consts.WAIT_STRATEGY), endpoint=endpoint
+            )
+        return self._wait_strategies[endpoint]
+
+    def _check_wait_timeout(self, endpoint, result):
+        """
+        Raises the suitable Exception for a wait on the endpoint that timed out.
+        """
+        if len(result.get("hits").get("hits")) == 0:
+            raise Exception(
+                "{} ES taking too long to index document".format(endpoint)
+            )
+        if endpoint == self.MOZART_ES_ENDPOINT:
+            if (
+                str(result["hits"]["hits"][0]["_source"]["status"])
+                == "job-started"
+            ):
+                raise Exception(
+                    "{} ES taking too long to update status of "
+                    "job".format(endpoint)
+                )
+
+    def wait_for_doc(self, endpoint, query, timeout, return_result=False, wait_strategy=None, keys=None):
         """
         This function executes the search query for specified wait time until
         document is found
         :param endpoint: GRQ or MOZART
         :param query: search query
         :param timeout: time to wait in seconds
-        :return: True if document found else raise suitable Exception
+        :param return_result: return the result of the last query instead of True, so
+         the hits found while polling can be reused by the caller
+        :param wait_strategy: WaitStrategy, or the name of one, deciding how long to sleep
+         between queries. Defaults to the strategy configured for the endpoint.
+        :param keys: IDs of the documents being waited on, used by notification based strategies
+        :return: True (or the query result) if document found else raise suitable Exception
         """
         try:
+            wait = self._start_wait(endpoint, timeout, wait_strategy)
             result = self.query_es(
                 endpoint=endpoint, query=query, request_timeout=30, size=1
             )
-            slept_seconds = 0
-            sleep_seconds = 2
 
             while self.wait_condition(endpoint=endpoint, result=result):
-                if result.get("timed_out", True):
-                    slept_seconds += 30
-
-                if slept_seconds + sleep_seconds < timeout:
-                    logger.debug("Slept for {} seconds".format(slept_seconds))
-                    logger.debug("Sleeping for {} seconds".format(sleep_seconds))
-                else:
-                    sleep_seconds = timeout - slept_seconds
-                    logger.debug("Slept for {} seconds".format(slept_seconds))
-                    logger.debug(
-                        "Sleeping for {} seconds to conform to timeout "
-                        "of {} seconds".format(sleep_seconds, timeout)
-                    )
-
-                if slept_seconds >= timeout:
-                    if len(result.get("hits").get("hits")) == 0:
-                        raise Exception(
-                            "{} ES taking too long to index document".format(endpoint)
-                        )
-                    if endpoint == self.MOZART_ES_ENDPOINT:
-                        if (
-                            str(result["hits"]["hits"][0]["_source"]["status"])
-                            == "job-started"
-                        ):
-                            raise Exception(
-                                "{} ES taking too long to update status of "
-                                "job".format(endpoint)
-                            )
-
-                time.sleep(sleep_seconds)
+                if wait.timed_out():
+                    self._check_wait_timeout(endpoint, result)
+                wait.sleep("{} document".format(endpoint), keys=keys)
                 result = self.query_es(
                     endpoint=endpoint, query=query, request_timeout=30, size=1
                 )
-                slept_seconds += sleep_seconds
-                sleep_seconds *= 2
+            if return_result:
+                return result
             return True
         except Exception as e:
             raise Exception("ElasticSearch Operation failed due to : {}".format(str(e)))
 
-    def get_product_info(self, product_id):
+    def _start_wait(self, endpoint, timeout, wait_strategy=None):
         """
-            This function gets the product's URL and associated metadata from Elastic
-            Search
-            :param product_id: id of product
-            :return: tuple(product_url, metadata)
-            """
-        response = None
-        try:
-            if self.product_in_grq(doc_id=product_id):
-                try:
-                    response = self.query_es(
-                        endpoint=self.GRQ_ES_ENDPOINT, doc_id=product_id
-                    )
-                    if len(response.get("hits").get("hits")) == 0:
-                        raise Exception(
-                            "ES taking too long to index product with id "
-                            "%s." % product_id
-                        )
-                except Exception as ex:
-                    raise Exception(
-                        "ElasticSearch Operation failed due to : {}".format(str(ex))
-                    )
-        except Exception as ex:
+        :param endpoint: GRQ or MOZART
+        :param timeout: time to wait in seconds
+        :param wait_strategy: WaitStrategy, or the name of one. Defaults to the strategy configured
+         for the endpoint.
+        :return: _Wait
+        """
+        if wait_strategy is None:
+            wait_strategy = self.get_wait_strategy(endpoint)
+        else:
+            wait_strategy = get_wait_strategy(wait_strategy)
+        return _Wait(wait_strategy, timeout)
+
+    def _query_products(self, product_ids):
+        """
+        Looks up a set of products in GRQ with terms queries, PRODUCT_BATCH_SIZE IDs at a time.
+        :param product_ids: list of product ids
+        :return: list of the hits that were found
+        """
+        hits = []
+        for batch, query in self._get_product_queries(product_ids):
+            result = self.query_es(
+                endpoint=self.GRQ_ES_ENDPOINT, query=query, size=len(batch)
+            )
+            if result is not None:
+                hits.extend(result.get("hits").get("hits"))
+        return hits
+
+    def _get_product_queries(self, product_ids):
+        """
+        :param product_ids: list of product ids
+        :return: list of tuple(batch of PRODUCT_BATCH_SIZE ids, terms query looking them up)
+        """
+        queries = []
+        for i in range(0, len(product_ids), self.PRODUCT_BATCH_SIZE):
+            batch = product_ids[i:i + self.PRODUCT_BATCH_SIZE]
+            queries.append((batch, {
+                "_source": self.PRODUCT_SOURCE_INCLUDES,
+                "query": {"bool": {"must": [{"terms": {"_id": batch}}]}},
+            }))
+        return queries
+
+    def get_products_info(self, product_ids, timeout=120):
+        """
+        Batched version of get_product_info. All products are resolved with a single terms query
+        against GRQ and only the ones that have not been indexed yet are polled for again.
+        :param product_ids: list of product ids
+        :param timeout: time to wait in seconds for all products to be indexed
+        :return: dict of product id to tuple(product_url, metadata)
+        """
+        products_info = dict()
+        missing_ids = list(OrderedDict.fromkeys(product_ids))
+        wait = self._start_wait(self.GRQ_ES_ENDPOINT, timeout)
+
+        while True:
+            missing_ids = self._add_products_info(products_info, missing_ids, self._query_products(missing_ids))
+            if not missing_ids:
+                return products_info
+            self._check_products_timeout(wait, missing_ids)
+            wait.sleep("{} product(s) to be indexed in GRQ".format(len(missing_ids)), keys=missing_ids)
+
+    def _add_products_info(self, products_info, missing_ids, hits):
+        """
+        Adds the products found to products_info.
+        :param products_info: dict of product id to tuple(product_url, metadata)
+        :param missing_ids: ids of the products that were looked up
+        :param hits: hits of the lookup
+        :return: ids of the products that are still missing
+        """
+        for hit in hits:
+            products_info[hit["_id"]] = self._parse_product_hit(hit)
+        return [product_id for product_id in missing_ids if product_id not in products_info]
+
+    def _check_products_timeout(self, wait, missing_ids):
+        """
+        Raises the suitable Exception if the wait for the missing products timed out.
+        """
+        if wait.timed_out():
             raise Exception(
-                "Failed to find product in GRQ. {}. {}".format(
-                    str(ex), traceback.format_exc()
+                "{} ES taking too long to index products: {}".format(
+                    self.GRQ_ES_ENDPOINT, ", ".join(missing_ids)
                 )
             )
 
+    def _parse_product_hit(self, hit):
+        """
+        Pulls the S3 URL and the metadata out of a GRQ product document.
+        :param hit: ES hit of the product
+        :return: tuple(product_url, metadata)
+        """
         try:
-            result = response.get("hits").get("hits")[0]
-            product_urls = result.get("_source").get("urls")
+            product_urls = hit.get("_source").get("urls")
             product_url = None
             for url in product_urls:
                 if url.startswith("s3://"):
                     product_url = url
-            metadata = result.get("_source").get("metadata")
+            metadata = hit.get("_source").get("metadata")
         except Exception as ex:
             raise Exception(
                 "Failed to get product info. {}. {}".format(
@@ -444,6 +749,31 @@ class PostProcessFunctions(object):
 
         return product_url, metadata
 
+    def get_product_info(self, product_id):
+        """
+            This function gets the product's URL and associated metadata from Elastic
+            Search
+            :param product_id: id of product
+            :return: tuple(product_url, metadata)
+            """
+        result = None
+        try:
+            # the realtime GET finds products that are not searchable yet, otherwise wait for them
+            result = self.get_doc(
+                endpoint=self.GRQ_ES_ENDPOINT, doc_id=product_id, source_includes=self.PRODUCT_SOURCE_INCLUDES
+            )
+            if result is None:
+                response = self.wait_for_product(doc_id=product_id)
+                result = response.get("hits").get("hits")[0]
+        except Exception as ex:
+            raise Exception(
+                "Failed to find product in GRQ. {}. {}".format(
+                    str(ex), traceback.format_exc()
+                )
+            )
+
+        return self._parse_product_hit(result)
+
     def core_post_process_steps(self):
         """
         The mandatory post processing steps of Chimera are:
@@ -531,8 +861,8 @@ class PostProcessFunctions(object):
         Now that we have all job and products information we can put the psuedo context contents together.
         """
         logger.info("Job Status Code: {}".format(job_status_code))
-        product_url_key = ChimeraConstants.PRODUCT_PATHS
-        metadata_key = ChimeraConstants.PRODUCTS_METADATA
+        product_url_key = chimera_consts.PRODUCT_PATHS
+        metadata_key = chimera_consts.PRODUCTS_METADATA
 
         pseudo_context[product_url_key] = products_url_list
         pseudo_context[metadata_key] = products_metadata_list
@@ -1,20 +1,43 @@
 import json
 import os
 import copy
+import re
 import traceback
 
+from collections.abc import Iterator
+
 from importlib import import_module
 
 from chimera.logger import logger
-from chimera.commons.conf_util import YamlConf, load_config
+from chimera.commons.conf_util import YamlConf, load_config, get_file_signature
 from chimera.commons.constants import ChimeraConstants
+from chimera.commons.runconfig_template import get_runconfig_template
 from chimera.precondition_functions import PreConditionFunctions
 
-from urllib.parse import urlparse
-
 # Used to identify fields to be filled within the runconfig context.json of PGE
 EMPTY_FIELD_IDENTIFIER = "__CHIMERA_VAL__"
 
+# Schemes of the values in the localize groups that are localized in the docker
+LOCALIZE_SCHEMES = ["s3", "s3s", "http", "https", "ftp", "sftp", "azure", "azures", "rsync"]
+# Matches the values using one of LOCALIZE_SCHEMES as their URL scheme
+LOCALIZE_URL_RE = re.compile(r"^[\x00-\x20]*(?:{}):".format("|".join(LOCALIZE_SCHEMES)), re.IGNORECASE)
+
+
+def iter_localize_urls(value):
+    """
+    Walks the value of a localize group, yielding the URLs to be localized
+    :param value: string, or a dict, list, tuple or iterator of values, which can be nested
+    """
+    if isinstance(value, str):
+        if LOCALIZE_URL_RE.match(value):
+            yield value
+    elif isinstance(value, dict):
+        for v in value.values():
+            yield from iter_localize_urls(v)
+    elif isinstance(value, (list, tuple, Iterator)):
+        for v in value:
+            yield from iter_localize_urls(v)
+
 
 class PreConditionEvaluator(object):
 
@@ -27,6 +50,7 @@ class PreConditionEvaluator(object):
         logger.debug("Loaded context file: {}".format(json.dumps(self._sf_context)))
 
         # load pge config file
+        self._pge_config_filepath = pge_config_filepath
         self._pge_config = load_config(pge_config_filepath)
         logger.debug("Loaded PGE config file: {}".format(json.dumps(self._pge_config)))
 
@@ -56,6 +80,19 @@ class PreConditionEvaluator(object):
                 file_name = '~/verdi/etc/settings.yaml'
             raise RuntimeError("Could not read settings file '{}': {}".format(file_name, e))
 
+    def get_runconfig_template(self, empty_field_identifier, optional_fields):
+        """
+        Gets the compiled runconfig of the PGE config. Templates are shared by all evaluators
+        of the same, unmodified, PGE config file.
+        :return: RunConfigTemplate
+        """
+        key = None
+        if self._pge_config_filepath:
+            key = (get_file_signature(self._pge_config_filepath), empty_field_identifier,
+                   tuple(optional_fields))
+        return get_runconfig_template(key, self._pge_config.get(ChimeraConstants.RUNCONFIG),
+                                      empty_field_identifier, optional_fields)
+
     def repl_val_in_dict(self, d, val, job_params, root=None, optional_fields=None):
         """
         Recursive function to replace occurences of val in a dict with values from the job_params.
@@ -101,40 +138,13 @@ class PreConditionEvaluator(object):
         """
         logger.debug("Preparing to localize file paths")
 
-        # Deprecated function since not all values in localize_groups are on s3
-        # for example SPS config files
-        def is_url(val):
-            parse_result = urlparse(val)
-            schemes = ["s3", "s3s", "http", "https",
-                       "ftp", "sftp", "azure", "azures", "rsync"]
-            return parse_result.scheme in schemes
-
-        localize_paths_list = []
+        # dedup while keeping the order, so a file is only localized once
+        localize_paths = dict()
         for group in self._pge_config.get(ChimeraConstants.LOCALIZE_GROUPS, []):
-            for elem in output_context.get(group, []):
-                value = output_context.get(group).get(elem)
-
-                # If the value is a list, example some InputFilGroups could be
-                # scalars or vectors
-                if isinstance(value, list):
-                    for v in value:
-                        if is_url(v):
-                            localize_paths_list.append(v)
-
-                elif isinstance(value, dict):
-                    for v in value:
-                        url = value.get(v)
-                        if is_url(url):
-                            localize_paths_list.append(url)
-
-                elif isinstance(value, str):
-                    if is_url(value):
-                        localize_paths_list.append(value)
-
-                else:
-                    continue
+            for url in iter_localize_urls(output_context.get(group, None)):
+                localize_paths[url] = None
 
-        return localize_paths_list
+        return list(localize_paths)
 
     def prepare_runconfig(self, job_params):
         """
@@ -149,9 +159,8 @@ class PreConditionEvaluator(object):
         output_context = dict()
         optional_fields = self._pge_config.get(ChimeraConstants.OPTIONAL_FIELDS, [])
         if self._pge_config.get(ChimeraConstants.RUNCONFIG):
-            output_context = copy.deepcopy(self._pge_config.get(ChimeraConstants.RUNCONFIG))
-            matched_keys = self.repl_val_in_dict(output_context, empty_field_identifier,
-                                                 job_params, optional_fields=optional_fields)
+            template = self.get_runconfig_template(empty_field_identifier, optional_fields)
+            output_context, matched_keys = template.render(job_params)
         else:
             raise KeyError("Key runconfig not found in PGE config file")
 
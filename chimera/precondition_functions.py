@@ -1,19 +1,179 @@
+import functools
+import threading
+
+from chimera.commons.conf_util import get_chimera_setting
+from chimera.commons.constants import ChimeraConstants
+from chimera.commons.dag_util import get_dependencies, run_dag
+from chimera.commons.instrumentation import Instrumentation
+from chimera.commons.precondition_cache import PreconditionCache, get_content_hash
+from chimera.logger import logger
+
+
+def precondition(reads=None, writes=None):
+    """
+    Declares the job_params keys a precondition function reads and writes, which lets it run
+    concurrently with the functions it does not share keys with.
+
+    A declared function has to return everything it produces instead of setting it on
+    self._job_params. When running concurrently, its self._job_params is a snapshot holding only
+    the keys it declared reading. Functions without a declaration run on their own, after every
+    function before them is done, and see the job_params themselves.
+
+    :param reads: job_params keys the function reads
+    :param writes: job_params keys the function returns
+    """
+    def decorator(func):
+        func.precondition_reads = frozenset(reads or [])
+        func.precondition_writes = frozenset(writes or [])
+        return func
+    return decorator
+
+
+def cacheable(context_fields=None, ttl=None):
+    """
+    Marks a precondition function whose result can be reused by later runs with the same inputs,
+    when the precondition cache is switched on. The result must be JSON serializable.
+
+    The inputs are the given context fields, the PGE config and the job_params keys declared
+    with @precondition(reads=...), so a cacheable function should not depend on anything else.
+
+    :param context_fields: dot notation keys of the context fields the function depends on.
+     Defaults to the whole context.
+    :param ttl: seconds the result stays valid, overriding the cache's ttl
+    """
+    def decorator(func):
+        func.precondition_cache = {"context_fields": context_fields, "ttl": ttl}
+        return func
+    return decorator
+
+
 class PreConditionFunctions(object):
     def __init__(self, context, pge_config, settings, job_params):
+        # snapshot of the job_params seen by the declared function running on the current thread
+        self._local = threading.local()
         self._context = context
         self._pge_config = pge_config
         self._settings = settings
         self._job_params = job_params
+        self._instrumentation = Instrumentation.from_config(
+            "preprocessor", get_chimera_setting(self._settings, ChimeraConstants.INSTRUMENTATION)
+        )
+        self._cache = PreconditionCache.from_config(
+            get_chimera_setting(self._settings, ChimeraConstants.PRECONDITION_CACHE)
+        )
+        self._pge_config_hash = None
+
+    @property
+    def _job_params(self):
+        snapshot = getattr(self._local, "job_params", None)
+        return self._shared_job_params if snapshot is None else snapshot
+
+    @_job_params.setter
+    def _job_params(self, job_params):
+        self._shared_job_params = job_params
+
+    def _call(self, func):
+        """
+        Calls the precondition function of the given name, measuring it if instrumentation is on
+        and going through the precondition cache if the function is cacheable.
+        """
+        with self._instrumentation.measure(func):
+            method = getattr(self, func)
+            cache_options = getattr(method, "precondition_cache", None)
+            if cache_options is None or not self._cache.enabled:
+                return method()
+
+            if self._pge_config_hash is None:
+                self._pge_config_hash = get_content_hash(self._pge_config)
+            key = self._cache.get_key(
+                func,
+                self._context,
+                cache_options["context_fields"],
+                self._pge_config_hash,
+                self._job_params,
+                getattr(method, "precondition_reads", None),
+            )
+            result = self._cache.get(key)
+            if result is not None:
+                logger.info("Using cached result of {}".format(func))
+                return result
+            result = method()
+            self._cache.put(key, func, result, ttl=cache_options["ttl"])
+            return result
 
     def run(self, function_list):
         """
         Runs the set of preconditions passed into the given list.
 
+        The functions run one at a time unless PRECONDITION_MAX_WORKERS is set to more than 1 in the
+        CHIMERA area of the settings file, in which case the functions declared with @precondition
+        run concurrently where their keys allow it.
+
         :param function_list: A list of precondition methods that will be defined in the subclasses.
 
         :return: a dictionary containing information about the results of the precondition evaluations.
         """
-        for func in function_list:
-            self._job_params.update(getattr(self, func)())
+        max_workers = get_chimera_setting(self._settings, ChimeraConstants.PRECONDITION_MAX_WORKERS, 1)
+        if max_workers > 1 and len(function_list) > 1:
+            self._run_concurrently(function_list, max_workers)
+        else:
+            for func in function_list:
+                self._job_params.update(self._call(func))
+
+        return self._instrumentation.publish(self._job_params)
+
+    def _run_concurrently(self, function_list, max_workers):
+        functions = [getattr(self, func) for func in function_list]
+        declarations = []
+        for func in functions:
+            if hasattr(func, "precondition_writes"):
+                declarations.append((func.precondition_reads, func.precondition_writes))
+            else:
+                declarations.append(None)
+        dependencies = get_dependencies(declarations)
+        snapshots = dict()
+        # results of the finished functions that are not merged into the job_params yet, they are
+        # merged in function_list order, so the keys get the same values, in the same order, as
+        # when the functions run one at a time
+        finished = dict()
+        next_merge = [0]
+
+        def on_start(i):
+            # taken on the calling thread, which is the only one updating the job_params
+            if declarations[i] is None:
+                return
+            snapshot = dict()
+            for key in declarations[i][0]:
+                # the last function before this one writing the key is one of its dependencies
+                writers = [j for j in dependencies[i] if key in finished.get(j, {})]
+                if writers:
+                    snapshot[key] = finished[max(writers)][key]
+                elif key in self._job_params:
+                    snapshot[key] = self._job_params[key]
+            snapshots[i] = snapshot
+
+        def call(i):
+            snapshot = snapshots.pop(i, None)
+            if snapshot is None:
+                return self._call(function_list[i])
+            self._local.job_params = snapshot
+            try:
+                return self._call(function_list[i])
+            finally:
+                self._local.job_params = None
+
+        def on_done(i, result):
+            declaration = declarations[i]
+            if declaration is not None and not set(result or {}).issubset(declaration[1]):
+                logger.warning("{} returned undeclared keys: {}".format(
+                    function_list[i], sorted(set(result) - declaration[1])))
+            finished[i] = result
+            while next_merge[0] in finished:
+                self._job_params.update(finished.pop(next_merge[0]))
+                next_merge[0] += 1
+
+        logger.info("Running preconditions with up to {} workers".format(max_workers))
+        steps = [functools.partial(call, i) for i in range(len(function_list))]
+        run_dag(steps, dependencies, max_workers, on_done=on_done, on_start=on_start)
 
         return self._job_params
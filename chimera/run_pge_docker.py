@@ -9,10 +9,12 @@ This is the second step of Chimera
 Takes the configuration generated by IPP and creates the HySDS job parameters for job submission
 """
 
+import threading
+
 from importlib import import_module
 
 from chimera.logger import logger
-from chimera.commons.conf_util import YamlConf
+from chimera.commons.conf_util import YamlConf, get_file_signature
 from chimera.pge_job_submitter import PgeJobSubmitter
 
 """
@@ -54,6 +56,42 @@ This is a sample mozart job payload
 """
 
 
+# submitter classes already looked up, keyed by the signature of the Chimera config file
+_submitter_classes = dict()
+_lock = threading.Lock()
+
+
+def get_submitter_class(chimera_config_file):
+    """
+    Gets the job submitter class named in the Chimera config file. The lookup is done once per
+    version of the file.
+    :param chimera_config_file: path to the Chimera config file
+    :return: subclass of PgeJobSubmitter
+    """
+    key = get_file_signature(chimera_config_file)
+    with _lock:
+        cls = _submitter_classes.get(key, None)
+    if cls is not None:
+        return cls
+
+    chimera_config = YamlConf(chimera_config_file).cfg
+    module_path = chimera_config.get("job_submitter", {}).get("module_path", None)
+    if not module_path:
+        raise RuntimeError("'module_path' must be defined in the 'job_submitter' section of the "
+                           "Chimera Config file '{}'".format(chimera_config_file))
+    class_name = chimera_config.get("job_submitter", {}).get("class_name", None)
+    if not class_name:
+        raise RuntimeError("'class_name' must be defined in the 'job_submitter' section of the Chimera "
+                           "Config file '{}'".format(chimera_config_file))
+    module = import_module(module_path)
+    cls = getattr(module, class_name)
+    if not issubclass(cls, PgeJobSubmitter):
+        raise RuntimeError("Class must be a subclass of {}: {}".format(PgeJobSubmitter.__name__,  cls.__name__))
+    with _lock:
+        _submitter_classes[key] = cls
+    return cls
+
+
 def submit_pge_job(sf_context, runconfig, pge_config_file, settings_file, chimera_config_file,
                    wuid=None, job_num=None):
     """
@@ -70,20 +108,46 @@ def submit_pge_job(sf_context, runconfig, pge_config_file, settings_file, chimer
     :return: job payload of PGE job
     """
     logger.info("Starting run_pge_docker step.")
-    chimera_config = YamlConf(chimera_config_file).cfg
-    module_path = chimera_config.get("job_submitter", {}).get("module_path", None)
-    if not module_path:
-        raise RuntimeError("'module_path' must be defined in the 'job_submitter' section of the "
-                           "Chimera Config file '{}'".format(chimera_config_file))
-    class_name = chimera_config.get("job_submitter", {}).get("class_name", None)
-    if not class_name:
-        raise RuntimeError("'class_name' must be defined in the 'job_submitter' section of the Chimera "
-                           "Config file '{}'".format(chimera_config_file))
-    module = import_module(module_path)
-    cls = getattr(module, class_name)
-    if not issubclass(cls, PgeJobSubmitter):
-        raise RuntimeError("Class must be a subclass of {}: {}".format(PgeJobSubmitter.__name__,  cls.__name__))
+    cls = get_submitter_class(chimera_config_file)
     cls_object = cls(sf_context, runconfig, pge_config_file, settings_file, wuid, job_num)
-    job_json = cls_object.submit_job()
+    with cls_object.instrumentation.measure("submit_job"):
+        job_json = cls_object.submit_job()
+    cls_object.instrumentation.publish(dict())
     logger.info("Finished run_pge_docker step.")
     return job_json
+
+
+def submit_pge_jobs(sf_context, runconfigs, pge_config_file, settings_file, chimera_config_file,
+                    wuid=None, job_nums=None):
+    """
+    Batch version of submit_pge_job, e.g. for a fan-out over granules. A single job submitter is
+    set up and reused for all of the runconfigs.
+    :param sf_context: context of workflow job
+    :param runconfigs: list of run configs created by input preprocessor
+    :param pge_config_file: PGE's config file name
+    :param settings_file:
+    :param chimera_config_file:
+    :param wuid: wuid of sciflo
+    :param job_nums: list of the job_nums in sciflo, one per run config
+    :return: list of the job payloads of the PGE jobs, in the order of the run configs
+    """
+    if job_nums is None:
+        job_nums = [None] * len(runconfigs)
+    if len(job_nums) != len(runconfigs):
+        raise ValueError("Got {} job_nums for {} runconfigs".format(len(job_nums), len(runconfigs)))
+
+    logger.info("Starting run_pge_docker step for {} jobs.".format(len(runconfigs)))
+    job_jsons = []
+    cls_object = None
+    for runconfig, job_num in zip(runconfigs, job_nums):
+        if cls_object is None:
+            cls = get_submitter_class(chimera_config_file)
+            cls_object = cls(sf_context, runconfig, pge_config_file, settings_file, wuid, job_num)
+        else:
+            cls_object.set_run_config(runconfig, job_num=job_num)
+        with cls_object.instrumentation.measure("submit_job"):
+            job_jsons.append(cls_object.submit_job())
+    if cls_object is not None:
+        cls_object.instrumentation.publish(dict())
+    logger.info("Finished run_pge_docker step for {} jobs.".format(len(runconfigs)))
+    return job_jsons
@@ -11,7 +11,8 @@ from importlib import import_module
 
 from chimera.logger import logger
 from chimera.commons.accountability import Accountability
-from chimera.commons.sciflo_util import run_sciflo
+from chimera.commons.sciflo_util import HARDLINK, run_sciflo
+from chimera.commons.workflow_metrics import write_workflow_metrics
 
 # Set up logging
 LOGGER = logger
@@ -58,7 +59,23 @@ def main(sfl_file, context_file, output_folder):
     LOGGER.info("context_file: %s" % context_file)
     accountability = get_accountability_class(context_file)
     accountability.create_job_entry()
-    result = run_sciflo(sfl_file, ["sf_context=%s" % context_file], output_folder)
+    with open(context_file, "r") as f:
+        context = json.load(f)
+    result = run_sciflo(
+        sfl_file,
+        ["sf_context=%s" % context_file],
+        output_folder,
+        sflexec_path=context.get("sflexec_path", None),
+        timeout=context.get("sciflo_timeout", None),
+        idle_timeout=context.get("sciflo_idle_timeout", None),
+        copy_mode=context.get("sciflo_copy_mode", HARDLINK),
+        max_error_bytes=context.get("sciflo_max_error_bytes", None),
+    )
+    # the timing report is informational, so failing to write it doesn't fail the workflow
+    try:
+        write_workflow_metrics(output_folder)
+    except Exception as e:
+        LOGGER.warning("Could not write the workflow metrics: %s" % e)
     return result
 
 
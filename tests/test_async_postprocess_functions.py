@@ -0,0 +1,155 @@
+import asyncio
+
+import pytest
+
+from chimera.async_postprocess_functions import AsyncPostProcessFunctions
+from chimera.postprocess_functions import PostProcessFunctions
+
+
+class StubES(object):
+    """Answers term/terms queries on _id from an in-memory dict of documents."""
+
+    def __init__(self, docs, visible_after=0):
+        self.docs = docs
+        self.visible_after = visible_after
+        self.calls = 0
+        self.gets = 0
+
+    def _search(self, index=None, body=None, size=None, request_timeout=None):
+        self.calls += 1
+        must = body["query"]["bool"]["must"][0]
+        ids = must["terms"]["_id"] if "terms" in must else [must["term"]["_id"]]
+        hits = []
+        if self.calls > self.visible_after:
+            hits = [{"_id": i, "_source": self.docs[i]} for i in ids if i in self.docs]
+        return {"timed_out": False, "hits": {"hits": hits[:size]}}
+
+    def _get(self, index=None, id=None, request_timeout=None, **kwargs):
+        self.gets += 1
+        if id not in self.docs or self.calls < self.visible_after:
+            error = Exception("status 404")
+            error.status_code = 404
+            raise error
+        return {"_id": id, "_source": self.docs[id], "found": True}
+
+    def search(self, **kwargs):
+        return self._search(**kwargs)
+
+    def get(self, **kwargs):
+        return self._get(**kwargs)
+
+
+class AsyncStubES(StubES):
+    async def search(self, **kwargs):
+        return self._search(**kwargs)
+
+    async def get(self, **kwargs):
+        return self._get(**kwargs)
+
+
+def _docs(count):
+    return {
+        "prod_{}".format(i): {"urls": ["http://host/prod_{}".format(i), "s3://bucket/prod_{}".format(i)],
+                              "metadata": {"index": i}}
+        for i in range(count)
+    }
+
+
+# poll quickly so the tests don't have to wait on the default intervals
+SETTINGS = {"CHIMERA": {"WAIT_STRATEGY": {"type": "capped_backoff", "initial_interval": 0.01, "max_interval": 0.01}}}
+
+
+@pytest.mark.parametrize("es_class", [StubES, AsyncStubES])
+def test_create_products_list(es_class):
+    es = es_class(_docs(5), visible_after=3)
+    pp = AsyncPostProcessFunctions({}, {}, SETTINGS, {}, mozart_es=es, grq_es=es)
+
+    product_id, urls, metadata = pp._create_products_list([{"id": "prod_{}".format(i)} for i in range(5)])
+
+    assert product_id == "prod_4"
+    assert urls == ["s3://bucket/prod_{}".format(i) for i in range(5)]
+    assert [m["metadata"]["index"] for m in metadata] == list(range(5))
+
+
+def test_get_product_info_times_out():
+    es = AsyncStubES(_docs(1))
+    pp = AsyncPostProcessFunctions({}, {}, SETTINGS, {}, mozart_es=es, grq_es=es)
+
+    with pytest.raises(Exception, match="taking too long"):
+        asyncio.run(pp.get_product_info_async("missing", timeout=0.1))
+
+
+def test_run_mixes_sync_and_async_functions():
+    class PostProcess(AsyncPostProcessFunctions):
+        def sync_step(self):
+            return {"sync": True}
+
+        async def async_step(self):
+            url, _ = await self.get_product_info_async("prod_0")
+            return {"url": url}
+
+    es = StubES(_docs(1))
+    pp = PostProcess({}, {}, SETTINGS, {}, mozart_es=es, grq_es=es)
+
+    assert pp.run(["sync_step", "async_step"]) == {"sync": True, "url": "s3://bucket/prod_0"}
+
+
+@pytest.mark.parametrize("es_class", [StubES, AsyncStubES])
+def test_products_are_looked_up_in_batches(es_class, monkeypatch):
+    monkeypatch.setattr(AsyncPostProcessFunctions, "PRODUCT_BATCH_SIZE", 2)
+    docs = _docs(5)
+    es = es_class({"prod_0": docs["prod_0"]})
+    pp = AsyncPostProcessFunctions({}, {}, SETTINGS, {}, mozart_es=es, grq_es=es)
+
+    queried = []
+    query_products = pp._query_products_async
+
+    async def _query_products_async(product_ids):
+        queried.append(list(product_ids))
+        if len(queried) == 2:
+            # the rest of the products got indexed in the meantime
+            es.docs.update(docs)
+        return await query_products(product_ids)
+
+    pp._query_products_async = _query_products_async
+    products_info = pp.get_products_info(["prod_{}".format(i) for i in range(5)])
+
+    assert sorted(products_info) == sorted(docs)
+    # only the products that were missing are polled for again
+    assert queried[0] == ["prod_{}".format(i) for i in range(5)]
+    assert queried[1:] == [["prod_{}".format(i) for i in range(1, 5)]]
+    # one terms query per batch of 2
+    assert es.calls == 3 + 2
+
+
+@pytest.mark.parametrize("es_class", [StubES, AsyncStubES])
+@pytest.mark.parametrize("visible_after", [0, 2])
+def test_get_product_info_matches_sync_lookup(es_class, visible_after):
+    # the product is either found by the realtime GET, or polled for until searches find it
+    sync_es = StubES(_docs(1), visible_after=visible_after)
+    sync_info = PostProcessFunctions({}, {}, SETTINGS, {}, mozart_es=sync_es, grq_es=sync_es).get_product_info(
+        "prod_0")
+    es = es_class(_docs(1), visible_after=visible_after)
+    pp = AsyncPostProcessFunctions({}, {}, SETTINGS, {}, mozart_es=es, grq_es=es)
+
+    assert asyncio.run(pp.get_product_info_async("prod_0")) == sync_info == ("s3://bucket/prod_0", {"index": 0})
+    assert (es.gets, es.calls) == (sync_es.gets, sync_es.calls) == (1, 0 if visible_after == 0 else 3)
+
+
+@pytest.mark.parametrize("es_class", [StubES, AsyncStubES])
+def test_get_doc_async_falls_back_to_search_on_alias(es_class):
+    class AliasES(es_class):
+        def _get(self, **kwargs):
+            self.gets += 1
+            error = Exception("status 400")
+            error.status_code = 400
+            raise error
+
+    es = AliasES(_docs(1))
+    pp = AsyncPostProcessFunctions({}, {}, SETTINGS, {}, mozart_es=es, grq_es=es)
+
+    for _ in range(2):
+        doc = asyncio.run(pp.get_doc_async("GRQ", "prod_0", source_includes=pp.PRODUCT_SOURCE_INCLUDES))
+        assert doc["_source"]["metadata"] == {"index": 0}
+    # the index is remembered as search only, like get_doc does
+    assert (es.gets, es.calls) == (1, 2)
@@ -0,0 +1,105 @@
+import json
+import os
+
+import pytest
+import yaml
+
+from chimera.commons.conf_util import ConfigCache, YamlConf, load_config, _load_yaml
+
+
+def _write(path, content):
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def test_load_config_returns_independent_copies(tmp_path):
+    config_file = str(tmp_path / "pge_config.json")
+    _write(config_file, json.dumps({"runconfig": {"Group": {"Key": "__CHIMERA_VAL__"}}}))
+
+    first = load_config(config_file)
+    first["runconfig"]["Group"]["Key"] = "changed"
+
+    assert load_config(config_file)["runconfig"]["Group"]["Key"] == "__CHIMERA_VAL__"
+
+
+def test_yaml_conf_reloads_modified_file(tmp_path):
+    config_file = str(tmp_path / "settings.yaml")
+    _write(config_file, "PGE_SIMULATION_MODE: false\n")
+    assert YamlConf(config_file).get("PGE_SIMULATION_MODE") is False
+
+    _write(config_file, "PGE_SIMULATION_MODE: true\nCHIMERA: {}\n")
+    os.utime(config_file, ns=(0, 10 ** 9))
+    assert YamlConf(config_file).get("PGE_SIMULATION_MODE") is True
+
+
+def test_config_cache_evicts_least_recently_used(tmp_path):
+    calls = []
+
+    def loader(path):
+        calls.append(path)
+        return _load_yaml(path)
+
+    cache = ConfigCache(max_size=2)
+    files = []
+    for i in range(3):
+        files.append(str(tmp_path / "config_{}.yaml".format(i)))
+        _write(files[-1], "value: {}\n".format(i))
+
+    cache.get(files[0], loader)
+    cache.get(files[1], loader)
+    cache.get(files[0], loader)
+    cache.get(files[2], loader)
+    cache.get(files[0], loader)
+    cache.get(files[1], loader)
+
+    assert calls == [files[0], files[1], files[2], files[1]]
+
+
+SETTINGS_SHAPES = """
+PGE_SIMULATION_MODE: false
+CHIMERA:
+  JOB_TYPES: &job_types
+    L0A: job-SCIFLO_L0A
+    L0B: job-SCIFLO_L0B
+  JOB_QUEUES: *job_types
+  ES_RETRY_POLICY: {max_attempts: 4, initial_backoff: 0.5, deadline: 1.8e2, retry_on_status: [429, 503]}
+PRODUCT_TYPES:
+  L0A_L_RRSD:
+    Pattern: !!python/regexp '(?P<id>NISAR_L0_PR_RRSD_(?P<frame>\\d{3})_\\d{2})\\.h5$'
+    Strategy: single
+    Extractor: null
+VALIDITY_START: 2022-01-08T07:20:00Z
+VALIDITY_DATE: 2022-01-08
+DESCRIPTION: |
+  multi line
+  text
+FOLDED: >
+  folded
+  text
+EMPTY_LIST: []
+SPECIAL_VALUES: [.inf, -.inf, 0x1F, 0o17, ~, yes, "on", 'quoted: value']
+"""
+
+
+def _repo_yaml_files():
+    configs_dir = os.path.join(os.path.dirname(__file__), "..", "chimera", "configs")
+    for root, _, files in os.walk(configs_dir):
+        for name in sorted(files):
+            if name.endswith(".yaml"):
+                yield os.path.join(root, name)
+
+
+@pytest.mark.skipif(not hasattr(yaml, "CSafeLoader"), reason="PyYAML built without libyaml")
+def test_c_loader_parity(tmp_path):
+    settings_file = str(tmp_path / "settings.yaml")
+    _write(settings_file, SETTINGS_SHAPES)
+
+    for config_file in [settings_file] + list(_repo_yaml_files()):
+        with open(config_file) as f:
+            expected = yaml.load(f, Loader=yaml.SafeLoader)
+        with open(config_file) as f:
+            actual = yaml.load(f, Loader=yaml.CSafeLoader)
+        assert actual == expected, config_file
+
+    cfg = YamlConf(settings_file).cfg
+    assert cfg["PRODUCT_TYPES"]["L0A_L_RRSD"]["Pattern"].match("NISAR_L0_PR_RRSD_001_02.h5").group("frame") == "001"
@@ -0,0 +1,92 @@
+import pytest
+
+from chimera.commons import es_client_registry
+from chimera.commons.es_client_registry import clear_es_clients, get_es_client, release_es_client
+
+
+class Transport(object):
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class Client(object):
+    def __init__(self, endpoint, url, client_kwargs):
+        self.endpoint = endpoint
+        self.url = url
+        self.client_kwargs = client_kwargs
+        self.transport = Transport()
+
+
+@pytest.fixture(autouse=True)
+def clients(monkeypatch):
+    monkeypatch.setattr(es_client_registry, "_create_client", Client)
+    yield
+    clear_es_clients()
+
+
+CONFIG = {"pool_size": 10, "idle_timeout": 60, "GRQ": {"url": "https://grq:9200", "pool_size": 25}}
+
+
+def test_clients_are_shared_per_endpoint_and_settings():
+    grq = get_es_client("GRQ", CONFIG)
+    mozart = get_es_client("MOZART", CONFIG)
+
+    assert get_es_client("GRQ", CONFIG) is grq
+    assert get_es_client("GRQ", {"pool_size": 5}) is not grq
+    assert grq.url == "https://grq:9200" and grq.client_kwargs == {"maxsize": 25}
+    assert mozart.url is None and mozart.client_kwargs == {"maxsize": 10}
+
+
+def test_hysds_clients_are_not_tracked():
+    client = get_es_client("GRQ", None)
+
+    assert client.client_kwargs == {}
+    assert get_es_client("GRQ", None) is not client
+    release_es_client(client)
+    assert not client.transport.closed
+
+
+def test_idle_client_is_recycled(monkeypatch):
+    now = [0]
+    monkeypatch.setattr(es_client_registry.time, "monotonic", lambda: now[0])
+    first = get_es_client("GRQ", CONFIG)
+    second = get_es_client("GRQ", CONFIG)
+    now[0] = 100
+
+    # still held, so it's in use rather than idle
+    assert get_es_client("GRQ", CONFIG) is first
+    for _ in range(3):
+        release_es_client(first)
+    now[0] = 200
+
+    recycled = get_es_client("GRQ", CONFIG)
+    assert recycled is not first and first.transport.closed
+    assert second is first
+
+
+def test_clear_waits_for_held_clients():
+    held = get_es_client("GRQ", CONFIG)
+    unused = get_es_client("MOZART", CONFIG)
+    release_es_client(unused)
+
+    clear_es_clients()
+
+    assert unused.transport.closed and not held.transport.closed
+    assert get_es_client("GRQ", CONFIG) is not held
+    release_es_client(held)
+    assert held.transport.closed
+
+
+def test_post_processor_gives_back_its_clients():
+    from chimera.postprocess_functions import PostProcessFunctions
+
+    pp = PostProcessFunctions({}, {}, {"CHIMERA": {"ES_CLIENT": CONFIG}}, {})
+    grq = pp._grq_es
+    clear_es_clients()
+    assert not grq.transport.closed
+
+    pp.close()
+    assert grq.transport.closed
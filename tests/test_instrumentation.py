@@ -0,0 +1,41 @@
+import json
+
+from chimera.commons import instrumentation
+from chimera.commons.instrumentation import Instrumentation, record_es_call
+from chimera.precondition_functions import PreConditionFunctions
+
+SETTINGS = {"CHIMERA": {"INSTRUMENTATION": {"enabled": True, "output": "context"}}}
+
+
+def test_disabled_instrumentation_does_not_measure_responses(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("the response was serialized")
+
+    monkeypatch.setattr(instrumentation.json, "dumps", fail)
+    inst = Instrumentation("postprocessor", enabled=False)
+    with inst.measure("_get_job"):
+        record_es_call({"hits": {"hits": []}})
+    record_es_call({"hits": {"hits": []}})
+    assert inst.get_metrics()["functions"] == []
+
+
+class PreConditions(PreConditionFunctions):
+    RESPONSE = {"hits": {"hits": [{"_id": "orbit-1"}]}}
+
+    def get_orbit(self):
+        # a subclass querying ES on its own reports the response
+        record_es_call(self.RESPONSE)
+        record_es_call(self.RESPONSE)
+        return {"orbit": 1}
+
+    def get_frame(self):
+        return {"frame": 10}
+
+
+def test_subclass_es_calls_count_towards_their_function():
+    job_params = PreConditions({}, {}, SETTINGS, {}).run(["get_orbit", "get_frame"])
+
+    functions = {record["function"]: record for record in job_params["chimera_metrics"]["functions"]}
+    assert functions["get_orbit"]["es_calls"] == 2
+    assert functions["get_orbit"]["es_bytes"] == 2 * len(json.dumps(PreConditions.RESPONSE))
+    assert functions["get_frame"]["es_calls"] == 0 and functions["get_frame"]["es_bytes"] == 0
@@ -0,0 +1,57 @@
+import json
+import os
+
+from chimera.commons import localize_util
+
+TEST_FILES = os.path.join(os.path.dirname(__file__), "test-files")
+
+
+def _load(name):
+    with open(os.path.join(TEST_FILES, name)) as f:
+        return json.load(f)
+
+
+def test_enrich_localize_urls_from_product_metadata():
+    sf_context = _load("sf_context.json")
+    localize_urls = [
+        {"url": sf_context["product_paths"][0], "path": "input/"},
+        {"url": "https://other-host/ancillary/unknown.dat", "path": "input/"},
+        # same file name as the first product, from another location
+        {"url": "s3://other-bucket/V20502TR21824018331200.VCD", "path": "input/"},
+    ]
+
+    plan = localize_util.enrich_localize_urls(
+        localize_urls, localize_util.get_file_info(sf_context), group_by=localize_util.HOST
+    )
+
+    assert plan[0] == dict(localize_urls[0], size=1183293840, group="s3-us-west-2.amazonaws.com:80")
+    assert plan[1] == dict(localize_urls[1], group="other-host")
+    assert plan[2] == dict(localize_urls[2], group="other-bucket")
+    assert localize_util.format_disk_usage(localize_util.estimate_disk_usage(plan)) == "3GB"
+
+
+def test_checksums_aligned_with_product_paths():
+    file_info = localize_util.get_file_info(_load("sf_context_test_pge_run.json"))
+
+    url = "s3://s3-us-west-2.amazonaws.com/dev-smap-dataset-bucket-test/ancillary/V20502WPS1824221570200.VCD"
+    assert file_info[url] == {"checksum": "e334bfe09295b0d6c60f336b6017785a"}
+    assert "V20502WPS1824221570200.VCD" not in file_info
+
+
+def test_same_file_name_from_different_urls():
+    sf_context = {
+        "product_paths": ["s3://bucket-a/granule.h5", "s3://bucket-b/granule.h5"],
+        "product_metadata": [{"Filename": "granule.h5", "FileSize": 10}, {"Filename": "granule.h5", "FileSize": 20}],
+    }
+    localize_urls = [{"url": path, "path": "input/"} for path in sf_context["product_paths"]]
+    localize_urls.append({"url": "s3://bucket-c/granule.h5", "path": "input/"})
+
+    plan = localize_util.enrich_localize_urls(localize_urls, localize_util.get_file_info(sf_context))
+
+    assert [element.get("size") for element in plan] == [10, 20, None]
+
+
+def test_parse_disk_usage():
+    assert localize_util.parse_disk_usage("40GB") == 40 * 1024 ** 3
+    assert localize_util.parse_disk_usage("512 mb") == 512 * 1024 ** 2
+    assert localize_util.parse_disk_usage("lots") is None
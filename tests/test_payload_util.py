@@ -0,0 +1,67 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from chimera.commons import payload_util
+from chimera.pge_job_submitter import PgeJobSubmitter
+
+
+def test_resolve_params_round_trip(tmp_path):
+    pge_config_file = str(tmp_path / "PGE_L0B.yaml")
+    with open(pge_config_file, "w") as f:
+        f.write("pge_name: L0B\nrunconfig:\n  Group:\n    Key: __CHIMERA_VAL__\n")
+    pge_config = {"pge_name": "L0B", "runconfig": {"Group": {"Key": "__CHIMERA_VAL__"}}}
+    run_config = {"Group": {"Key": "s3://bucket/granule.h5"}, "localize": ["s3://bucket/granule.h5"]}
+    params = {
+        "pge_config": payload_util.get_pge_config_ref(pge_config, pge_config_file, version="1.0"),
+        "run_config": payload_util.encode_run_config(run_config),
+    }
+
+    assert payload_util.resolve_params(params) == {"pge_config": pge_config, "run_config": run_config}
+    assert payload_util.resolve_params({"run_config": run_config}) == {"run_config": run_config}
+
+    with open(pge_config_file, "w") as f:
+        f.write("pge_name: L0B_changed\n")
+    with pytest.raises(Exception, match="does not match"):
+        payload_util.resolve_pge_config(params["pge_config"])
+
+
+def test_worker_resolves_the_slim_context(tmp_path):
+    pge_config_file = str(tmp_path / "PGE_L0B.yaml")
+    with open(pge_config_file, "w") as f:
+        f.write("pge_name: L0B\nrunconfig:\n  Group:\n    Key: __CHIMERA_VAL__\n"
+                "slim_payload:\n  compress_run_config: true\n")
+    settings_file = str(tmp_path / "settings.yaml")
+    with open(settings_file, "w") as f:
+        f.write("CHIMERA:\n  JOB_TYPES: {}\n")
+    context_file = str(tmp_path / "_context.json")
+    with open(context_file, "w") as f:
+        json.dump({"release_version": "1.0"}, f)
+    run_config = {"Group": {"Key": "s3://bucket/granule.h5"}, "localize": ["s3://bucket/granule.h5"],
+                  "simulate_outputs": False}
+    submitter = PgeJobSubmitter(context_file, run_config, pge_config_file, settings_file, wuid="wuid", job_num=1)
+    params = submitter.construct_params()
+    assert params["run_config"][payload_util.ENCODING] == payload_util.ZLIB_BASE64
+
+    # HySDS writes the job params to the _context.json of the PGE job
+    job_context_file = str(tmp_path / "job" / "_context.json")
+    os.makedirs(os.path.dirname(job_context_file))
+    with open(job_context_file, "w") as f:
+        json.dump(dict(params, job_specification={"id": "job-spec"}), f)
+    subprocess.check_call([sys.executable, "-m", "chimera.commons.payload_util", job_context_file],
+                          cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(payload_util.__file__)))))
+
+    with open(job_context_file) as f:
+        context = json.load(f)
+    assert context["run_config"] == run_config
+    assert context["pge_config"]["pge_name"] == "L0B"
+    assert context["localize_urls"] == [{"url": "s3://bucket/granule.h5", "path": "input/"}]
+    assert context["job_specification"] == {"id": "job-spec"}
+
+    # a context that is already resolved is left as-is
+    mtime = os.stat(job_context_file).st_mtime_ns
+    assert payload_util.resolve_context_file(job_context_file) == context
+    assert os.stat(job_context_file).st_mtime_ns == mtime
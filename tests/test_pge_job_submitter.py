@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+from chimera.pge_job_submitter import PgeJobSubmitter
+
+JOB_TYPE = "job-PGE_L0B:release-1"
+
+PAYLOAD_HASH = """
+payload_hash:
+  runconfig_keys:
+    - InputFileGroup.InputFilePath
+    - ProcessingGroup.Mode
+"""
+
+
+@pytest.fixture
+def make_submitter(tmp_path):
+    context_file = str(tmp_path / "_context.json")
+    with open(context_file, "w") as f:
+        json.dump({}, f)
+
+    def make_submitter(run_config, pge_config=PAYLOAD_HASH):
+        pge_config_file = str(tmp_path / "PGE_L0B.yaml")
+        with open(pge_config_file, "w") as f:
+            f.write("pge_name: PGE_L0B\n" + pge_config)
+        return PgeJobSubmitter(context_file, run_config, pge_config_file, None)
+
+    return make_submitter
+
+
+def make_run_config(urls=("s3://bucket/a.h5", "s3://bucket/b.h5"), mode="forward", **other):
+    run_config = {
+        "localize": list(urls),
+        "InputFileGroup": {"InputFilePath": list(urls)},
+        "ProcessingGroup": {"Mode": mode, "ProcessingTime": "2024-01-01T00:00:00Z"},
+    }
+    run_config.update(other)
+    return run_config
+
+
+def test_hash_ignores_key_and_localize_order(make_submitter):
+    run_config = make_run_config()
+    reordered = {
+        "ProcessingGroup": {"ProcessingTime": "2024-01-01T00:00:00Z", "Mode": "forward"},
+        "InputFileGroup": {"InputFilePath": ["s3://bucket/a.h5", "s3://bucket/b.h5"]},
+        "localize": ["s3://bucket/b.h5", "s3://bucket/a.h5", "s3://bucket/b.h5"],
+    }
+    payload_hash = make_submitter(run_config).get_payload_hash(JOB_TYPE)
+    assert len(payload_hash) == 32
+    assert make_submitter(reordered).get_payload_hash(JOB_TYPE) == payload_hash
+
+
+def test_hash_covers_the_selected_fields_only(make_submitter):
+    payload_hash = make_submitter(make_run_config()).get_payload_hash(JOB_TYPE)
+
+    # every selected field makes a different job
+    assert make_submitter(make_run_config(mode="reprocessing")).get_payload_hash(JOB_TYPE) != payload_hash
+    changed_input = make_run_config()
+    changed_input["InputFileGroup"]["InputFilePath"] = ["s3://bucket/a.h5"]
+    assert make_submitter(changed_input).get_payload_hash(JOB_TYPE) != payload_hash
+    missing_input = make_run_config()
+    del missing_input["InputFileGroup"]
+    assert make_submitter(missing_input).get_payload_hash(JOB_TYPE) != payload_hash
+    assert make_submitter(make_run_config(urls=["s3://bucket/a.h5"])).get_payload_hash(JOB_TYPE) != payload_hash
+    assert make_submitter(make_run_config()).get_payload_hash("job-PGE_L0B:release-2") != payload_hash
+
+    # other run config values don't
+    changed_time = make_run_config(pge_job_name="granule_a")
+    changed_time["ProcessingGroup"]["ProcessingTime"] = "2024-02-01T00:00:00Z"
+    assert make_submitter(changed_time).get_payload_hash(JOB_TYPE) == payload_hash
+
+
+def test_job_type_and_localize_urls_can_be_left_out(make_submitter):
+    pge_config = "payload_hash:\n  job_type: false\n  localize_urls: false\n"
+    payload_hash = make_submitter(make_run_config(), pge_config).get_payload_hash(JOB_TYPE)
+    assert make_submitter(make_run_config(urls=["s3://bucket/c.h5"]), pge_config).get_payload_hash(
+        "job-PGE_L0B:release-2") == payload_hash
+
+
+def test_hash_follows_set_run_config(make_submitter):
+    submitter = make_submitter(make_run_config())
+    payload_hash = submitter.get_payload_hash(JOB_TYPE)
+    submitter.set_run_config(make_run_config(mode="reprocessing"), job_num=2)
+    assert submitter.get_payload_hash(JOB_TYPE) != payload_hash
+    submitter.set_run_config(make_run_config(), job_num=3)
+    assert submitter.get_payload_hash(JOB_TYPE) == payload_hash
+
+
+def test_without_payload_hash_hysds_calculates_the_hash(make_submitter):
+    # None makes resolve_hysds_job hash the whole job payload
+    assert make_submitter(make_run_config(), pge_config="").get_payload_hash(JOB_TYPE) is None
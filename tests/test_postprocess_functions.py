@@ -0,0 +1,216 @@
+import pytest
+
+from chimera.postprocess_functions import PostProcessFunctions
+
+DOC = {"_id": "job-1", "_index": "job_status-2024.01", "_source": {"status": "job-completed"}}
+
+
+class ESError(Exception):
+    def __init__(self, status_code):
+        super(ESError, self).__init__("status {}".format(status_code))
+        self.status_code = status_code
+
+
+class StubES(object):
+    def __init__(self, get_status=None, docs=None, searchable_after=0):
+        self.get_status = get_status
+        self.docs = docs or {}
+        # number of searches before the documents show up in search results
+        self.searchable_after = searchable_after
+        self.gets = []
+        self.get_params = []
+        self.searches = []
+
+    def get(self, index=None, id=None, request_timeout=None, **kwargs):
+        self.gets.append(id)
+        self.get_params.append(kwargs)
+        if self.get_status is not None:
+            raise ESError(self.get_status)
+        if id not in self.docs:
+            raise ESError(404)
+        return dict(self.docs[id], found=True)
+
+    def search(self, index=None, body=None, size=None, request_timeout=None):
+        self.searches.append(body)
+        must = body["query"]["bool"]["must"][0]
+        ids = must["terms"]["_id"] if "terms" in must else [must["term"]["_id"]]
+        hits = []
+        if len(self.searches) > self.searchable_after:
+            hits = [self.docs[doc_id] for doc_id in ids if doc_id in self.docs]
+        return {"timed_out": False, "hits": {"hits": hits[:size]}}
+
+
+def product_docs(count):
+    return {
+        "prod_{}".format(i): {
+            "_id": "prod_{}".format(i),
+            "_index": "grq_v1_l0b",
+            "_source": {"id": "prod_{}".format(i), "urls": ["http://host/prod_{}".format(i),
+                                                           "s3://bucket/prod_{}".format(i)],
+                        "metadata": {"index": i}},
+        }
+        for i in range(count)
+    }
+
+
+# poll quickly so the tests don't have to wait on the default intervals
+SETTINGS = {"CHIMERA": {"WAIT_STRATEGY": {"type": "capped_backoff", "initial_interval": 0.01, "max_interval": 0.01}}}
+
+
+def post_processor(es, job_result=None):
+    return PostProcessFunctions({}, {}, SETTINGS, job_result or {}, mozart_es=es, grq_es=es)
+
+
+def test_get_doc_uses_realtime_get():
+    es = StubES(docs={"job-1": DOC})
+    pp = post_processor(es)
+
+    assert pp.get_doc("MOZART", "job-1")["_source"] == DOC["_source"]
+    assert es.searches == []
+
+
+def test_get_doc_not_found():
+    es = StubES(docs={})
+
+    # a 404 means the document doesn't exist, so there is nothing to search for
+    assert post_processor(es).get_doc("MOZART", "job-1") is None
+    assert es.searches == []
+
+
+def test_get_doc_falls_back_to_search_on_alias():
+    es = StubES(get_status=400, docs={"job-1": DOC})
+    pp = post_processor(es)
+
+    assert pp.get_doc("MOZART", "job-1", source_includes=["status"]) == DOC
+    assert pp.get_doc("MOZART", "job-1") == DOC
+    # the index is remembered as search only, so the second lookup skips the GET
+    assert es.gets == ["job-1"]
+    assert es.searches[0]["_source"] == {"includes": ["status"]}
+
+    # other instances find out for themselves
+    other = StubES(docs={"job-1": DOC})
+    assert post_processor(other).get_doc("MOZART", "job-1")["_source"] == DOC["_source"]
+    assert other.searches == []
+
+
+def test_get_doc_raises_other_errors(monkeypatch):
+    es = StubES(get_status=500)
+    pp = post_processor(es)
+    monkeypatch.setattr(pp._retry_policy, "max_attempts", 1)
+
+    with pytest.raises(Exception, match="status 500"):
+        pp.get_doc("MOZART", "job-1")
+    assert es.searches == []
+
+
+def test_products_are_looked_up_in_batches(monkeypatch):
+    monkeypatch.setattr(PostProcessFunctions, "PRODUCT_BATCH_SIZE", 2)
+    docs = product_docs(5)
+    es = StubES(docs={"prod_0": docs["prod_0"]})
+    pp = post_processor(es)
+    queried = []
+    query_products = pp._query_products
+
+    def _query_products(product_ids):
+        queried.append(list(product_ids))
+        if len(queried) == 2:
+            # the rest of the products got indexed in the meantime
+            es.docs.update(docs)
+        return query_products(product_ids)
+
+    monkeypatch.setattr(pp, "_query_products", _query_products)
+    product_ids = ["prod_{}".format(i) for i in range(5)]
+
+    products_info = pp.get_products_info(product_ids + ["prod_0"])
+
+    assert products_info == {
+        product_id: ("s3://bucket/{}".format(product_id), {"index": i}) for i, product_id in enumerate(product_ids)
+    }
+    # duplicates are looked up once and only the products that were missing are polled for again
+    assert queried == [product_ids, product_ids[1:]]
+    # one terms query per batch of 2
+    assert [search["query"]["bool"]["must"][0]["terms"]["_id"] for search in es.searches] == [
+        ["prod_0", "prod_1"], ["prod_2", "prod_3"], ["prod_4"], ["prod_1", "prod_2"], ["prod_3", "prod_4"]
+    ]
+    assert es.gets == []
+
+
+def test_products_info_timeout_names_the_missing_products():
+    docs = product_docs(3)
+    del docs["prod_1"]
+    es = StubES(docs=docs)
+
+    with pytest.raises(Exception, match="GRQ ES taking too long to index products: prod_1$"):
+        post_processor(es).get_products_info(["prod_0", "prod_1", "prod_2"], timeout=0.05)
+    # the products that were found are not polled for again
+    assert all(search["query"]["bool"]["must"][0]["terms"]["_id"] == ["prod_1"] for search in es.searches[1:])
+    assert len(es.searches) > 1
+
+
+def test_get_product_info_reuses_the_hit_of_the_last_poll(monkeypatch):
+    # the product is not indexed yet when it's looked up, then takes two polls to show up
+    es = StubES(get_status=404, docs=product_docs(1), searchable_after=2)
+    pp = post_processor(es)
+    polls = []
+    query_es = pp.query_es
+
+    def _query_es(**kwargs):
+        polls.append(kwargs)
+        return query_es(**kwargs)
+
+    monkeypatch.setattr(pp, "query_es", _query_es)
+
+    assert pp.get_product_info("prod_0") == ("s3://bucket/prod_0", {"index": 0})
+    assert es.gets == ["prod_0"]
+    # one search per poll, and none once the product was found
+    assert len(polls) == len(es.searches) == 3
+    assert all(search["query"]["bool"]["must"][0]["term"]["_id"] == "prod_0" for search in es.searches)
+
+
+def test_get_product_info_found_by_get():
+    es = StubES(docs=product_docs(1))
+
+    assert post_processor(es).get_product_info("prod_0") == ("s3://bucket/prod_0", {"index": 0})
+    assert es.gets == ["prod_0"] and es.searches == []
+
+
+JOB_DOC = {
+    "_id": "job-1",
+    "_index": "job_status-2024.01",
+    "_source": {
+        "status": "job-completed",
+        "job": {"job_info": {"metrics": {"products_staged": [{"id": "prod_0"}]}}},
+        "context": {"job_specification": {}},
+    },
+}
+
+
+@pytest.mark.parametrize("get_status", [None, 400])
+def test_job_lookup_only_fetches_the_needed_fields(get_status):
+    es = StubES(get_status=get_status, docs={"job-1": JOB_DOC})
+    pp = post_processor(es, job_result={"payload_id": "job-1", "status": "job-completed"})
+
+    products_staged, prev_context, message, job_id = pp._get_job()
+
+    assert (products_staged, message, job_id) == ([{"id": "prod_0"}], "success", "job-1")
+    assert es.get_params == [{"_source_includes": PostProcessFunctions.JOB_SOURCE_INCLUDES}]
+    if get_status is None:
+        assert es.searches == []
+    else:
+        # the search fallback filters the same fields
+        assert [search["_source"] for search in es.searches] == [
+            {"includes": PostProcessFunctions.JOB_SOURCE_INCLUDES}
+        ]
+
+
+def test_product_lookups_only_fetch_the_needed_fields():
+    es = StubES(get_status=404, docs=product_docs(2))
+    pp = post_processor(es)
+
+    pp.get_products_info(["prod_0", "prod_1"])
+    pp.get_product_info("prod_0")
+
+    assert es.get_params == [{"_source_includes": PostProcessFunctions.PRODUCT_SOURCE_INCLUDES}]
+    # the terms query, then the poll of wait_for_product
+    assert len(es.searches) == 2
+    assert all(search["_source"] == PostProcessFunctions.PRODUCT_SOURCE_INCLUDES for search in es.searches)
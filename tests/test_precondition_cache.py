@@ -0,0 +1,72 @@
+import json
+import os
+import time
+
+from chimera.commons import precondition_cache
+from chimera.commons.precondition_cache import PreconditionCache
+
+
+def age(cache, key, seconds):
+    """Moves the entry's creation and last use back in time."""
+    path = cache._get_path(key)
+    with open(path) as f:
+        header, entry = f.readlines()
+    expires = json.loads(header)["expires"]
+    with open(path, "w") as f:
+        f.write(json.dumps({"expires": None if expires is None else expires - seconds}) + "\n")
+        f.write(entry)
+    mtime = time.time() - seconds
+    os.utime(path, (mtime, mtime))
+
+
+def test_ttl_override_outlives_the_cache_ttl(tmp_path):
+    cache = PreconditionCache(enabled=True, cache_dir=str(tmp_path), ttl=10)
+    cache.put("short", "get_orbit", {"orbit": 1})
+    cache.put("long", "get_ancillary", {"ancillary": 2}, ttl=100)
+    age(cache, "short", 50)
+    age(cache, "long", 50)
+
+    cache.evict()
+
+    assert cache.get("short") is None
+    assert cache.get("long") == {"ancillary": 2}
+
+
+def test_ttl_override_shorter_than_the_cache_ttl(tmp_path):
+    cache = PreconditionCache(enabled=True, cache_dir=str(tmp_path), ttl=100)
+    cache.put("short", "get_orbit", {"orbit": 1}, ttl=10)
+    age(cache, "short", 50)
+
+    assert cache.get("short") is None
+    assert not os.path.exists(cache._get_path("short"))
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = PreconditionCache(enabled=True, cache_dir=str(tmp_path), max_size=None)
+    for i in range(3):
+        cache.put(str(i), "get_orbit", {"orbit": "x" * 100})
+        age(cache, str(i), 30 - i * 10)
+    # using the oldest entry makes it the most recently used one
+    assert cache.get("0") is not None
+
+    # the entries can differ in size by the digits of their creation time
+    cache.max_size = os.path.getsize(cache._get_path("0")) + os.path.getsize(cache._get_path("2"))
+    cache.evict()
+
+    assert cache.get("1") is None
+    assert cache.get("0") is not None and cache.get("2") is not None
+
+
+def test_entry_evicted_while_being_read(tmp_path, monkeypatch):
+    cache = PreconditionCache(enabled=True, cache_dir=str(tmp_path))
+    cache.put("key", "get_orbit", {"orbit": 1})
+    real_utime = os.utime
+
+    def utime(path, *args, **kwargs):
+        # another job evicts the entry between the read and the touch
+        os.remove(path)
+        real_utime(path, *args, **kwargs)
+
+    monkeypatch.setattr(precondition_cache.os, "utime", utime)
+
+    assert cache.get("key") == {"orbit": 1}
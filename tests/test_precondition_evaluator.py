@@ -0,0 +1,23 @@
+from chimera.precondition_evaluator import PreConditionEvaluator
+
+
+def test_localize_paths_walks_nested_groups_and_dedups():
+    evaluator = PreConditionEvaluator.__new__(PreConditionEvaluator)
+    evaluator._pge_config = {"localize_groups": ["InputFileGroup", "AncillaryFileGroup", "MissingGroup"]}
+    output_context = {
+        "InputFileGroup": {
+            "InputFilePath": ["s3://bucket/granule_1.h5", "/home/ops/local.h5", "S3://bucket/granule_2.h5"],
+            "Orbit": {"Predicted": ("https://host/orbit.xml",), "Count": 3},
+            "Extra": (url for url in ["s3://bucket/granule_1.h5", "ftp://host/extra.h5"]),
+        },
+        "AncillaryFileGroup": ["s3://bucket/granule_2.h5", "rsync://host/dem.tif"],
+    }
+
+    assert evaluator.localize_paths(output_context) == [
+        "s3://bucket/granule_1.h5",
+        "S3://bucket/granule_2.h5",
+        "https://host/orbit.xml",
+        "ftp://host/extra.h5",
+        "s3://bucket/granule_2.h5",
+        "rsync://host/dem.tif",
+    ]
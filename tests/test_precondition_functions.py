@@ -0,0 +1,152 @@
+import json
+import threading
+import time
+
+import pytest
+
+from chimera.precondition_functions import PreConditionFunctions, cacheable, precondition
+
+SETTINGS = {"CHIMERA": {"PRECONDITION_MAX_WORKERS": 4}}
+
+
+class PreConditions(PreConditionFunctions):
+    def __init__(self, *args, **kwargs):
+        super(PreConditions, self).__init__(*args, **kwargs)
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def _lookup(self, result):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.05)
+        with self._lock:
+            self.running -= 1
+        return result
+
+    @precondition(writes=["orbit"])
+    def get_orbit(self):
+        return self._lookup({"orbit": 7})
+
+    @precondition(writes=["ancillary"])
+    def get_ancillary(self):
+        return self._lookup({"ancillary": "anc.h5"})
+
+    @precondition(reads=["orbit"], writes=["frame"])
+    def get_frame(self):
+        return self._lookup({"frame": self._job_params["orbit"] * 10})
+
+    def set_product_type(self):
+        return {"product_type": "L0B", "frame": "overridden"}
+
+
+def test_independent_functions_run_concurrently():
+    pc = PreConditions({}, {}, SETTINGS, {})
+
+    job_params = pc.run(["get_orbit", "get_ancillary", "get_frame"])
+
+    assert job_params == {"orbit": 7, "ancillary": "anc.h5", "frame": 70}
+    assert pc.max_running == 2
+
+
+@pytest.mark.parametrize("settings", [SETTINGS, {}])
+def test_results_match_sequential_order(settings):
+    pc = PreConditions({}, {}, settings, {})
+
+    job_params = pc.run(["get_orbit", "get_frame", "set_product_type", "get_ancillary"])
+
+    assert list(job_params.items()) == [
+        ("orbit", 7), ("frame", "overridden"), ("product_type", "L0B"), ("ancillary", "anc.h5")
+    ]
+
+
+def test_instrumentation_writes_sidecar(tmp_path):
+    settings = {"CHIMERA": {"INSTRUMENTATION": {"enabled": True, "sidecar_dir": str(tmp_path)}}}
+    pc = PreConditions({}, {}, settings, {})
+
+    pc.run(["get_orbit", "set_product_type"])
+
+    with open(str(tmp_path / "_chimera_preprocessor_metrics.json")) as f:
+        metrics = json.load(f)
+    assert [r["function"] for r in metrics["functions"]] == ["get_orbit", "set_product_type"]
+    assert metrics["functions"][0]["wall_time"] >= 0.05
+
+
+def test_cacheable_results_are_reused(tmp_path):
+    class CachedPreConditions(PreConditionFunctions):
+        calls = 0
+
+        @cacheable(context_fields=["input_file"])
+        def get_orbit(self):
+            CachedPreConditions.calls += 1
+            return {"orbit": 7}
+
+    settings = {"CHIMERA": {"PRECONDITION_CACHE": {"enabled": True, "cache_dir": str(tmp_path)}}}
+    for input_file in ["a.h5", "a.h5", "b.h5"]:
+        context = {"input_file": input_file, "job_id": input_file + "-retry"}
+        job_params = CachedPreConditions(context, {"pge_name": "L0B"}, settings, {}).run(["get_orbit"])
+        assert job_params == {"orbit": 7}
+
+    assert CachedPreConditions.calls == 2
+
+
+class MutatingPreConditions(PreConditionFunctions):
+    @precondition(writes=["frame"])
+    def get_frame(self):
+        return {"frame": 1}
+
+    def bump_frame(self):
+        # legacy function changing the job_params in place
+        self._job_params["frame"] += 1
+        return {}
+
+    @precondition(reads=["frame"], writes=["seen"])
+    def get_seen(self):
+        return {"seen": sorted(self._job_params)}
+
+
+@pytest.mark.parametrize("settings", [SETTINGS, {}])
+def test_in_place_changes_match_sequential_order(settings):
+    pc = MutatingPreConditions({}, {}, settings, {"orbit": 7})
+
+    job_params = pc.run(["get_frame", "bump_frame", "get_seen"])
+
+    assert job_params["frame"] == 2
+    if settings:
+        # declared functions only see the keys they declared reading
+        assert job_params["seen"] == ["frame"]
+    else:
+        assert job_params["seen"] == ["frame", "orbit"]
+
+
+class OutOfOrderPreConditions(PreConditionFunctions):
+    def __init__(self, *args, **kwargs):
+        super(OutOfOrderPreConditions, self).__init__(*args, **kwargs)
+        self.slow_done = threading.Event()
+
+    @precondition(writes=["slow"])
+    def get_slow(self):
+        time.sleep(0.1)
+        self.slow_done.set()
+        return {"slow": 1, "undeclared": "slow"}
+
+    @precondition(writes=["fast"])
+    def get_fast(self):
+        return {"fast": 2, "undeclared": "fast"}
+
+    @precondition(reads=["fast"], writes=["derived"])
+    def get_derived(self):
+        # runs on the result of get_fast while get_slow is still running
+        return {"derived": (self._job_params["fast"] * 10, self.slow_done.is_set())}
+
+
+@pytest.mark.parametrize("settings", [SETTINGS, {}])
+def test_results_finishing_out_of_order_are_merged_in_order(settings):
+    pc = OutOfOrderPreConditions({}, {}, settings, {})
+
+    job_params = pc.run(["get_slow", "get_fast", "get_derived"])
+
+    assert list(job_params.items()) == [
+        ("slow", 1), ("undeclared", "fast"), ("fast", 2), ("derived", (20, not settings))
+    ]
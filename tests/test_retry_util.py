@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+from chimera.commons import retry_util
+from chimera.commons.retry_util import RetryError, RetryPolicy
+
+
+class TransportError(Exception):
+    def __init__(self, status_code):
+        super(TransportError, self).__init__("status {}".format(status_code))
+        self.status_code = status_code
+
+
+class ConnectionTimeout(TransportError):
+    pass
+
+
+class NotFoundError(TransportError):
+    pass
+
+
+class Failing(object):
+    """Fails with the given errors, then returns "ok"."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.attempts = []
+
+    def __call__(self, attempt):
+        self.attempts.append(attempt)
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(retry_util.time, "sleep", sleeps.append)
+    return sleeps
+
+
+def test_backoff_sequence():
+    policy = RetryPolicy(initial_backoff=1, backoff_multiplier=2, max_backoff=5, jitter=False)
+
+    assert [policy.get_backoff(attempt) for attempt in range(1, 6)] == [1, 2, 4, 5, 5]
+
+
+def test_backoff_jitter():
+    policy = RetryPolicy(initial_backoff=4, jitter=True)
+
+    for _ in range(100):
+        assert 2 <= policy.get_backoff(1) <= 4
+
+
+def test_retries_until_success(sleeps):
+    policy = RetryPolicy(max_attempts=3, jitter=False)
+    func = Failing(ConnectionTimeout(504), TransportError(503))
+
+    assert policy.call(func) == "ok"
+    assert func.attempts == [1, 2, 3]
+    assert sleeps == [1, 2]
+
+
+def test_gives_up_after_max_attempts(sleeps):
+    policy = RetryPolicy(max_attempts=2, jitter=False)
+    error = TransportError(429)
+
+    with pytest.raises(RetryError) as e:
+        policy.call(Failing(ConnectionError("1"), error))
+
+    assert e.value.attempts == 2 and e.value.last_error is error
+
+
+def test_deadline_cutoff(sleeps, monkeypatch):
+    clock = iter([0, 8])
+    monkeypatch.setattr(retry_util.time, "monotonic", lambda: next(clock))
+    policy = RetryPolicy(max_attempts=10, initial_backoff=4, jitter=False, deadline=10)
+    func = Failing(ConnectionError("1"), ConnectionError("2"))
+
+    # the second backoff would end after the deadline
+    with pytest.raises(RetryError, match="deadline of 10 seconds"):
+        policy.call(func)
+
+    assert func.attempts == [1]
+
+
+@pytest.mark.parametrize("error", [TransportError(400), NotFoundError(404), ValueError("x"), KeyError("x")])
+def test_only_transient_errors_are_retried_by_default(sleeps, error):
+    func = Failing(error)
+
+    with pytest.raises(type(error)):
+        RetryPolicy().call(func)
+
+    assert func.attempts == [1] and sleeps == []
+
+
+def test_retry_on_filtering(sleeps):
+    policy = RetryPolicy(retry_on=["TransportError"], retry_on_status=[503], jitter=False)
+
+    # subclasses of the named classes are retried
+    assert policy.call(Failing(ConnectionTimeout(503))) == "ok"
+    with pytest.raises(TransportError):
+        policy.call(Failing(TransportError(400)))
+    with pytest.raises(KeyError):
+        policy.call(Failing(KeyError("x")))
+
+
+def test_retryable_result(sleeps):
+    results = iter([{"timed_out": True}, {"timed_out": False}])
+    policy = RetryPolicy(jitter=False, retry_on_result=lambda result: result["timed_out"])
+
+    assert policy.call(lambda attempt: next(results)) == {"timed_out": False}
+
+    policy = RetryPolicy(max_attempts=1, retry_on_result=lambda result: True)
+    with pytest.raises(RetryError) as e:
+        policy.call(lambda attempt: "rejected")
+    assert e.value.last_error.result == "rejected"
+
+
+def test_call_async_and_request_timeout(monkeypatch):
+    async def no_sleep(seconds):
+        pass
+
+    monkeypatch.setattr(retry_util.asyncio, "sleep", no_sleep)
+    policy = RetryPolicy(timeout_increment=30)
+    timeouts = []
+
+    async def func(attempt):
+        timeouts.append(policy.get_request_timeout(30, attempt))
+        if attempt < 3:
+            raise ConnectionTimeout(504)
+        return "ok"
+
+    assert asyncio.run(policy.call_async(func)) == "ok"
+    assert timeouts == [30, 60, 90]
+
+
+def test_retry_all_exceptions(sleeps):
+    assert RetryPolicy(retry_on=["Exception"], jitter=False).call(Failing(ValueError("1"))) == "ok"
+
+
+def test_from_config_defaults():
+    policy = RetryPolicy.from_config({"max_attempts": 5}, max_attempts=2, timeout_increment=30)
+
+    assert policy.max_attempts == 5 and policy.timeout_increment == 30
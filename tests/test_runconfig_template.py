@@ -0,0 +1,139 @@
+import copy
+import json
+import pickle
+import random
+
+import pytest
+
+from chimera.commons.runconfig_template import RunConfigTemplate
+from chimera.precondition_evaluator import PreConditionEvaluator
+
+EMPTY = "__CHIMERA_VAL__"
+
+
+def test_static_branches_are_shared_read_only():
+    runconfig = {
+        "Static": {"x": 1, "list": [{"a": 1}]},
+        "Group": {"Static": {"y": 2}, "File": EMPTY},
+    }
+    template = RunConfigTemplate(runconfig, EMPTY)
+    compiled = copy.deepcopy(template._runconfig)
+
+    first, _ = template.render({"File": "a.h5"})
+    second, _ = template.render({"File": "b.h5"})
+
+    # only the path to the filled in field is copied
+    assert first["Static"] is second["Static"] is template._runconfig["Static"]
+    assert first["Group"]["Static"] is template._runconfig["Group"]["Static"]
+    assert first["Group"] is not second["Group"]
+    assert first["Group"]["File"] == "a.h5" and second["Group"]["File"] == "b.h5"
+
+    # the output itself can be added to, the shared branches can't be changed
+    first["localize"] = []
+    first["Group"]["Extra"] = 1
+    with pytest.raises(TypeError, match="deep copy"):
+        first["Static"]["x"] = 99
+    with pytest.raises(TypeError):
+        first["Static"]["list"][0].update(a=99)
+    with pytest.raises(TypeError):
+        first["Static"]["list"].append(2)
+    assert template._runconfig == compiled
+    assert "localize" not in template._runconfig and "Extra" not in template._runconfig["Group"]
+    assert runconfig["Group"]["File"] == EMPTY
+
+    # shared branches serialize, copy and pickle as plain dicts and lists
+    assert json.loads(json.dumps(second)) == second
+    changed = copy.deepcopy(second)
+    changed["Static"]["list"][0]["a"] = 99
+    assert type(changed["Static"]["list"]) is list
+    assert type(pickle.loads(pickle.dumps(second))["Static"]) is dict
+    assert template.render({"File": "b.h5"})[0] == second
+
+
+def repl_val_in_dict(runconfig, job_params, optional_fields):
+    evaluator = PreConditionEvaluator.__new__(PreConditionEvaluator)
+    output = copy.deepcopy(runconfig)
+    matched_keys = evaluator.repl_val_in_dict(output, EMPTY, job_params, optional_fields=optional_fields)
+    return output, matched_keys
+
+
+def random_runconfig(rng, depth=0):
+    runconfig = dict()
+    for i in range(rng.randint(1, 4)):
+        key = rng.choice(["File", "Orbit", "Group", "Name"]) + str(i)
+        choice = rng.random()
+        if choice < 0.3 and depth < 3:
+            runconfig[key] = random_runconfig(rng, depth + 1)
+        elif choice < 0.7:
+            runconfig[key] = EMPTY
+        else:
+            runconfig[key] = rng.choice([1, "static", ["a", "b"]])
+    return runconfig
+
+
+def get_fields(runconfig, root=()):
+    for k, v in runconfig.items():
+        if isinstance(v, dict):
+            yield from get_fields(v, root + (k,))
+        elif v == EMPTY:
+            yield ".".join(root + (k,)), k
+
+
+def render(runconfig, job_params, optional_fields):
+    try:
+        return RunConfigTemplate(runconfig, EMPTY, optional_fields).render(job_params)
+    except ValueError as e:
+        return "ValueError: {}".format(e)
+
+
+def reference(runconfig, job_params, optional_fields):
+    try:
+        return repl_val_in_dict(runconfig, job_params, optional_fields)
+    except ValueError as e:
+        return "ValueError: {}".format(e)
+
+
+def test_matches_repl_val_in_dict():
+    rng = random.Random(42)
+    errors = 0
+    for _ in range(500):
+        runconfig = random_runconfig(rng)
+        job_params = dict()
+        optional_fields = []
+        for jp_key, k in get_fields(runconfig):
+            choice = rng.random()
+            if choice < 0.3:
+                job_params[jp_key] = "dotted " + jp_key
+            elif choice < 0.6:
+                job_params[k] = "bare " + k
+            elif choice < 0.75:
+                optional_fields.append(jp_key)
+            elif choice < 0.9:
+                optional_fields.append(k)
+        expected = reference(runconfig, job_params, optional_fields)
+        errors += isinstance(expected, str)
+        assert render(runconfig, job_params, optional_fields) == expected
+
+    # both the error and the success paths were exercised
+    assert 0 < errors < 500
+
+
+def test_dotted_key_takes_precedence():
+    runconfig = {"Group": {"File": EMPTY}, "Other": {"File": EMPTY}}
+    template = RunConfigTemplate(runconfig, EMPTY)
+
+    output, matched_keys = template.render({"Group.File": "dotted.h5", "File": "bare.h5"})
+
+    assert output == {"Group": {"File": "dotted.h5"}, "Other": {"File": "bare.h5"}}
+    assert matched_keys == ["Group.File", "File"]
+
+
+def test_optional_and_missing_fields():
+    runconfig = {"Group": {"Optional": EMPTY, "Dotted": EMPTY}}
+
+    output, matched_keys = RunConfigTemplate(runconfig, EMPTY, ["Optional", "Group.Dotted"]).render({})
+    assert output == {"Group": {"Optional": "", "Dotted": ""}}
+    assert matched_keys == []
+
+    with pytest.raises(ValueError, match="Group.Dotted or Dotted has not been evaluated"):
+        RunConfigTemplate(runconfig, EMPTY, ["Optional"]).render({})
@@ -0,0 +1,199 @@
+import json
+import os
+import stat
+import sys
+import time
+
+import pytest
+
+from chimera.commons import sciflo_util
+
+FAKE_SFLEXEC = """#!{python}
+import json, os, signal, sys, time
+
+args = sys.argv[1:]
+output_dir = args[args.index("-o") + 1]
+mode = os.environ.get("FAKE_SFLEXEC_MODE", "success")
+print("running", args[-1], flush=True)
+if mode == "fail":
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "sciflo.json"), "w") as f:
+        json.dump({{"exceptionMessage": repr(("L0B", "Exception('PGE failed')", "Traceback (most recent call last)"))}}, f)
+    sys.exit(3)
+if mode == "hang":
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    time.sleep(60)
+sys.stderr.write("done\\n")
+"""
+
+
+@pytest.fixture
+def sflexec(tmp_path, monkeypatch):
+    path = str(tmp_path / "sflExec.py")
+    with open(path, "w") as f:
+        f.write(FAKE_SFLEXEC.format(python=sys.executable))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    monkeypatch.chdir(tmp_path)
+    return path
+
+
+def test_run_sciflo_success(sflexec):
+    assert sciflo_util.run_sciflo("wf.sf.xml", ["sf_context=_context.json"], "output", sflexec_path=sflexec) == 0
+
+    with open(sciflo_util.SCIFLO_STATS_FILE) as f:
+        stats = json.load(f)
+    assert stats["exit_code"] == 0 and stats["timed_out"] is None
+    assert stats["max_rss_kb"] > 0
+    with open(sciflo_util.SCIFLO_STDOUT_LOG) as f:
+        assert f.read() == "running wf.sf.xml\n"
+    with open(sciflo_util.SCIFLO_STDERR_LOG) as f:
+        assert f.read() == "done\n"
+
+
+def test_run_sciflo_failure_extracts_error(sflexec, monkeypatch):
+    monkeypatch.setenv("FAKE_SFLEXEC_MODE", "fail")
+
+    assert sciflo_util.run_sciflo("wf.sf.xml", ["sf_context=_context.json"], "output", sflexec_path=sflexec) == 1
+
+    with open(sciflo_util.SCIFLO_STATS_FILE) as f:
+        assert json.load(f)["exit_code"] == 3
+    with open("_alt_error.txt") as f:
+        assert f.read() == "SciFlo step L0B failed: PGE failed\n"
+
+
+def test_run_command_kills_idle_process(sflexec, monkeypatch):
+    monkeypatch.setenv("FAKE_SFLEXEC_MODE", "hang")
+    monkeypatch.setattr(sciflo_util, "POLL_INTERVAL", 0.05)
+
+    start = time.monotonic()
+    stats = sciflo_util.run_command(
+        [sflexec, "-o", "output", "wf.sf.xml"], idle_timeout=0.5, kill_grace_period=0.5, echo=False
+    )
+
+    assert time.monotonic() - start < 10
+    assert stats["timed_out"] == "idle_timeout"
+    assert stats["exit_code"] == -9
+
+
+@pytest.mark.parametrize("mode", [sciflo_util.HARDLINK, sciflo_util.REFLINK, sciflo_util.COPY])
+def test_copy_sciflo_work(tmp_path, mode):
+    work_dir = tmp_path / "work"
+    for unit in ["00001-ipp", "00002-pp"]:
+        (work_dir / unit / "output").mkdir(parents=True)
+        (work_dir / unit / "output" / "product.h5").write_bytes(b"x" * 100)
+    # a nested work unit linked from within another one
+    os.symlink(str(work_dir / "00002-pp"), str(work_dir / "00001-ipp" / "00002-pp"))
+    (work_dir / "00001-ipp" / "latest").symlink_to("output")
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+    os.symlink(str(work_dir / "00001-ipp"), str(output_dir / "00001-ipp"))
+
+    reports = sciflo_util.copy_sciflo_work(str(output_dir), mode=mode)
+
+    unit = output_dir / "00001-ipp"
+    assert not unit.is_symlink()
+    assert (unit / "output" / "product.h5").read_bytes() == b"x" * 100
+    assert (unit / "latest").is_symlink()
+    assert not (unit / "00002-pp").is_symlink()
+    assert [r["bytes"] for r in reports] == [100, 100]
+    linked = os.stat(str(unit / "output" / "product.h5")).st_ino == os.stat(
+        str(work_dir / "00001-ipp" / "output" / "product.h5")).st_ino
+    assert linked == (mode == sciflo_util.HARDLINK)
+
+
+@pytest.mark.parametrize("exc, error", [
+    (repr((Exception("PGE failed"), {"job_id": "job-1", "uuid": "task-1", "traceback": "PGE traceback"})),
+     "SciFlo step L0B with job_id job-1 (task task-1) failed: PGE failed"),
+    (repr(RuntimeError("bad input", 2)), "SciFlo step L0B failed: ('bad input', 2)"),
+    ("__import__('os').system('true')", "SciFlo step L0B failed: __import__('os').system('true')"),
+])
+def test_extract_error(tmp_path, monkeypatch, exc, error):
+    monkeypatch.chdir(tmp_path)
+    sciflo_json = {
+        "status": {"exceptionMessage": "not at the top level", "nested": ["}", {"a": "]"}]},
+        "exceptionMessage": repr(("L0B", exc, "sciflo traceback")),
+        "outputs": [1.5, None, True],
+    }
+    with open("sciflo.json", "w") as f:
+        json.dump(sciflo_json, f, indent=2)
+
+    sciflo_util.extract_error("sciflo.json")
+
+    with open("_alt_error.txt") as f:
+        assert f.read() == error + "\n"
+
+
+def test_error_files_under_disk_pressure(sflexec, monkeypatch):
+    monkeypatch.setenv("FAKE_SFLEXEC_MODE", "fail")
+    monkeypatch.setattr(sciflo_util, "MAX_TRACEBACK_CHARS", 10 ** 6)
+    disk_usage = sciflo_util.shutil.disk_usage
+
+    def low_disk(path):
+        return disk_usage(path)._replace(free=sciflo_util.MIN_FREE_BYTES)
+
+    monkeypatch.setattr(sciflo_util.shutil, "disk_usage", low_disk)
+
+    assert sciflo_util.run_sciflo("wf.sf.xml", ["sf_context=_context.json"], "output", sflexec_path=sflexec) == 1
+
+    with open("_alt_error.txt") as f:
+        assert f.read() == "SciFlo step L0B failed: PGE failed\n"
+    with open("_docker_stats.json") as f:
+        assert json.load(f) == {}
+    for placeholder in sciflo_util.PLACEHOLDER_FILES:
+        assert not os.path.exists(placeholder)
+
+
+def test_error_files_keep_head_and_tail(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    traceback = "Traceback (most recent call last):\n" + "  frame\n" * 10000 + "ValueError: bad"
+    with open("sciflo.json", "w") as f:
+        json.dump({"exceptionMessage": repr(("L0B", "Exception('bad')", traceback))}, f)
+
+    sciflo_util.extract_error("sciflo.json", max_error_bytes=200)
+
+    with open("_alt_traceback.txt") as f:
+        written = f.read()
+    assert written.startswith("Traceback (most recent call last):")
+    assert written.endswith("ValueError: bad\n")
+    assert len(written) < 300
+
+
+def test_run_sciflo_missing_sflexec(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sflexec = str(tmp_path / "missing" / "sflExec.py")
+
+    assert sciflo_util.run_sciflo("wf.sf.xml", ["sf_context=_context.json"], "output", sflexec_path=sflexec) == 1
+
+    with open("_alt_error.txt") as f:
+        assert f.read().startswith("Failed to run %s: " % sflexec)
+
+
+def test_run_sciflo_timeout_without_sciflo_json(sflexec, monkeypatch):
+    monkeypatch.setenv("FAKE_SFLEXEC_MODE", "hang")
+    monkeypatch.setattr(sciflo_util, "POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(sciflo_util, "KILL_GRACE_PERIOD", 0.5)
+
+    status = sciflo_util.run_sciflo(
+        "wf.sf.xml", ["sf_context=_context.json"], "output", sflexec_path=sflexec, timeout=0.5
+    )
+
+    assert status == 1
+    with open("_alt_error.txt") as f:
+        assert f.read() == "sflExec.py exceeded its timeout and was stopped before writing output/sciflo.json\n"
+    with open("_docker_stats.json") as f:
+        assert json.load(f) == {}
+    for placeholder in sciflo_util.PLACEHOLDER_FILES:
+        assert not os.path.exists(placeholder)
+
+
+def test_placeholders_reclaimed_on_error(sflexec, monkeypatch):
+    def interrupt(*args, **kwargs):
+        raise KeyboardInterrupt()
+
+    monkeypatch.setattr(sciflo_util, "run_command", interrupt)
+
+    with pytest.raises(KeyboardInterrupt):
+        sciflo_util.run_sciflo("wf.sf.xml", ["sf_context=_context.json"], "output", sflexec_path=sflexec)
+
+    for placeholder in sciflo_util.PLACEHOLDER_FILES:
+        assert not os.path.exists(placeholder)
@@ -0,0 +1,113 @@
+import json
+import os
+
+import pytest
+
+from chimera import run_pge_docker
+
+SUBMITTERS = """
+from chimera.pge_job_submitter import PgeJobSubmitter
+
+
+class FirstSubmitter(PgeJobSubmitter):
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        super(FirstSubmitter, self).__init__(*args, **kwargs)
+        self.run_configs = [self._run_config]
+        FirstSubmitter.instances.append(self)
+
+    def set_run_config(self, run_config, job_num=None):
+        super(FirstSubmitter, self).set_run_config(run_config, job_num=job_num)
+        self.run_configs.append(run_config)
+
+
+class SecondSubmitter(FirstSubmitter):
+    pass
+"""
+
+
+def write_chimera_config(path, class_name):
+    with open(path, "w") as f:
+        f.write("job_submitter:\n  module_path: chimera_test_submitters\n  class_name: {}\n".format(class_name))
+
+
+@pytest.fixture
+def submitters(tmp_path, monkeypatch):
+    (tmp_path / "chimera_test_submitters.py").write_text(SUBMITTERS)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(run_pge_docker, "_submitter_classes", dict())
+    module = __import__("chimera_test_submitters")
+    module.FirstSubmitter.instances = []
+    return module
+
+
+@pytest.fixture
+def files(tmp_path):
+    context_file = str(tmp_path / "_context.json")
+    with open(context_file, "w") as f:
+        json.dump({"job_specification": {"id": "job-spec"}}, f)
+    pge_config_file = str(tmp_path / "PGE_L0B.yaml")
+    with open(pge_config_file, "w") as f:
+        f.write("pge_name: PGE_L0B\nrunconfig: {}\n")
+    settings_file = str(tmp_path / "settings.yaml")
+    with open(settings_file, "w") as f:
+        f.write("PGE_SIMULATION_MODE: false\n")
+    return context_file, pge_config_file, settings_file
+
+
+def make_run_config(name):
+    return {"pge_job_name": name, "localize": ["s3://bucket/{}.h5".format(name)], "simulate_outputs": False}
+
+
+def test_edited_chimera_config_is_reloaded(tmp_path, submitters):
+    chimera_config_file = str(tmp_path / "chimera_config.yaml")
+    write_chimera_config(chimera_config_file, "FirstSubmitter")
+    assert run_pge_docker.get_submitter_class(chimera_config_file) is submitters.FirstSubmitter
+    # served from the cache while the file is unchanged
+    assert run_pge_docker.get_submitter_class(chimera_config_file) is submitters.FirstSubmitter
+    assert len(run_pge_docker._submitter_classes) == 1
+
+    write_chimera_config(chimera_config_file, "SecondSubmitter")
+    mtime = os.stat(chimera_config_file).st_mtime + 10
+    os.utime(chimera_config_file, (mtime, mtime))
+    assert run_pge_docker.get_submitter_class(chimera_config_file) is submitters.SecondSubmitter
+
+
+def test_submitter_class_must_be_a_job_submitter(tmp_path, submitters):
+    chimera_config_file = str(tmp_path / "chimera_config.yaml")
+    with open(chimera_config_file, "w") as f:
+        f.write("job_submitter:\n  module_path: json\n  class_name: JSONDecoder\n")
+    with pytest.raises(RuntimeError, match="subclass of PgeJobSubmitter"):
+        run_pge_docker.get_submitter_class(chimera_config_file)
+    assert run_pge_docker._submitter_classes == dict()
+
+
+def test_submit_pge_jobs_reuses_one_submitter(tmp_path, submitters, files):
+    context_file, pge_config_file, settings_file = files
+    chimera_config_file = str(tmp_path / "chimera_config.yaml")
+    write_chimera_config(chimera_config_file, "FirstSubmitter")
+    run_configs = [make_run_config("granule_{}".format(i)) for i in range(3)]
+
+    job_jsons = run_pge_docker.submit_pge_jobs(context_file, run_configs, pge_config_file, settings_file,
+                                               chimera_config_file, job_nums=[1, 2, 3])
+
+    assert [job_json["run_config"] for job_json in job_jsons] == run_configs
+    assert [job_json["localize_urls"] for job_json in job_jsons] == [
+        [{"url": "s3://bucket/granule_{}.h5".format(i), "path": "input/"}] for i in range(3)
+    ]
+    assert all(job_json["job_specification"] == {"id": "job-spec"} for job_json in job_jsons)
+    assert len(submitters.FirstSubmitter.instances) == 1
+    submitter = submitters.FirstSubmitter.instances[0]
+    assert submitter.run_configs == run_configs
+    assert submitter._job_num == 3
+
+
+def test_submit_pge_jobs_checks_job_nums(tmp_path, submitters, files):
+    context_file, pge_config_file, settings_file = files
+    chimera_config_file = str(tmp_path / "chimera_config.yaml")
+    write_chimera_config(chimera_config_file, "FirstSubmitter")
+    with pytest.raises(ValueError, match="Got 1 job_nums for 2 runconfigs"):
+        run_pge_docker.submit_pge_jobs(context_file, [make_run_config("a"), make_run_config("b")],
+                                       pge_config_file, settings_file, chimera_config_file, job_nums=[1])
+    assert submitters.FirstSubmitter.instances == []
@@ -0,0 +1,108 @@
+import asyncio
+import itertools
+import os
+import queue
+import time
+
+import pytest
+
+from chimera.commons import wait_strategy
+from chimera.postprocess_functions import PostProcessFunctions
+
+
+def take(strategy, count):
+    return list(itertools.islice(strategy.delays(), count))
+
+
+def test_default_is_exponential():
+    strategy = wait_strategy.get_wait_strategy(None, endpoint="GRQ")
+
+    assert isinstance(strategy, wait_strategy.ExponentialBackoffWait)
+    assert take(strategy, 5) == [2, 4, 8, 16, 32]
+
+
+def test_strategy_per_endpoint():
+    config = {"GRQ": {"type": "capped_backoff", "max_interval": 1.0}}
+
+    grq = wait_strategy.get_wait_strategy(config, endpoint="GRQ")
+    mozart = wait_strategy.get_wait_strategy(config, endpoint="MOZART")
+
+    assert take(grq, 5) == [0.25, 0.5, 1.0, 1.0, 1.0]
+    assert type(mozart) is wait_strategy.ExponentialBackoffWait
+
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError, match="Unknown wait strategy"):
+        wait_strategy.get_wait_strategy("fast")
+
+
+def test_notification_wakes_up_on_queue_signal():
+    signals = queue.Queue()
+    strategy = wait_strategy.NotificationWait(signal_queue=signals, check_interval=0.01)
+    signals.put("prod_1")
+
+    start = time.monotonic()
+    assert strategy.sleep(5, keys=["prod_1"]) is True
+    assert time.monotonic() - start < 1
+    # unrelated documents still wait for the whole interval
+    assert strategy.sleep(0.05, keys=["prod_2"]) is False
+
+
+def test_notification_wakes_up_on_signal_file(tmp_path):
+    strategy = wait_strategy.NotificationWait(signal_dir=str(tmp_path), check_interval=0.01)
+
+    async def signal():
+        await asyncio.sleep(0.05)
+        (tmp_path / "prod_1").write_text("")
+
+    async def wait():
+        start = time.monotonic()
+        signaled, _ = await asyncio.gather(strategy.sleep_async(5, keys=["s3://bucket/prod_1"]), signal())
+        return signaled, time.monotonic() - start
+
+    signaled, waited = asyncio.run(wait())
+    assert signaled is True and waited < 1
+
+
+def test_notification_signals_are_bounded(tmp_path):
+    signals = queue.Queue()
+    strategy = wait_strategy.NotificationWait(signal_queue=signals, max_signals=3)
+    for i in range(10):
+        signals.put("prod_{}".format(i))
+
+    assert strategy.is_signaled(["prod_9"])
+    assert list(strategy._signaled) == ["prod_7", "prod_8", "prod_9"]
+    assert not strategy.is_signaled(["prod_0"])
+
+
+def test_signal_dir_is_only_listed_when_changed(tmp_path, monkeypatch):
+    strategy = wait_strategy.NotificationWait(signal_dir=str(tmp_path))
+    (tmp_path / "prod_1").write_text("")
+    scans = []
+    scandir = os.scandir
+
+    def counting_scandir(path):
+        scans.append(path)
+        return scandir(path)
+
+    monkeypatch.setattr(wait_strategy.os, "scandir", counting_scandir)
+    for _ in range(3):
+        assert strategy.is_signaled(["prod_1"])
+
+    assert len(scans) == 1
+
+
+class EmptyES(object):
+    def search(self, **kwargs):
+        return {"timed_out": False, "hits": {"hits": []}}
+
+
+def test_wait_for_doc_stops_at_the_deadline():
+    pp = PostProcessFunctions({}, {}, {}, {}, mozart_es=EmptyES(), grq_es=EmptyES())
+    strategy = wait_strategy.ExponentialBackoffWait(initial_interval=0.05)
+
+    start = time.monotonic()
+    with pytest.raises(Exception, match="GRQ ES taking too long to index document"):
+        pp.wait_for_doc("GRQ", {"query": {}}, timeout=0.3, wait_strategy=strategy)
+
+    assert 0.3 <= time.monotonic() - start < 1
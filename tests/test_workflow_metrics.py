@@ -0,0 +1,84 @@
+import json
+import os
+
+from chimera.commons import workflow_metrics
+from chimera.commons.instrumentation import Instrumentation
+
+
+def write_sidecar(unit_dir, step, start_time, end_time, info=None):
+    os.makedirs(unit_dir, exist_ok=True)
+    metrics = {
+        "step": step,
+        "start_time": start_time,
+        "end_time": end_time,
+        "functions": [{"function": "run", "wall_time": end_time - start_time}],
+        "info": info or {},
+    }
+    with open(os.path.join(unit_dir, "_chimera_{}_metrics.json".format(step)), "w") as f:
+        json.dump(metrics, f)
+
+
+def test_parse_time():
+    assert workflow_metrics.parse_time("1970-01-01T00:01:40.5Z") == 100.5
+    assert workflow_metrics.parse_time("1970-01-01T00:01:40") == 100.0
+    assert workflow_metrics.parse_time(100) == 100.0
+    assert workflow_metrics.parse_time("not a time") is None
+
+
+def test_workflow_metrics(tmp_path):
+    output_dir = tmp_path / "output"
+    write_sidecar(str(output_dir / "00001-ipp"), "preprocessor", 1000.0, 1010.0)
+    write_sidecar(str(output_dir / "00002-submit"), "job_submitter", 1010.0, 1012.0)
+    write_sidecar(str(output_dir / "00004-pp"), "postprocessor", 1200.0, 1230.0, info={
+        "pge_job": {
+            "job_id": "job-1",
+            "time_queued": "1970-01-01T00:16:52Z",
+            "time_start": "1970-01-01T00:17:30Z",
+            "time_end": "1970-01-01T00:19:50Z",
+        }
+    })
+    # a work unit without instrumentation, running alongside the PGE job
+    unit_dir = output_dir / "00003-other"
+    os.makedirs(str(unit_dir))
+    for name, mtime in (("a.txt", 1020.0), ("b.txt", 1030.0)):
+        (unit_dir / name).write_text(name)
+        os.utime(str(unit_dir / name), (mtime, mtime))
+    stats_file = str(tmp_path / "_sciflo_exec_stats.json")
+    with open(stats_file, "w") as f:
+        json.dump({"start_time": 995.0, "end_time": 1235.0, "exit_code": 0}, f)
+
+    metrics_file = str(tmp_path / "workflow_metrics.json")
+    workflow_metrics.write_workflow_metrics(str(output_dir), stats_file=stats_file, metrics_file=metrics_file)
+    with open(metrics_file) as f:
+        metrics = json.load(f)
+
+    assert metrics["workflow"] == {"start_time": 995.0, "end_time": 1235.0, "wall_time": 240.0}
+    assert metrics["sciflo"]["exit_code"] == 0
+    steps = {step["name"]: step for step in metrics["steps"]}
+    assert [step["name"] for step in metrics["steps"]] == [
+        "00001-ipp", "00002-submit", "00003-other", "pge_job:job-1", "00004-pp"
+    ]
+    assert steps["00003-other"]["source"] == "filesystem" and steps["00003-other"]["duration"] == 10.0
+    assert steps["pge_job:job-1"]["queue_wait"] == 38.0 and steps["pge_job:job-1"]["run_time"] == 140.0
+    assert metrics["critical_path"] == ["00001-ipp", "00002-submit", "pge_job:job-1", "00004-pp"]
+    # the PGE job is on the critical path from the moment it was queued
+    assert metrics["critical_path_time"] == 10.0 + 2.0 + 38.0 + 140.0 + 30.0
+    assert metrics["totals"] == {
+        "preprocessor": 10.0,
+        "job_submitter": 2.0,
+        "postprocessor": 30.0,
+        "pge_queue_wait": 38.0,
+        "pge_run_time": 140.0,
+    }
+
+
+def test_instrumentation_info(tmp_path):
+    instrumentation = Instrumentation("postprocessor", enabled=True, sidecar_dir=str(tmp_path))
+    with instrumentation.measure("_get_job"):
+        instrumentation.add_info("pge_job", {"job_id": "job-1"})
+    instrumentation.publish(dict())
+
+    steps = workflow_metrics.get_unit_steps(str(tmp_path), str(tmp_path))
+    assert steps[0]["source"] == "chimera" and steps[0]["steps"] == ["postprocessor"]
+    # no Mozart times were recorded for the job
+    assert len(steps) == 1